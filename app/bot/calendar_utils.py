@@ -1,8 +1,51 @@
+import calendar
+import locale as locale_module
 from datetime import datetime, time
+from functools import lru_cache
+from typing import Optional
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram_calendar import SimpleCalendar
+from aiogram_calendar.schemas import CalendarLabels, SimpleCalendarCallback, SimpleCalAct, highlight
 from aiogram.filters.callback_data import CallbackData
 
+from app.repositories.cache import TTLCache, MISSING
+
+# После этого времени текущий день считается прошедшим (как в process_simple_calendar)
+DAY_CUTOFF = time(23, 0)
+
+IGNORE_CALLBACK = "ignore_action"
+
+# Готовые клавиатуры: (year, month, locale, machine_type, workload_version, max_capacity,
+# back_callback, today, after_cutoff) -> InlineKeyboardMarkup
+_markup_cache = TTLCache(maxsize=512, ttl=3600)
+
+
+@lru_cache(maxsize=None)
+def _locale_labels(locale: str) -> CalendarLabels:
+    """Подписи дней недели для локали. setlocale дорогой и глобальный, поэтому — один раз на локаль."""
+    labels = CalendarLabels()
+    try:
+        with calendar.different_locale(locale):
+            labels.days_of_week = list(calendar.day_abbr)
+            labels.months = calendar.month_abbr[1:]
+    except locale_module.Error:
+        pass  # локаль не установлена в системе — остаются английские подписи
+    return labels
+
+
+@lru_cache(maxsize=64)
+def _month_layout(year: int, month: int) -> tuple:
+    """Сетка месяца: недели из (day, callback_data), day == 0 — пустая клетка."""
+    return tuple(
+        tuple(
+            (day, SimpleCalendarCallback(act=SimpleCalAct.day, year=year, month=month, day=day).pack() if day else None)
+            for day in week
+        )
+        for week in calendar.monthcalendar(year, month)
+    )
+
+
 class CustomLaundryCalendarCallback(CallbackData, prefix="custom_laundry_calendar"):
     act: str
     year: int
@@ -12,19 +55,31 @@ class CustomLaundryCalendarCallback(CallbackData, prefix="custom_laundry_calenda
 class CustomLaundryCalendar(SimpleCalendar):
     calendar_callback = CustomLaundryCalendarCallback
 
-    def __init__(self, workload: dict, max_capacity: int, locale: str = 'ru'):
+    def __init__(
+        self,
+        workload: dict,
+        max_capacity: int,
+        locale: str = 'ru',
+        machine_type: Optional[str] = None,
+        workload_version: Optional[int] = None
+    ):
         # Ensure locale is lowercase for consistency
-        super().__init__(locale=locale.lower(), show_alerts=True)
+        # Locale labels are resolved once per locale in _locale_labels instead of on every instance
+        super().__init__(show_alerts=True)
+        self.locale = locale.lower()
+        self._labels = _locale_labels(self.locale).model_copy()
         self.workload = workload
         self.max_capacity = max_capacity
-        self.locale = locale.lower()
-        
+        self.machine_type = machine_type
+        # Version of the workload dict (laundry_repo.get_workload_version); None disables memoization
+        self.workload_version = workload_version
+
         self.months_names = {
             1: "Январь", 2: "Февраль", 3: "Март", 4: "Апрель",
             5: "Май", 6: "Июнь", 7: "Июль", 8: "Август",
             9: "Сентябрь", 10: "Октябрь", 11: "Ноябрь", 12: "Декабрь"
         }
-        
+
         # Simple translation map for the Back button inside the class
         self.back_labels = {
             'ru': "Назад",
@@ -33,79 +88,86 @@ class CustomLaundryCalendar(SimpleCalendar):
             'zh': "返回"
         }
 
+    def _day_text(self, day: int, current_day, today_date, after_cutoff: bool) -> str:
+        used = self.workload.get(day, 0)
+        free = self.max_capacity - used if self.max_capacity > 0 else 0
+
+        if current_day < today_date or (current_day == today_date and after_cutoff):
+            mark = "⚪"
+        elif free <= 0:
+            mark = "🔴"
+        elif used == 0:
+            mark = "🟢"
+        else:
+            mark = "🟡"
+
+        day_str = highlight(day) if current_day == today_date else str(day)
+        return f"{day_str} {mark}"
+
+    def _render(self, year: int, month: int, back_callback: Optional[str], now: datetime) -> InlineKeyboardMarkup:
+        today_date = now.date()
+        after_cutoff = now.time() >= DAY_CUTOFF
+        rows = []
+
+        # 1. HEADER ROW (Month Name)
+        title_text = self.months_names.get(month, "Месяц")
+        rows.append([InlineKeyboardButton(text=title_text, callback_data=IGNORE_CALLBACK)])
+
+        # 2. WEEKDAYS ROW (current weekday is highlighted in the current month, like SimpleCalendar does)
+        is_current_month = (year, month) == (today_date.year, today_date.month)
+        today_weekday = today_date.weekday()
+        rows.append([
+            InlineKeyboardButton(
+                text=highlight(label) if is_current_month and i == today_weekday else label,
+                callback_data=self.ignore_callback
+            )
+            for i, label in enumerate(self._labels.days_of_week)
+        ])
+
+        # 3. DATE ROWS, built straight from the precomputed month grid
+        for week in _month_layout(year, month):
+            row = []
+            for day, day_callback in week:
+                if not day:
+                    row.append(InlineKeyboardButton(text=" ", callback_data=self.ignore_callback))
+                    continue
+                current_day = datetime(year, month, day).date()
+                row.append(InlineKeyboardButton(
+                    text=self._day_text(day, current_day, today_date, after_cutoff),
+                    callback_data=day_callback
+                ))
+            rows.append(row)
+
+        # 4. BACK BUTTON (Footer)
+        if back_callback:
+            back_label = self.back_labels.get(self.locale, "Back")
+            rows.append([InlineKeyboardButton(text=f"⬅️ {back_label}", callback_data=back_callback)])
+
+        return InlineKeyboardMarkup(inline_keyboard=rows)
+
     async def start_calendar(
-        self, 
-        year: int = None, 
-        month: int = None, 
-        header_text: str = None, 
+        self,
+        year: int = None,
+        month: int = None,
+        header_text: str = None,
         back_callback: str = None
     ) -> InlineKeyboardMarkup:
-        
+
         # Determine current date if not provided
         now = datetime.now()
         if year is None: year = now.year
         if month is None: month = now.month
-    
-        # Generate base structure from SimpleCalendar
-        markup = await super().start_calendar(year=year, month=month)
-        original_kb = markup.inline_keyboard
-        
-        new_inline_keyboard = []
-    
-        # 1. HEADER ROW (Month Name)
-        # We prefer keeping the Month name as the header so the user knows which month acts.
-        # If you strictly want 'header_text' to replace the month name, uncomment the next line:
-        title_text = self.months_names.get(month, "Месяц")
-        
-        title_btn = InlineKeyboardButton(text=title_text, callback_data="ignore_action")
-        new_inline_keyboard.append([title_btn])
-
-        # 2. WEEKDAYS ROW
-        # In SimpleCalendar: index 2 usually contains weekdays (Mo, Tu, We...)
-        if len(original_kb) > 2:
-            new_inline_keyboard.append(original_kb[2])
-
-        # 3. DATE ROWS
-        # SimpleCalendar usually puts days from index 3 up to the footer.
-        # We iterate to find rows containing days (digits).
-        for row in original_kb[3:]:
-            new_row = []
-            has_days = False
-            for btn in row:
-                # Check if this button is a day number
-                if btn.text.isdigit():
-                    has_days = True
-                    day = int(btn.text)
-                    used = self.workload.get(day, 0)
-                    free = self.max_capacity - used if self.max_capacity > 0 else 0
-
-                    now_dt = datetime.now()
-                    today_date = now_dt.date()
-                    now_time = now_dt.time()
-
-                    current_day = datetime(year, month, day).date()
-
-                    if current_day < today_date or (current_day == today_date and now_time >= time(23, 0)):
-                        btn.text = f"{day} ⚪"
-                    elif free <= 0:
-                        btn.text = f"{day} 🔴"
-                    elif used == 0:
-                        btn.text = f"{day} 🟢"
-                    else:
-                        btn.text = f"{day} 🟡"
-                
-                # Filter out standard navigation buttons if you don't want them (Cancel, Today)
-                # or keep them if they are part of the day rows.
-                new_row.append(btn)
-            
-            # Only append the row if it actually contains calendar days or valid spacers
-            if has_days:
-                new_inline_keyboard.append(new_row)
 
-        # 4. BACK BUTTON (Footer)
-        if back_callback:
-            back_label = self.back_labels.get(self.locale, "Back")
-            back_btn = InlineKeyboardButton(text=f"⬅️ {back_label}", callback_data=back_callback)
-            new_inline_keyboard.append([back_btn])
-    
-        return InlineKeyboardMarkup(inline_keyboard=new_inline_keyboard)
\ No newline at end of file
+        if self.workload_version is None:
+            return self._render(year, month, back_callback, now)
+
+        # The finished markup only depends on these values, so re-renders reuse it
+        cache_key = (
+            year, month, self.locale, self.machine_type, self.workload_version,
+            self.max_capacity, back_callback, now.date(), now.time() >= DAY_CUTOFF
+        )
+        markup = _markup_cache.get(cache_key)
+        if markup is MISSING:
+            markup = self._render(year, month, back_callback, now)
+            _markup_cache.set(cache_key, markup)
+        return markup
@@ -2,22 +2,24 @@ from aiogram import Router, F
 from aiogram.filters import CommandStart
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.bot.keyboards import kb_welcom, get_section_keyboard
 from app.repositories.laundry_repo import (
-    get_user_by_tg_id,
     find_resident_by_fio,
     find_resident_by_id_card,
     activate_resident_user,
     update_user_language 
 )
 from app.bot.states import Auth
+from app.db.models.residents import Resident
 from app.bot.utils.translate import get_lang_and_texts, ALL_TEXTS
 
 auth_router = Router()
 
 @auth_router.message(CommandStart())
-async def cmd_start_initial(message: Message, state: FSMContext):
+async def cmd_start_initial(message: Message, state: FSMContext, session: AsyncSession, user: Optional[Resident]):
     data = await state.get_data()
     # Если язык еще не выбран, предлагаем выбрать
     if 'lang' not in data:
@@ -26,10 +28,10 @@ async def cmd_start_initial(message: Message, state: FSMContext):
             reply_markup=kb_welcom
         )
     else:
-        await cmd_start_auth(message, state)
+        await cmd_start_auth(message, state, session, user)
 
 @auth_router.callback_query(F.data.startswith("lang_"))
-async def set_language(callback: CallbackQuery, state: FSMContext):
+async def set_language(callback: CallbackQuery, state: FSMContext, session: AsyncSession, user: Optional[Resident]):
     # 1. Получаем выбранный язык
     lang = callback.data.split("_")[1]
     
@@ -41,7 +43,7 @@ async def set_language(callback: CallbackQuery, state: FSMContext):
     
     # 4. Проверяем, кто нажал кнопку (пользователь)
     tg_id = callback.from_user.id
-    user = await get_user_by_tg_id(tg_id)
+    # user уже подставлен CurrentUserMiddleware
 
     # Удаляем сообщение с выбором языка, чтобы не засорять чат
     await callback.message.delete()
@@ -49,7 +51,7 @@ async def set_language(callback: CallbackQuery, state: FSMContext):
     if user:
         # --- ЕСЛИ ПОЛЬЗОВАТЕЛЬ УЖЕ ЕСТЬ В БАЗЕ ---
         # Обновляем язык в базе данных
-        await update_user_language(tg_id, lang)
+        await update_user_language(tg_id, lang, session=session)
         
         # Отправляем главное меню на новом языке
         # Используем .replace, как у вас принято в проекте, или .format
@@ -65,16 +67,16 @@ async def set_language(callback: CallbackQuery, state: FSMContext):
     
     await callback.answer()
 
-async def cmd_start_auth(message: Message, state: FSMContext):
+async def cmd_start_auth(message: Message, state: FSMContext, session: AsyncSession, user: Optional[Resident]):
     tg_id = message.from_user.id
-    existing_user = await get_user_by_tg_id(tg_id)
+    existing_user = user
     lang, t = await get_lang_and_texts(state)
 
     if existing_user:
         # Если пользователь уже есть, но в State выбран другой язык, можно обновить его в базе
         # (Это опционально, но удобно: если юзер нажал /start и выбрал язык заново)
         if existing_user.language != lang:
-             await update_user_language(tg_id, lang)
+             await update_user_language(tg_id, lang, session=session)
         
         await message.answer(
             t['hello_user'].format(name=existing_user.first_name),
@@ -85,7 +87,7 @@ async def cmd_start_auth(message: Message, state: FSMContext):
         await state.set_state(Auth.waiting_for_fio)
 
 @auth_router.message(Auth.waiting_for_fio)
-async def process_fio_auth(message: Message, state: FSMContext):
+async def process_fio_auth(message: Message, state: FSMContext, session: AsyncSession):
     lang, t = await get_lang_and_texts(state) # Получаем язык из FSM
     text = message.text.strip()
     parts = text.split()
@@ -93,14 +95,14 @@ async def process_fio_auth(message: Message, state: FSMContext):
         await message.answer(t["write_FIO"])
         return
     
-    resident = await find_resident_by_fio(parts)
+    resident = await find_resident_by_fio(parts, session=session)
     if resident:
         if resident.tg_id and resident.tg_id != message.from_user.id:
             await message.answer(t["other_tg_id"])
             return
             
         # ✅ ПЕРЕДАЕМ ЯЗЫК В БАЗУ
-        await activate_resident_user(resident.id, message.from_user.id, language=lang)
+        await activate_resident_user(resident.id, message.from_user.id, language=lang, session=session)
         
         await message.answer(
             f"{t['hello_user'].replace('{name}', resident.first_name)}",
@@ -114,14 +116,14 @@ async def process_fio_auth(message: Message, state: FSMContext):
         await state.set_state(Auth.waiting_for_id_card)
 
 @auth_router.message(Auth.waiting_for_id_card)
-async def process_id_card_auth(message: Message, state: FSMContext):
+async def process_id_card_auth(message: Message, state: FSMContext, session: AsyncSession):
     lang, t = await get_lang_and_texts(state)
     if not message.text.isdigit():
         await message.answer(t["reg_id_error"])
         return
         
     id_card_num = int(message.text)
-    resident = await find_resident_by_id_card(id_card_num)
+    resident = await find_resident_by_id_card(id_card_num, session=session)
     
     if resident:
         if resident.tg_id and resident.tg_id != message.from_user.id:
@@ -129,7 +131,7 @@ async def process_id_card_auth(message: Message, state: FSMContext):
             return
             
         # ✅ ПЕРЕДАЕМ ЯЗЫК В БАЗУ
-        await activate_resident_user(resident.id, message.from_user.id, language=lang)
+        await activate_resident_user(resident.id, message.from_user.id, language=lang, session=session)
         
         await message.answer(
             f"{t['hello_user'].replace('{name}', resident.first_name)}",
@@ -1,6 +1,8 @@
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
 from aiogram.fsm.context import FSMContext
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, time, timedelta
 from aiogram.exceptions import TelegramBadRequest
 from aiogram_calendar import SimpleCalendar, SimpleCalendarCallback
@@ -13,41 +15,75 @@ except ImportError:
 from app.bot.utils.translate import get_lang_and_texts
 
 from app.bot.calendar_utils import CustomLaundryCalendar
+from app.bot.scheduler import schedule_booking_jobs
 from app.bot.states import AddRecord
+from app.db.models.residents import Resident
 from app.bot.keyboards import (
     get_section_keyboard,
     get_time_slots_keyboard,
     get_machines_keyboard,
     get_exit_keyboard,
-    get_machine_type_keyboard
+    get_machine_type_keyboard,
+    get_subscription_range_keyboard,
+    get_waitlist_keyboard
 )
 from app.repositories.laundry_repo import (
-    get_user_by_tg_id,
     get_available_slots,
     get_available_machines,
-    is_slot_free,
     create_booking,
     get_month_workload,
+    get_workload_version,
     get_total_daily_capacity_by_type,
-    get_user_bookings
+    get_user_bookings,
+    add_slot_subscription,
+    join_waitlist
 )
+from app.config.config import WORK_START, WORK_END, SLOT_DURATION
+from app.repositories.machines import SLOTS_PER_DAY
 
 import logging
 
 booking_router = Router()
 
+
+def _future_day_slots(date: datetime) -> list[datetime]:
+    """Все еще не начавшиеся слоты дня — на них можно встать в очередь."""
+    base = datetime(date.year, date.month, date.day, WORK_START)
+    now = datetime.now()
+    return [
+        slot for slot in (base + timedelta(minutes=SLOT_DURATION * i) for i in range(SLOTS_PER_DAY))
+        if slot > now
+    ]
+
+
+async def _show_waitlist(callback: CallbackQuery, state: FSMContext, date: datetime, lang: str, t: dict) -> bool:
+    """Предлагает встать в очередь на занятый день. False — в этот день уже нечего ждать."""
+    slots = _future_day_slots(date)
+    if not slots:
+        return False
+    await state.update_data(chosen_date=date)
+    await callback.message.edit_text(
+        t["waitlist_prompt"].format(date=date.strftime("%d.%m")),
+        reply_markup=get_waitlist_keyboard(date, slots, lang)
+    )
+    await state.set_state(AddRecord.waiting_for_time)
+    return True
+
 # helper for colored calendar (можно использовать если нужно создать календарь отдельно)
-async def get_colored_calendar(year: int, month: int, locale: str, machine_type=None):
-    workload = await get_month_workload(year, month, machine_type)
-    max_slots = await get_total_daily_capacity_by_type(machine_type)
-    calendar = CustomLaundryCalendar(workload=workload, max_capacity=max_slots, locale=locale)
+async def get_colored_calendar(year: int, month: int, locale: str, machine_type=None, session: AsyncSession = None):
+    workload = await get_month_workload(year, month, machine_type, session=session)
+    max_slots = await get_total_daily_capacity_by_type(machine_type, session=session)
+    calendar = CustomLaundryCalendar(
+        workload=workload, max_capacity=max_slots, locale=locale,
+        machine_type=machine_type, workload_version=get_workload_version(year, month, machine_type)
+    )
     return await calendar.start_calendar(year=year, month=month)
 
 
 @booking_router.callback_query(F.data == "record")
-async def process_record_start(callback: CallbackQuery, state: FSMContext):
+async def process_record_start(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     lang, t = await get_lang_and_texts(state)
-    max_capacity = await get_total_daily_capacity_by_type()
+    max_capacity = await get_total_daily_capacity_by_type(session=session)
     if max_capacity == 0:
         await callback.answer(t["no_active_machines"], show_alert=True)
         await callback.message.edit_text(t["section_menu_title"], reply_markup=get_section_keyboard(lang))
@@ -63,7 +99,7 @@ async def process_record_start(callback: CallbackQuery, state: FSMContext):
 
 
 @booking_router.callback_query(F.data.startswith("type_"), AddRecord.waiting_for_machine_type)
-async def process_machine_type(callback: CallbackQuery, state: FSMContext):
+async def process_machine_type(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     lang, t = await get_lang_and_texts(state)
     machine_type_callback = callback.data.split("_")[1] # "WASH" или "DRY"
     
@@ -80,12 +116,15 @@ async def process_machine_type(callback: CallbackQuery, state: FSMContext):
     
     now = datetime.now()
     # Теперь эти функции получат правильный тип и вернут реальные цифры, а не 0
-    workload = await get_month_workload(now.year, now.month, machine_type_db)
-    max_capacity = await get_total_daily_capacity_by_type(machine_type_db)
+    workload = await get_month_workload(now.year, now.month, machine_type_db, session=session)
+    max_capacity = await get_total_daily_capacity_by_type(machine_type_db, session=session)
     
     await state.update_data(max_capacity=max_capacity)
 
-    calendar = CustomLaundryCalendar(workload=workload, max_capacity=max_capacity, locale=lang.lower())
+    calendar = CustomLaundryCalendar(
+        workload=workload, max_capacity=max_capacity, locale=lang.lower(),
+        machine_type=machine_type_db, workload_version=get_workload_version(now.year, now.month, machine_type_db)
+    )
     
     await callback.message.edit_text(
         header_text,
@@ -101,13 +140,17 @@ async def process_machine_type(callback: CallbackQuery, state: FSMContext):
 
 
 @booking_router.callback_query(SimpleCalendarCallback.filter(F.act == "DAY"), AddRecord.waiting_for_day)
-async def process_simple_calendar(callback: CallbackQuery, callback_data: SimpleCalendarCallback, state: FSMContext):
+async def process_simple_calendar(callback: CallbackQuery, callback_data: SimpleCalendarCallback, state: FSMContext, session: AsyncSession, user: Optional[Resident]):
     lang, t = await get_lang_and_texts(state)
     data = await state.get_data()
     max_capacity = data.get('max_capacity', 0)
     machine_type_db = data.get('machine_type')
-    workload = await get_month_workload(callback_data.year, callback_data.month, machine_type_db)
-    calendar = CustomLaundryCalendar(workload=workload, max_capacity=max_capacity, locale=lang.lower())
+    workload = await get_month_workload(callback_data.year, callback_data.month, machine_type_db, session=session)
+    calendar = CustomLaundryCalendar(
+        workload=workload, max_capacity=max_capacity, locale=lang.lower(),
+        machine_type=machine_type_db,
+        workload_version=get_workload_version(callback_data.year, callback_data.month, machine_type_db)
+    )
 
     # предполагается, что CustomLaundryCalendar возвращает (selected, date) при process_selection
     selected, date = await calendar.process_selection(callback, callback_data)
@@ -127,7 +170,19 @@ async def process_simple_calendar(callback: CallbackQuery, callback_data: Simple
         used = workload.get(day, 0)
         free = max_capacity - used if max_capacity > 0 else 0
         if free <= 0:
-            await callback.answer(t["day_fully_booked"], show_alert=True)
+            # Подписываем на весь день: если кто-то отменит запись, жилец получит уведомление
+            subscribed = False
+            if user:
+                try:
+                    await add_slot_subscription(
+                        user.id, date.date(), time(WORK_START, 0), time(WORK_END, 0), machine_type_db, session=session
+                    )
+                    subscribed = True
+                except Exception as e:
+                    logging.error(f"Failed to subscribe {user.id} to {date.date()}: {e}")
+            await callback.answer(t["day_fully_booked_subscribed" if subscribed else "day_fully_booked"], show_alert=True)
+            if await _show_waitlist(callback, state, date, lang, t):
+                return
             await callback.message.edit_text(
                 t["record_start"],
                 reply_markup=await calendar.start_calendar(year=callback_data.year, month=callback_data.month, back_callback="back_to_machine_type")
@@ -136,9 +191,11 @@ async def process_simple_calendar(callback: CallbackQuery, callback_data: Simple
             return
 
         await state.update_data(chosen_date=date)
-        slots = await get_available_slots(date, machine_type=machine_type_db)
+        slots = await get_available_slots(date, machine_type=machine_type_db, session=session)
         if not slots:
             await callback.answer(t["no_slots_available"], show_alert=True)
+            if await _show_waitlist(callback, state, date, lang, t):
+                return
             await callback.message.edit_text(
                 t["record_start"],
                 reply_markup=await calendar.start_calendar(year=callback_data.year, month=callback_data.month, back_callback="back_to_machine_type")
@@ -159,7 +216,7 @@ async def process_simple_calendar(callback: CallbackQuery, callback_data: Simple
 
 # Код выбора времени — заменил user_router на booking_router
 @booking_router.callback_query(F.data.startswith("time_"), AddRecord.waiting_for_time)
-async def process_time_slot(callback: CallbackQuery, state: FSMContext):
+async def process_time_slot(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     lang, t = await get_lang_and_texts(state)
     data = await state.get_data()
 
@@ -175,7 +232,7 @@ async def process_time_slot(callback: CallbackQuery, state: FSMContext):
     await state.update_data(start_time=chosen_dt)
 
     machine_type_db = data.get('machine_type')
-    available_machines = await get_available_machines(chosen_dt, machine_type_db)
+    available_machines = await get_available_machines(chosen_dt, machine_type_db, session=session)
 
     if not available_machines:
         await callback.answer(t["no_available_slots_alert"], show_alert=True)
@@ -196,8 +253,95 @@ async def process_time_slot(callback: CallbackQuery, state: FSMContext):
     await state.set_state(AddRecord.waiting_for_machine)
     await callback.answer()
 
+@booking_router.callback_query(F.data.startswith("wait_"), AddRecord.waiting_for_time)
+async def process_join_waitlist(callback: CallbackQuery, state: FSMContext, session: AsyncSession, user: Optional[Resident]):
+    lang, t = await get_lang_and_texts(state)
+    if not user:
+        await callback.answer(t["none_user"], show_alert=True)
+        return
+
+    # формат wait_YEAR_MONTH_DAY_HOUR_MINUTE
+    year, month, day, hour, minute = map(int, callback.data.split("_")[1:6])
+    slot_start = datetime(year, month, day, hour, minute)
+    if slot_start <= datetime.now():
+        await callback.answer(t["past_date_error"], show_alert=True)
+        return
+
+    data = await state.get_data()
+    position = await join_waitlist(user.id, data.get('machine_type'), slot_start, SLOT_DURATION, session=session)
+    end_time = slot_start + timedelta(minutes=SLOT_DURATION)
+    await callback.answer(
+        t["waitlist_joined"].format(
+            date=slot_start.strftime("%d.%m"),
+            time=f"{slot_start.strftime('%H:%M')} - {end_time.strftime('%H:%M')}",
+            position=position
+        ),
+        show_alert=True
+    )
+
+
+@booking_router.callback_query(F.data == "subscribe_day", AddRecord.waiting_for_time)
+async def process_subscribe_day(callback: CallbackQuery, state: FSMContext):
+    lang, t = await get_lang_and_texts(state)
+    data = await state.get_data()
+    chosen_date = data.get('chosen_date')
+    if not chosen_date:
+        await callback.answer()
+        return
+    await callback.message.edit_text(
+        t["subscribe_range_prompt"].format(date=chosen_date.strftime("%d.%m")),
+        reply_markup=get_subscription_range_keyboard(lang)
+    )
+    await callback.answer()
+
+
+@booking_router.callback_query(F.data.startswith("subrange_"), AddRecord.waiting_for_time)
+async def process_subscribe_range(callback: CallbackQuery, state: FSMContext, session: AsyncSession, user: Optional[Resident]):
+    lang, t = await get_lang_and_texts(state)
+    if not user:
+        await callback.answer(t["none_user"], show_alert=True)
+        return
+
+    data = await state.get_data()
+    chosen_date = data.get('chosen_date')
+    machine_type_db = data.get('machine_type')
+    if not chosen_date:
+        await callback.answer()
+        return
+
+    start_hour, end_hour = map(int, callback.data.split("_")[1:3])
+    await add_slot_subscription(
+        user.id, chosen_date.date(), time(start_hour, 0), time(end_hour, 0), machine_type_db, session=session
+    )
+    await callback.answer(
+        t["subscribed"].format(date=chosen_date.strftime("%d.%m"), time=f"{start_hour:02d}:00 - {end_hour:02d}:00"),
+        show_alert=True
+    )
+    slots = await get_available_slots(chosen_date, machine_type=machine_type_db, session=session)
+    await callback.message.edit_text(
+        t["select_time_prompt"].replace("{date}", chosen_date.strftime("%d.%m")),
+        reply_markup=get_time_slots_keyboard(chosen_date, slots, lang)
+    )
+
+
+@booking_router.callback_query(F.data == "back_to_time_slots", AddRecord.waiting_for_time)
+async def process_back_to_time_slots(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    lang, t = await get_lang_and_texts(state)
+    data = await state.get_data()
+    chosen_date = data.get('chosen_date')
+    if not chosen_date:
+        await callback.answer()
+        return
+    slots = await get_available_slots(chosen_date, machine_type=data.get('machine_type'), session=session)
+    await callback.message.edit_text(
+        t["select_time_prompt"].replace("{date}", chosen_date.strftime("%d.%m")),
+        reply_markup=get_time_slots_keyboard(chosen_date, slots, lang)
+    )
+    await callback.answer()
+
+
 @booking_router.callback_query(F.data.startswith("machine_"), AddRecord.waiting_for_machine)
-async def process_machine(callback: CallbackQuery, state: FSMContext):
+async def process_machine(callback: CallbackQuery, state: FSMContext, session: AsyncSession, user: Optional[Resident]):
     lang, t = await get_lang_and_texts(state)
     machine_id = int(callback.data.split("_")[1])
     data = await state.get_data()
@@ -205,32 +349,40 @@ async def process_machine(callback: CallbackQuery, state: FSMContext):
     start_time = data["start_time"]
     end_time = start_time + timedelta(minutes=duration_minutes)
 
-    user = await get_user_by_tg_id(callback.from_user.id)
     if not user:
         await callback.answer(t["not_authenticated"], show_alert=True)
         return
 
     try:
-        if await is_slot_free(machine_id, start_time):
-            result = await create_booking(
-                user_id=user.id,
-                machine_id=machine_id,
-                start_time=start_time
-            )
+        # Проверка свободности слота выполняется в самой БД (ограничение booking_no_overlap)
+        result = await create_booking(
+            user_id=user.id,
+            machine_id=machine_id,
+            start_time=start_time,
+            session=session
+        )
 
-            await callback.message.edit_text(
-                t["booking_success"].format(
-                    machine_num=result['machine'].number_machine,
-                    start=start_time.strftime('%d.%m.%Y %H:%M'),
-                    end=end_time.strftime('%H:%M')
-                ),
-                reply_markup=get_exit_keyboard(lang)
-            )
-            await state.clear()
-            await state.update_data(lang=lang)
-            return
-        else:
-            await callback.answer(t["slot_just_taken"], show_alert=True)
+        # Напоминание и дедлайн подтверждения — на точное время. Если не вышло, задачи поставит сверка
+        try:
+            schedule_booking_jobs(result['booking'].id, start_time)
+        except Exception as e:
+            logging.error(f"Failed to schedule jobs for booking {result['booking'].id}: {e}")
+
+        await callback.message.edit_text(
+            t["booking_success"].format(
+                machine_num=result['machine'].number_machine,
+                start=start_time.strftime('%d.%m.%Y %H:%M'),
+                end=end_time.strftime('%H:%M')
+            ),
+            reply_markup=get_exit_keyboard(lang)
+        )
+        await state.clear()
+        await state.update_data(lang=lang)
+        return
+
+    except ValueError:
+        # Слот успели занять между выбором времени и нажатием на машину
+        await callback.answer(t["slot_just_taken"], show_alert=True)
 
     except Exception as e:
         # лог можно добавить: logging.exception(e)
@@ -242,10 +394,9 @@ async def process_machine(callback: CallbackQuery, state: FSMContext):
 
 
 @booking_router.callback_query(F.data == "back_to_sections", AddRecord.waiting_for_machine_type)
-async def process_back_to_sections(callback: CallbackQuery, state: FSMContext):
+async def process_back_to_sections(callback: CallbackQuery, state: FSMContext, user: Optional[Resident]):
     lang, t = await get_lang_and_texts(state)
-    user = await get_user_by_tg_id(callback.from_user.id)
-    
+
     db_name = user.first_name 
 
     await callback.message.edit_text(
@@ -257,18 +408,20 @@ async def process_back_to_sections(callback: CallbackQuery, state: FSMContext):
 
 
 @booking_router.callback_query(F.data == "back_to_calendar", AddRecord.waiting_for_time)
-async def process_back_to_calendar(callback: CallbackQuery, state: FSMContext):
+async def process_back_to_calendar(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     lang, t = await get_lang_and_texts(state)
     data = await state.get_data()
     machine_type_db = data.get('machine_type')
     max_capacity = data.get('max_capacity', 0)
     now = datetime.now()
-    workload = await get_month_workload(now.year, now.month, machine_type_db)
+    workload = await get_month_workload(now.year, now.month, machine_type_db, session=session)
 
     calendar = CustomLaundryCalendar(
         workload=workload,
         max_capacity=max_capacity,
-        locale=lang.lower()
+        locale=lang.lower(),
+        machine_type=machine_type_db,
+        workload_version=get_workload_version(now.year, now.month, machine_type_db)
     )
 
     # Generate header text to be consistent
@@ -291,7 +444,7 @@ async def process_back_to_calendar(callback: CallbackQuery, state: FSMContext):
 
 
 @booking_router.callback_query(F.data == "back_to_time", AddRecord.waiting_for_machine)
-async def process_back_to_time(callback: CallbackQuery, state: FSMContext):
+async def process_back_to_time(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     lang, t = await get_lang_and_texts(state)
     data = await state.get_data()
     chosen_date = data.get('chosen_date')
@@ -299,7 +452,7 @@ async def process_back_to_time(callback: CallbackQuery, state: FSMContext):
         await callback.answer("Дата не найдена", show_alert=True)
         return
     machine_type_db = data.get('machine_type')
-    slots = await get_available_slots(chosen_date, machine_type=machine_type_db)
+    slots = await get_available_slots(chosen_date, machine_type=machine_type_db, session=session)
     await callback.message.edit_text(
         t["select_time_prompt"].replace("{date}", chosen_date.strftime("%d.%m")),
         reply_markup=get_time_slots_keyboard(chosen_date, slots, lang)
@@ -319,11 +472,10 @@ async def back_to_machine_type(callback: CallbackQuery, state: FSMContext):
 
 
 @booking_router.callback_query(F.data == "exit")  # <--- Проверьте, совпадает ли это с callback_data кнопки
-async def process_exit(callback: CallbackQuery, state: FSMContext):
+async def process_exit(callback: CallbackQuery, state: FSMContext, user: Optional[Resident]):
     lang, t = await get_lang_and_texts(state)
     
-    # 1. Получаем пользователя из БД по Telegram ID
-    user = await get_user_by_tg_id(callback.from_user.id)
+    # 1. Пользователь из БД по Telegram ID (подставлен CurrentUserMiddleware из кэша)
 
     # 3. Диагностика (по желанию, чтобы убедиться в логах)
     logging.info(f"DB Name: {user.first_name} | TG Name: {callback.from_user.first_name}")
@@ -4,32 +4,34 @@ from aiogram import Router, F, Bot
 from app.bot.utils.translate import ALL_TEXTS
 from aiogram.types import CallbackQuery
 from aiogram.fsm.context import FSMContext
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError
 
 from app.bot.utils.translate import get_lang_and_texts
 from app.bot.keyboards import get_cancel_booking_keyboard, get_section_keyboard, get_back_to_sections_keyboard
 from app.bot.states import CancelRecord
+from app.db.models.residents import Resident
 from app.repositories.laundry_repo import (
-    get_user_by_tg_id, 
     get_user_bookings, 
     cancel_booking, 
     get_booking_by_id
 )
-from app.bot.utils.broadcaster import broadcast_slot_freed
+from app.bot.utils.broadcaster import slot_freed_digest
+from app.bot.scheduler import unschedule_booking_jobs, waitlist_grant_messages, schedule_waitlist_grant
+from app.bot.utils.outbox_worker import outbox_worker
 
 cancel_record_router = Router()
 
 @cancel_record_router.callback_query(F.data == "remove_records")
-async def start_cancel_process(callback: CallbackQuery, state: FSMContext):
+async def start_cancel_process(callback: CallbackQuery, state: FSMContext, session: AsyncSession, user: Optional[Resident]):
     # (Этот код остается без изменений - показ списка записей)
     lang, t = await get_lang_and_texts(state)
-    user = await get_user_by_tg_id(callback.from_user.id)
-    
     if not user:
         await callback.answer(t["none_user"], show_alert=True)
         return
 
-    bookings = await get_user_bookings(user.id)
+    bookings = await get_user_bookings(user.id, session=session)
     if not bookings:
         await callback.answer(t["no_user_bookings"], show_alert=True)
         return
@@ -43,17 +45,20 @@ async def start_cancel_process(callback: CallbackQuery, state: FSMContext):
 
 
 @cancel_record_router.callback_query(F.data.startswith("cancel_"), CancelRecord.waiting_for_cancel)
-async def process_cancel_booking(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def process_cancel_booking(callback: CallbackQuery, state: FSMContext, bot: Bot, session: AsyncSession, user: Optional[Resident]):
     booking_id = int(callback.data.split("_")[-1])
     lang, t = await get_lang_and_texts(state)
+    if not user:
+        await callback.answer(t["none_user"], show_alert=True)
+        return
     
     # 1. Сначала получаем данные о бронировании, пока не удалили
-    booking = await get_booking_by_id(booking_id)
+    booking = await get_booking_by_id(booking_id, session=session)
     
     if not booking:
         await callback.answer(t["cancel_error"], show_alert=True)
         # Обновляем список, так как эта запись исчезла
-        await start_cancel_process(callback, state)
+        await start_cancel_process(callback, state, session, user)
         return
     
 
@@ -63,13 +68,24 @@ async def process_cancel_booking(callback: CallbackQuery, state: FSMContext, bot
         "start_time_str": booking.start_time.strftime("%H:%M"),
         "end_time_str": booking.end_time.strftime("%H:%M"),
         "machine_type": booking.machine.type_machine, 
-        "machine_num": booking.machine.number_machine
+        "machine_num": booking.machine.number_machine,
+        "machine_id": booking.inidmachine,
+        "start_time": booking.start_time,
+        "end_time": booking.end_time
     }
 
     # 2. Удаляем запись
-    success = await cancel_booking(booking_id)
+    # Запрос подтверждения следующему в очереди пишется в outbox в транзакции отмены
+    # Отменяется только своя бронь: callback_data присылает клиент
+    result = await cancel_booking(booking_id, user_tg_id=user.tg_id, session=session, messages=waitlist_grant_messages)
     
-    if success:
+    if result:
+        # Напоминание и авто-отмена больше не нужны
+        try:
+            unschedule_booking_jobs(booking_id)
+        except Exception as e:
+            logging.error(f"Failed to unschedule jobs for booking {booking_id}: {e}")
+
         await callback.answer(t["cancel_confirm_success"], show_alert=True)
         
         # Возвращаем пользователя в меню или список
@@ -79,22 +95,23 @@ async def process_cancel_booking(callback: CallbackQuery, state: FSMContext, bot
         )
         await state.clear()
 
-        # 3. ЗАПУСКАЕМ РАССЫЛКУ (В ФОНЕ)
-        # Передаем bot, данные и ID того, кто отменил (чтобы ему не слать уведомление)
-        asyncio.create_task(
-            broadcast_slot_freed(bot, booking_data, exclude_tg_id=callback.from_user.id)
-        )
+        # 3. Слот уже отдан первому в очереди — ему запрос подтверждения, рассылка не нужна.
+        # Иначе слот попадет в ближайшую сводку (тому, кто отменил, о нем не пишем)
+        if result["handoff"] is not None:
+            schedule_waitlist_grant(result["handoff"])
+            outbox_worker.wake()
+        else:
+            slot_freed_digest.add(booking_data, exclude_tg_id=callback.from_user.id)
         
     else:
         await callback.answer(t["cancel_error"], show_alert=True)
 
 
 @cancel_record_router.callback_query(F.data == "back_to_sections", CancelRecord.waiting_for_cancel)
-async def back_from_cancel(callback: CallbackQuery, state: FSMContext):
+async def back_from_cancel(callback: CallbackQuery, state: FSMContext, user: Optional[Resident]):
     lang, t = await get_lang_and_texts(state)
     
-    # ДОБАВЛЕНО: Получаем user из БД
-    user = await get_user_by_tg_id(callback.from_user.id)
+    # user подставлен CurrentUserMiddleware
     if not user:
         await callback.answer(t["none_user"], show_alert=True)
         return
@@ -1,16 +1,18 @@
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.repositories.laundry_repo import get_booking_by_id, set_booking_status
+from app.db.models.booking import BookingStatus
 from app.bot.utils.translate import ALL_TEXTS
 
 confirm_router = Router()
 
 @confirm_router.callback_query(F.data.startswith("confirm_"))
-async def process_confirm(callback: CallbackQuery):
+async def process_confirm(callback: CallbackQuery, session: AsyncSession):
     booking_id = int(callback.data.split("_")[1])
     
     # Получаем бронь, чтобы узнать язык юзера (или берем из контекста, если юзер тот же)
-    booking = await get_booking_by_id(booking_id)
+    booking = await get_booking_by_id(booking_id, session=session)
     
     # Определяем язык (здесь берем дефолт RU, так как state может не быть, но можно достать из user repo)
     # Для простоты можно взять RU или попробовать достать язык из callback.from_user
@@ -23,14 +25,13 @@ async def process_confirm(callback: CallbackQuery):
         await callback.message.delete()
         return
 
-    if booking.status == 'Подтверждено':
+    # Подтвердить можно только ожидающую бронь: отмененную (например, слот из очереди
+    # не подтвердили вовремя) не возрождаем — переход проверяется в самом UPDATE
+    if not await set_booking_status(booking_id, BookingStatus.CONFIRMED, session=session):
          await callback.answer(t["booking_already_confirmed"], show_alert=True)
          # Можно удалить кнопку
          await callback.message.edit_reply_markup(reply_markup=None)
          return
-
-    # Обновляем статус
-    await set_booking_status(booking_id, "Подтверждено")
     
     await callback.message.edit_text(t["booking_confirmed"])
     await callback.answer()
\ No newline at end of file
@@ -2,10 +2,13 @@ from aiogram import Router, F
 from aiogram.types import CallbackQuery
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.bot.utils.translate import get_lang_and_texts
 from app.bot.keyboards import get_section_keyboard
 from app.bot.states import DisplayRecords
-from app.repositories.laundry_repo import get_user_by_tg_id, get_user_bookings, cancel_booking
+from app.db.models.residents import Resident
+from app.repositories.laundry_repo import get_user_bookings, cancel_booking
 import logging
 from app.bot.keyboards import get_back_to_sections_keyboard
 
@@ -13,16 +16,14 @@ records_router = Router()
 
 
 @records_router.callback_query(F.data == "show_records")
-async def show_records(callback: CallbackQuery, state: FSMContext):
+async def show_records(callback: CallbackQuery, state: FSMContext, session: AsyncSession, user: Optional[Resident]):
     lang, t = await get_lang_and_texts(state)
     await state.set_state(DisplayRecords.waiting_for_display)
-    user = await get_user_by_tg_id(callback.from_user.id)
-    
     if not user:
         await callback.answer(t["none_user"], show_alert=True)
         return
 
-    bookings = await get_user_bookings(user.id)
+    bookings = await get_user_bookings(user.id, session=session)
     
     back_kb = get_back_to_sections_keyboard(lang)
 
@@ -60,11 +61,10 @@ async def show_records(callback: CallbackQuery, state: FSMContext):
         pass
 
 @records_router.callback_query(F.data == "back_to_sections")
-async def back_from_records(callback: CallbackQuery, state: FSMContext):
+async def back_from_records(callback: CallbackQuery, state: FSMContext, user: Optional[Resident]):
     lang, t = await get_lang_and_texts(state)
     
-    # ДОБАВЛЕНО: Получаем user из БД
-    user = await get_user_by_tg_id(callback.from_user.id)
+    # user подставлен CurrentUserMiddleware
     if not user:
         await callback.answer(t["none_user"], show_alert=True)
         return
@@ -1,10 +1,13 @@
 from aiogram import Router, F, Bot
 from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.bot.utils.translate import get_lang_and_texts
 from app.bot.keyboards import get_section_keyboard, get_back_to_sections_keyboard
 from app.bot.states import Report
-from app.repositories.laundry_repo import get_user_by_tg_id, create_notification
+from app.db.models.residents import Resident
+from app.repositories.laundry_repo import create_notification
 
 report_router = Router()
 
@@ -22,10 +25,10 @@ async def report_problem(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @report_router.message(Report.waiting_for_report)
-async def process_report(message: Message, state: FSMContext, bot: Bot):
+async def process_report(message: Message, state: FSMContext, bot: Bot, session: AsyncSession, user: Optional[Resident]):
     lang, t = await get_lang_and_texts(state)
 
-    user = await get_user_by_tg_id(message.from_user.id)
+    # user подставлен CurrentUserMiddleware
  
     if not user:
         await message.answer(
@@ -45,7 +48,7 @@ async def process_report(message: Message, state: FSMContext, bot: Bot):
         # Остаемся в состоянии, чтобы пользователь мог отправить короче
         return
     
-    await create_notification(resident_id=user.id, description=report_text)
+    await create_notification(resident_id=user.id, description=report_text, session=session)
     
     # Отправляем подтверждение с кнопкой "Назад" вместо главного меню
     await message.answer(
@@ -57,11 +60,10 @@ async def process_report(message: Message, state: FSMContext, bot: Bot):
 
 # Обработка нажатия "Назад" из состояния Report
 @report_router.callback_query(F.data == "back_to_sections", Report.waiting_for_report)
-async def back_from_report(callback: CallbackQuery, state: FSMContext):
+async def back_from_report(callback: CallbackQuery, state: FSMContext, user: Optional[Resident]):
     lang, t = await get_lang_and_texts(state)
     
-    # ДОБАВЛЕНО: Получаем user из БД
-    user = await get_user_by_tg_id(callback.from_user.id)
+    # user подставлен CurrentUserMiddleware
     if not user:
         await callback.answer(t["none_user"], show_alert=True)
         return
@@ -1,6 +1,7 @@
 from aiogram.types import (InlineKeyboardMarkup,
                            InlineKeyboardButton)
 from datetime import datetime, timedelta
+from app.config.config import WORK_START, WORK_END, SLOT_DURATION
 from app.locales import ru, en, cn 
 
 # Объединяем словари локализации
@@ -60,7 +61,7 @@ def get_time_slots_keyboard(date: datetime, slots: list[datetime], lang: str) ->
     t = ALL_TEXTS.get(lang, ALL_TEXTS["RU"])
     buttons = []
 
-    DURATION = timedelta(minutes=90) # Длительность одной записи - 90 минут
+    DURATION = timedelta(minutes=SLOT_DURATION) # Длительность одной записи
 
     for slot in slots:
         start_time = slot
@@ -73,6 +74,41 @@ def get_time_slots_keyboard(date: datetime, slots: list[datetime], lang: str) ->
         callback = f"time_{date.year}_{date.month}_{date.day}_{slot.hour}_{slot.minute}"
         buttons.append([InlineKeyboardButton(text=text, callback_data=callback)])
 
+    # Подписка на освободившиеся слоты этого дня
+    buttons.append([InlineKeyboardButton(text=t["subscribe_btn"], callback_data="subscribe_day")])
+    buttons.append([InlineKeyboardButton(text=t["back"], callback_data="back_to_calendar")])
+    buttons.append([InlineKeyboardButton(text=t["exit"], callback_data="exit")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+# Интервалы для подписки на освободившиеся слоты (часы начала и конца):
+# рабочий день, поделенный на три части — при 8..23 это 8-13, 13-18, 18-23
+_RANGE_BOUNDS = [WORK_START + (WORK_END - WORK_START) * i // 3 for i in range(4)]
+SUBSCRIPTION_RANGES = list(zip(_RANGE_BOUNDS, _RANGE_BOUNDS[1:]))
+
+def get_subscription_range_keyboard(lang: str) -> InlineKeyboardMarkup:
+    t = ALL_TEXTS.get(lang, ALL_TEXTS["RU"])
+    buttons = [
+        [InlineKeyboardButton(text=f"{start:02d}:00 - {end:02d}:00", callback_data=f"subrange_{start}_{end}")]
+        for start, end in SUBSCRIPTION_RANGES
+    ]
+    buttons.append([InlineKeyboardButton(
+        text=t["subscribe_whole_day"],
+        callback_data=f"subrange_{SUBSCRIPTION_RANGES[0][0]}_{SUBSCRIPTION_RANGES[-1][1]}"
+    )])
+    buttons.append([InlineKeyboardButton(text=t["back"], callback_data="back_to_time_slots")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+def get_waitlist_keyboard(date: datetime, slots: list[datetime], lang: str) -> InlineKeyboardMarkup:
+    """Слоты занятого дня: нажатие ставит в очередь на это время."""
+    t = ALL_TEXTS.get(lang, ALL_TEXTS["RU"])
+    DURATION = timedelta(minutes=SLOT_DURATION)
+    buttons = [
+        [InlineKeyboardButton(
+            text=f"🕒 {slot.strftime('%H:%M')} - {(slot + DURATION).strftime('%H:%M')}",
+            callback_data=f"wait_{date.year}_{date.month}_{date.day}_{slot.hour}_{slot.minute}"
+        )]
+        for slot in slots
+    ]
     buttons.append([InlineKeyboardButton(text=t["back"], callback_data="back_to_calendar")])
     buttons.append([InlineKeyboardButton(text=t["exit"], callback_data="exit")])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
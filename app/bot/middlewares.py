@@ -0,0 +1,50 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.repositories.laundry_repo import get_user_by_tg_id
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """
+    Открывает одну AsyncSession на весь Telegram-апдейт и передает ее в хендлеры
+    как аргумент `session`. Все вызовы laundry_repo внутри апдейта используют ее,
+    поэтому на апдейт приходится одно соединение вместо отдельного на каждый запрос.
+    """
+
+    def __init__(self, session_pool: async_sessionmaker):
+        self.session_pool = session_pool
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        async with self.session_pool() as session:
+            data["session"] = session
+            return await handler(event, data)
+
+
+class CurrentUserMiddleware(BaseMiddleware):
+    """
+    Кладет в аргумент `user` жильца, привязанного к отправителю апдейта
+    (или None, если он еще не прошел авторизацию). Жилец берется из кэша
+    laundry_repo.resident_cache, поэтому БД затрагивается только при промахе.
+    Должен регистрироваться после DbSessionMiddleware.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        data["user"] = (
+            await get_user_by_tg_id(from_user.id, session=data.get("session"))
+            if from_user else None
+        )
+        return await handler(event, data)
@@ -1,21 +1,48 @@
 import asyncio
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from aiogram import Bot
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.jobstores.base import JobLookupError
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+from app.config.config import SCHEDULER_JOBSTORE_URL, OUTBOX_RETENTION_DAYS, MACHINES_REFRESH_INTERVAL, BOOKING_ARCHIVE_AFTER_DAYS
 from app.repositories.laundry_repo import (
-    get_bookings_to_remind,
-    set_booking_status,
-    get_expired_unconfirmed_bookings,
-    cancel_booking
+    get_pending_bookings,
+    claim_due_reminders,
+    claim_expired_bookings,
+    purge_expired_subscriptions,
+    purge_expired_waitlist,
+    archive_finished_bookings,
+    read_flight
 )
+from app.repositories.outbox_repo import purge_outbox
+from app.db.replica import replica_router
+from app.repositories.occupancy import occupancy
+from app.repositories.machines import machine_registry
+from app.repositories.change_feed import change_feed
 from app.bot.utils.translate import ALL_TEXTS
-from app.bot.utils.broadcaster import broadcast_slot_freed
+from app.bot.utils.broadcaster import slot_freed_digest
+from app.bot.utils.outbox_worker import outbox_worker, outbox_message
 from app.bot.keyboards import get_exit_keyboard
 
-scheduler = AsyncIOScheduler()
+# Запрос подтверждения — за 40 минут до начала, авто-отмена неподтвержденной брони — за 30
+REMIND_BEFORE = timedelta(minutes=40)
+CONFIRM_DEADLINE_BEFORE = timedelta(minutes=30)
+# Минимум времени на ответ, если запрос ушел с опозданием (бронь создана меньше чем за 40 минут)
+CONFIRM_ANSWER_TIME = timedelta(minutes=5)
+
+# Задачи по броням хранятся в БД и переживают перезапуск бота. При нескольких
+# экземплярах SCHEDULER_JOBSTORE_URL должен указывать на общую БД, иначе задачи,
+# поставленные ведомыми, подберет только сверка check_confirmations.
+# Периодические задачи заново добавляются при старте, поэтому им хватает памяти.
+scheduler = AsyncIOScheduler(jobstores={
+    "default": SQLAlchemyJobStore(url=SCHEDULER_JOBSTORE_URL),
+    "memory": MemoryJobStore(),
+})
+# Фоновые задачи, которые нужны каждому экземпляру (кэши в памяти процесса)
+local_scheduler = AsyncIOScheduler()
 
 
 async def _safe_create_task(coro):
@@ -37,159 +64,444 @@ async def _safe_create_task(coro):
     return task
 
 
-async def check_confirmations(bot: Bot):
+def _get_texts(user) -> dict:
+    lang = getattr(user, "language", None)
+    t = ALL_TEXTS.get(lang) if lang else None
+    if not t:
+        t = ALL_TEXTS.get("RU") or ALL_TEXTS.get("ENG") or list(ALL_TEXTS.values())[0]
+    return t
+
+
+def _format_booking(row, t: dict, sep: str) -> dict:
+    """Поля брони для текстов уведомлений: дата, интервал, тип и номер машины."""
+    try:
+        date_str = row.start_time.strftime("%d.%m")
+        start_time_str = row.start_time.strftime("%H:%M")
+        end_time_str = row.end_time.strftime("%H:%M")
+    except Exception:
+        date_str = ""
+        start_time_str = ""
+        end_time_str = ""
+
+    raw_type = row.type_machine or ""
+    if raw_type == "Стиральная":
+        machine_type = t.get("machine_type_wash", "Стиральная")
+    elif raw_type == "Сушильная":
+        machine_type = t.get("machine_type_dry", "Сушильная")
+    else:
+        machine_type = raw_type or "Неизвестная"
+
+    return {
+        "date": date_str,
+        "time_range": f"{start_time_str}{sep}{end_time_str}",
+        "machine_type": machine_type,
+    }
+
+
+def _confirmation_message(row) -> dict:
+    """Запрос владельцу брони на подтверждение (кнопка)."""
+    t = _get_texts(row)
+    kb = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=t.get("confirm_btn", "Confirm"), callback_data=f"confirm_{row.id}")]
+    ])
+
+    fields = _format_booking(row, t, " - ")
+    machine_num = row.number_machine if row.number_machine is not None else "?"
+
+    confirm_text = t.get(
+        "confirm_booking_prompt",
+        "⏳ <b>Booking confirmation</b>\n\n"
+        "You have scheduled {machine_type} machine №{machine_num} on <b>{date}</b> "
+        "(time: {time_range}).\n"
+        "Please confirm, otherwise it will be canceled in 10 minutes."
+    ).format(
+        machine_type=fields["machine_type"],
+        machine_num=machine_num,
+        date=fields["date"],
+        time_range=fields["time_range"]
+    )
+    return outbox_message(row.tg_id, confirm_text, kb, dedupe_key=f"remind:{row.id}")
+
+
+def _confirmation_messages(rows) -> list:
+    return [_confirmation_message(row) for row in rows if row.tg_id]
+
+
+def _autocancel_message(row) -> dict:
+    """Сообщение владельцу об авто-отмене брони."""
+    t = _get_texts(row)
+    fields = _format_booking(row, t, "-")
+    machine_num = row.number_machine if row.number_machine is not None else ""
+
+    autocancel_text = t.get(
+        "booking_autocanceled",
+        "❌ Your booking Date: {date} Time: {time_range} Machine: {machine_type} №{machine_num} was automatically canceled."
+    ).format(
+        date=fields["date"],
+        time_range=fields["time_range"],
+        machine_type=fields["machine_type"],
+        machine_num=machine_num
+    )
+    return outbox_message(
+        row.tg_id, autocancel_text, get_exit_keyboard(row.language or "RU"), dedupe_key=f"autocancel:{row.id}"
+    )
+
+
+def _autocancel_messages(rows, handoffs) -> list:
+    """Владельцам — об авто-отмене, жильцам из очереди — о доставшемся слоте."""
+    return (
+        [_autocancel_message(row) for row in rows if row.tg_id]
+        + [message for granted in handoffs for message in waitlist_grant_messages(granted)]
+    )
+
+
+def _freed_slot_data(row) -> dict:
+    """Поля освободившегося слота для сводки slot_freed_digest."""
+    return {
+        "date_str": row.start_time.strftime("%d.%m"),
+        "start_time_str": row.start_time.strftime("%H:%M"),
+        "end_time_str": row.end_time.strftime("%H:%M"),
+        "machine_type": row.type_machine or "",
+        "machine_num": row.number_machine if row.number_machine is not None else "",
+        "machine_id": row.inidmachine,
+        "start_time": row.start_time,
+        "end_time": row.end_time
+    }
+
+
+def waitlist_grant_messages(row) -> list:
     """
-    1) Находит записи за 40 минут до начала и рассылает запрос на подтверждение (кнопка).
-    2) Находит записи за 30 минут до начала, которые не подтверждены -> авто-отмена.
-    На ответ даётся 10 минут.
+    Слот из очереди достался жильцу: запрос подтверждения со сроком confirm_deadline.
+    Передается в cancel_booking / claim_expired_bookings, чтобы попасть в outbox в той
+    же транзакции, что и сама бронь.
     """
-    now = datetime.now()
-    logging.debug(f"check_confirmations run at {now.isoformat()}")
+    if not row.tg_id:
+        return []
+
+    t = _get_texts(row)
+    kb = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=t.get("confirm_btn", "Confirm"), callback_data=f"confirm_{row.id}")]
+    ])
+    fields = _format_booking(row, t, " - ")
+    text = t.get(
+        "waitlist_granted_prompt",
+        "🎉 A slot you were waiting for is yours: {machine_type} machine №{machine_num} on <b>{date}</b> "
+        "(time: {time_range}).\nConfirm it by {deadline}, otherwise it goes to the next in line."
+    ).format(
+        machine_type=fields["machine_type"],
+        machine_num=row.number_machine if row.number_machine is not None else "?",
+        date=fields["date"],
+        time_range=fields["time_range"],
+        deadline=row.confirm_deadline.strftime("%H:%M")
+    )
+    return [outbox_message(row.tg_id, text, kb, dedupe_key=f"grant:{row.id}")]
+
+
+def schedule_waitlist_grant(row):
+    """Ставит авто-отмену брони из очереди на confirm_deadline: не подтвердит — слот уйдет дальше."""
+    _add_booking_job(_deadline_job_id(row.id), autocancel_unconfirmed, row.id, row.confirm_deadline, row.start_time)
+    logging.info(f"Granted waitlisted slot as booking {row.id} to {row.tg_id}")
+
+
+# ---------- задачи по конкретной брони ----------
 
-    # --- ЭТАП 1: Рассылка запросов на подтверждение (за 40 минут) ---
+def _remind_job_id(booking_id: int) -> str:
+    return f"booking:{booking_id}:remind"
+
+
+def _deadline_job_id(booking_id: int) -> str:
+    return f"booking:{booking_id}:deadline"
+
+
+def _remove_job(job_id: str):
+    try:
+        scheduler.remove_job(job_id)
+    except JobLookupError:
+        pass
+
+
+async def run_reminders() -> int:
+    """
+    Одним UPDATE ... RETURNING забирает все брони, которым пора напомнить, и в той же
+    транзакции кладет запросы подтверждения в outbox. Бронь, уже получившая reminded_at,
+    повторно не попадет сюда ни из задачи, ни из сверки.
+    """
     try:
-        bookings_to_remind = await get_bookings_to_remind(minutes_before=40)
+        rows = await claim_due_reminders(REMIND_BEFORE, messages=_confirmation_messages)
     except Exception as e:
-        logging.error(f"Failed to fetch bookings_to_remind: {e}")
-        bookings_to_remind = []
+        logging.error(f"Failed to claim due reminders: {e}")
+        return 0
 
-    for b in bookings_to_remind:
-        user = getattr(b, "user", None)
-        if not user or not getattr(user, "tg_id", None):
-            continue
+    now = datetime.now()
+    for row in rows:
+        # Задачи соседей по волне уже не нужны — их брони обработаны этим проходом
+        _remove_job(_remind_job_id(row.id))
+        # Опоздавшее напоминание (бронь создана позже, простой) сдвигает дедлайн,
+        # чтобы у владельца было время ответить
+        deadline_at = max(row.start_time - CONFIRM_DEADLINE_BEFORE, now + CONFIRM_ANSWER_TIME)
+        if deadline_at > row.start_time - CONFIRM_DEADLINE_BEFORE and deadline_at < row.start_time:
+            _add_booking_job(_deadline_job_id(row.id), autocancel_unconfirmed, row.id, deadline_at, row.start_time)
 
-        lang = getattr(user, "language", None)
-        t = ALL_TEXTS.get(lang) if lang else None
-        if not t:
-            t = ALL_TEXTS.get("RU") or ALL_TEXTS.get("ENG") or list(ALL_TEXTS.values())[0]
+    if rows:
+        outbox_worker.wake()
+    return len(rows)
 
-        kb = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text=t.get("confirm_btn", "Confirm"), callback_data=f"confirm_{b.id}")]
-        ])
 
-        # Общие параметры для текста
-        try:
-            date_str = b.start_time.strftime("%d.%m")
-            start_time_str = b.start_time.strftime("%H:%M")
-            end_time_str = b.end_time.strftime("%H:%M")
-        except Exception:
-            date_str = ""
-            start_time_str = ""
-            end_time_str = ""
-
-        time_range = f"{start_time_str} - {end_time_str}"
-
-        raw_type = getattr(b.machine, "type_machine", "") if getattr(b, "machine", None) else ""
-        if raw_type == "Стиральная":
-            machine_type = t.get("machine_type_wash", "Стиральная")
-        elif raw_type == "Сушильная":
-            machine_type = t.get("machine_type_dry", "Сушильная")
-        else:
-            machine_type = raw_type or "Неизвестная"
-
-        machine_num = getattr(b.machine, "number_machine", "?") if getattr(b, "machine", None) else "?"
-
-        confirm_text = t.get(
-            "confirm_booking_prompt",
-            "⏳ <b>Booking confirmation</b>\n\n"
-            "You have scheduled {machine_type} machine №{machine_num} on <b>{date}</b> "
-            "(time: {time_range}).\n"
-            "Please confirm, otherwise it will be canceled in 10 minutes."
-        ).format(
-            machine_type=machine_type,
-            machine_num=machine_num,
-            date=date_str,
-            time_range=time_range
+async def run_autocancels() -> int:
+    """
+    Одним UPDATE ... RETURNING отменяет все неподтвержденные брони с прошедшим дедлайном.
+    Освободившиеся слоты в той же транзакции уходят следующим в очереди, и туда же,
+    в outbox, пишутся уведомления владельцам и запросы подтверждения новым.
+    Слоты, которые никому не достались, попадают в сводку о свободных местах.
+    """
+    try:
+        rows, handoffs = await claim_expired_bookings(
+            CONFIRM_DEADLINE_BEFORE, CONFIRM_ANSWER_TIME, messages=_autocancel_messages
         )
+    except Exception as e:
+        logging.error(f"Failed to claim expired bookings: {e}")
+        return 0
 
-        try:
-            await bot.send_message(user.tg_id, confirm_text, reply_markup=kb, parse_mode="HTML")
-            await set_booking_status(b.id, "Ожидание")
-            logging.info(f"Sent confirmation request for booking {b.id} to {user.tg_id}")
-            await asyncio.sleep(0.05)
-        except Exception as e:
-            logging.error(f"Failed to send confirm request to {getattr(user, 'tg_id', None)}: {e}")
+    handed_off = {(h.inidmachine, h.start_time) for h in handoffs}
+    for row in rows:
+        unschedule_booking_jobs(row.id)
+        logging.info(f"Autocanceled booking {row.id} due to no confirmation")
+        if (row.inidmachine, row.start_time) not in handed_off:
+            # Авто-отмены одной волны уходят жильцам одной сводкой
+            slot_freed_digest.add(_freed_slot_data(row), exclude_tg_id=row.tg_id)
+    for granted in handoffs:
+        schedule_waitlist_grant(granted)
+
+    if rows:
+        outbox_worker.wake()
+    return len(rows)
+
+
+async def send_confirmation_request(booking_id: int):
+    """Задача: за 40 минут до начала брони — запросы подтверждения всем, кому пора (пачкой)."""
+    await run_reminders()
+
+
+async def autocancel_unconfirmed(booking_id: int):
+    """Задача: за 30 минут до начала брони — отмена всех неподтвержденных с прошедшим дедлайном (пачкой)."""
+    await run_autocancels()
+
+
+def _add_booking_job(job_id: str, func, booking_id: int, run_at: datetime, valid_until: datetime):
+    scheduler.add_job(
+        func,
+        'date',
+        run_date=run_at,
+        args=[booking_id],
+        id=job_id,
+        replace_existing=True,
+        misfire_grace_time=max(int((valid_until - run_at).total_seconds()), 1)
+    )
+
+
+def schedule_booking_jobs(booking_id: int, start_time: datetime, only_missing: bool = False) -> int:
+    """
+    Ставит на точное время напоминание и дедлайн подтверждения брони.
+    Если время напоминания уже прошло, а дедлайн еще нет — напоминание уходит сразу.
+    only_missing=True (для сверки) не трогает уже стоящие задачи и не ставит
+    напоминание задним числом: оно могло уже сработать. Возвращает число новых задач.
+    """
+    now = datetime.now()
+    remind_at = start_time - REMIND_BEFORE
+    deadline_at = start_time - CONFIRM_DEADLINE_BEFORE
+    added = 0
+
+    jobs = []
+    if deadline_at > now and not (only_missing and remind_at <= now):
+        # Пропущенное из-за простоя напоминание еще имеет смысл до дедлайна
+        jobs.append((_remind_job_id(booking_id), send_confirmation_request, max(remind_at, now), deadline_at))
+    if start_time > now:
+        jobs.append((_deadline_job_id(booking_id), autocancel_unconfirmed, max(deadline_at, now), start_time))
+
+    for job_id, func, run_at, valid_until in jobs:
+        if only_missing and scheduler.get_job(job_id):
             continue
+        _add_booking_job(job_id, func, booking_id, run_at, valid_until)
+        added += 1
+    return added
+
+
+def unschedule_booking_jobs(booking_id: int):
+    """Снимает задачи брони (бронь отменена)."""
+    for job_id in (_remind_job_id(booking_id), _deadline_job_id(booking_id)):
+        _remove_job(job_id)
+
+
+async def check_confirmations():
+    """
+    Сверочный проход: добирает пропущенные напоминания и авто-отмены (по одному
+    UPDATE ... RETURNING на каждое) и ставит задачи для неподтвержденных броней,
+    которых нет в хранилище (бронь создана в обход бота, хранилище потеряно и т.п.).
+    """
+    now = datetime.now()
+    logging.debug(f"check_confirmations run at {now.isoformat()}")
+
+    reminded = await run_reminders()
+    canceled = await run_autocancels()
+    if reminded or canceled:
+        logging.warning(f"check_confirmations: caught up {reminded} reminders, {canceled} autocancels")
 
-    # --- ЭТАП 2: Авто-отмена (за 30 минут) ---
     try:
-        expired = await get_expired_unconfirmed_bookings(minutes_before_deadline=30)
+        pending = await get_pending_bookings(now + CONFIRM_DEADLINE_BEFORE)
     except Exception as e:
-        logging.error(f"Failed to fetch expired unconfirmed bookings: {e}")
-        expired = []
+        logging.error(f"Failed to fetch pending bookings: {e}")
+        return
 
-    for b in expired:
-        try:
-            await cancel_booking(b.id)
-            logging.info(f"Autocanceled booking {b.id} due to no confirmation")
-        except Exception as e:
-            logging.error(f"Failed to cancel booking {b.id}: {e}")
-            continue
+    added = sum(schedule_booking_jobs(b.id, b.start_time, only_missing=True) for b in pending)
+    if added:
+        logging.warning(f"check_confirmations: scheduled {added} missing booking jobs")
+
+
+async def reconcile_occupancy():
+    """Сверяет занятость в памяти с БД и логирует, насколько она разошлась."""
+    try:
+        drift = await occupancy.reconcile()
+        logging.info(f"Occupancy reconciled, drift={drift}, stats={occupancy.stats()}")
+        logging.info(f"Read coalescing: {read_flight.stats()}")
+        logging.info(f"Read routing: {replica_router.stats()}")
+        logging.info(f"Cache change feed: {change_feed.stats()}")
+    except Exception as e:
+        logging.error(f"Failed to reconcile occupancy: {e}")
+
+
+async def refresh_machines():
+    """Страховка к NOTIFY machines_changed: перечитывает каталог машин по таймеру."""
+    try:
+        if await machine_registry.refresh():
+            logging.info(f"Machine catalog refreshed, stats={machine_registry.stats()}")
+    except Exception as e:
+        logging.error(f"Failed to refresh machine catalog: {e}")
+
+
+async def purge_subscriptions():
+    """Удаляет подписки на освободившиеся слоты за прошедшие дни и очередь на прошедшие слоты."""
+    try:
+        removed = await purge_expired_subscriptions()
+        logging.info(f"Purged {removed} expired slot subscriptions")
+    except Exception as e:
+        logging.error(f"Failed to purge slot subscriptions: {e}")
+    try:
+        removed = await purge_expired_waitlist()
+        logging.info(f"Purged {removed} expired waitlist entries")
+    except Exception as e:
+        logging.error(f"Failed to purge waitlist: {e}")
+
+
+async def purge_outbox_messages():
+    """Удаляет из outbox доставленные и списанные сообщения старше OUTBOX_RETENTION_DAYS."""
+    try:
+        removed = await purge_outbox(timedelta(days=OUTBOX_RETENTION_DAYS))
+        logging.info(f"Purged {removed} old outbox messages")
+    except Exception as e:
+        logging.error(f"Failed to purge outbox: {e}")
+
+
+async def archive_bookings():
+    """Переносит завершенные брони старше BOOKING_ARCHIVE_AFTER_DAYS в booking_archive."""
+    try:
+        moved = await archive_finished_bookings(timedelta(days=BOOKING_ARCHIVE_AFTER_DAYS))
+        logging.info(f"Archived {moved} finished bookings")
+    except Exception as e:
+        logging.error(f"Failed to archive bookings: {e}")
 
-        user = getattr(b, "user", None)
-        if user and getattr(user, "tg_id", None):
-            lang = getattr(user, "language", None)
-            t = ALL_TEXTS.get(lang) if lang else None
-            if not t:
-                t = ALL_TEXTS.get("RU") or ALL_TEXTS.get("ENG") or list(ALL_TEXTS.values())[0]
-
-            try:
-                date_str = b.start_time.strftime("%d.%m")
-                start_time_str = b.start_time.strftime("%H:%M")
-                end_time_str = b.end_time.strftime("%H:%M")
-            except Exception:
-                date_str = ""
-                start_time_str = ""
-                end_time_str = ""
-
-            time_range = f"{start_time_str}-{end_time_str}"
-
-            raw_type = getattr(b.machine, "type_machine", "") if getattr(b, "machine", None) else ""
-            if raw_type == "Стиральная":
-                machine_type = t.get("machine_type_wash", "Стиральная")
-            elif raw_type == "Сушильная":
-                machine_type = t.get("machine_type_dry", "Сушильная")
-            else:
-                machine_type = raw_type or "Неизвестная"
-
-            machine_num = getattr(b.machine, "number_machine", "") if getattr(b, "machine", None) else ""
-
-            autocancel_text = t.get(
-                "booking_autocanceled",
-                "❌ Your booking Date: {date} Time: {time_range} Machine: {machine_type} №{machine_num} was automatically canceled."
-            ).format(
-                date=date_str,
-                time_range=time_range,
-                machine_type=machine_type,
-                machine_num=machine_num
-            )
-
-            try:
-                await bot.send_message(user.tg_id, 
-                                       autocancel_text, 
-                                       reply_markup=get_exit_keyboard(lang))
-            except Exception as e:
-                logging.error(f"Failed to notify owner {user.tg_id} about autocancel: {e}")
-
-        # Рассылка о свободном слоте
-        booking_data = {
-            "date_str": b.start_time.strftime("%d.%m"),
-            "start_time_str": b.start_time.strftime("%H:%M"),
-            "end_time_str": b.end_time.strftime("%H:%M"),
-            "machine_type": getattr(b.machine, "type_machine", "") if getattr(b, "machine", None) else "",
-            "machine_num": getattr(b.machine, "number_machine", "") if getattr(b, "machine", None) else ""
-        }
-        await _safe_create_task(broadcast_slot_freed(bot, booking_data, exclude_tg_id=getattr(user, "tg_id", None)))
-
-
-def start_scheduler(bot: Bot):
+
+async def _poll_jobstore():
+    """
+    Пустая задача: будит планировщик, чтобы он перечитал хранилище задач. Нужна, когда
+    хранилище общее для нескольких экземпляров — задачи, добавленные на ведомых,
+    иначе заметили бы только при следующем известном ведущему сроке.
+    """
+
+
+def start_scheduler(paused: bool = False):
+    """
+    Запускает планировщики. Задачи по броням и сверка работают только на ведущем
+    экземпляре: с paused=True планировщик запускается на паузе (задачи по-прежнему
+    можно добавлять и снимать), пока resume_scheduler не вызовет выбор ведущего.
+    Сверка занятости и каталога машин в памяти нужна каждому экземпляру и идет в local_scheduler.
+    """
     scheduler.add_job(
         check_confirmations,
         'interval',
+        minutes=15,
+        next_run_time=datetime.now(),
+        id="check_confirmations",
+        replace_existing=True,
+        jobstore="memory",
+        max_instances=1,
+        coalesce=True
+    )
+    scheduler.add_job(
+        purge_subscriptions,
+        'cron',
+        hour=0,
+        minute=5,
+        id="purge_subscriptions",
+        replace_existing=True,
+        jobstore="memory",
+        coalesce=True
+    )
+    scheduler.add_job(
+        purge_outbox_messages,
+        'cron',
+        hour=0,
+        minute=10,
+        id="purge_outbox",
+        replace_existing=True,
+        jobstore="memory",
+        coalesce=True
+    )
+    scheduler.add_job(
+        archive_bookings,
+        'cron',
+        hour=3,
+        minute=30,
+        id="archive_bookings",
+        replace_existing=True,
+        jobstore="memory",
+        max_instances=1,
+        coalesce=True
+    )
+    scheduler.add_job(
+        _poll_jobstore,
+        'interval',
         minutes=1,
-        kwargs={"bot": bot},
+        id="poll_jobstore",
+        replace_existing=True,
+        jobstore="memory",
+        coalesce=True
+    )
+    local_scheduler.add_job(
+        refresh_machines,
+        'interval',
+        seconds=MACHINES_REFRESH_INTERVAL,
         max_instances=1,
         coalesce=True
     )
-    scheduler.start()
-    logging.info("Scheduler started")
\ No newline at end of file
+    local_scheduler.add_job(
+        reconcile_occupancy,
+        'interval',
+        minutes=10,
+        max_instances=1,
+        coalesce=True
+    )
+    scheduler.start(paused=paused)
+    local_scheduler.start()
+    logging.info(f"Scheduler started{' (paused until elected leader)' if paused else ''}")
+
+
+async def resume_scheduler():
+    """Экземпляр стал ведущим: выполняет задачи, в том числе пропущенные в пределах misfire_grace_time."""
+    scheduler.resume()
+    logging.info("Scheduler resumed on leader")
+
+
+async def pause_scheduler():
+    """Экземпляр перестал быть ведущим: задачи больше не выполняются здесь."""
+    scheduler.pause()
+    logging.info("Scheduler paused, this instance is not the leader")
@@ -1,30 +1,58 @@
-# broadcaster.py (полный обновленный код)
-
 import asyncio
 import logging
-from aiogram import Bot
-from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from aiogram.types import InlineKeyboardMarkup
+
+from app.config.config import SLOT_DIGEST_WINDOW
 from app.bot.utils.translate import ALL_TEXTS
-from app.repositories.laundry_repo import get_all_users_with_tg
-from app.bot.keyboards import get_exit_keyboard  # <--- ДОБАВЬТЕ ИМПОРТ
+from app.bot.utils.outbox_worker import outbox_worker, outbox_message
+from app.repositories.laundry_repo import get_slot_subscribers, get_taken_slots
+from app.repositories.outbox_repo import enqueue_messages
+from app.bot.keyboards import get_exit_keyboard
 
-async def broadcast_slot_freed(bot: Bot, booking_data: dict, exclude_tg_id: int = None):
-    users = await get_all_users_with_tg()
-    count = 0
 
-    for u in users:
-        if exclude_tg_id is not None and getattr(u, "tg_id", None) == exclude_tg_id:
-            continue
+def _render_slot_freed(lang: str, booking_data: dict) -> Tuple[str, InlineKeyboardMarkup]:
+    """Текст и клавиатура уведомления на одном языке."""
+    t = ALL_TEXTS.get(lang) or ALL_TEXTS.get("RU")
 
-        tg_id = getattr(u, "tg_id", None)
-        if not tg_id:
-            continue
+    # 1. Исправление типа машины (база хранит "Стиральная"/"Сушильная")
+    raw_type = booking_data.get("machine_type", "")
+    if raw_type == "Стиральная":
+        m_type = t.get("machine_type_wash", "Стиральная")
+    elif raw_type == "Сушильная":
+        m_type = t.get("machine_type_dry", "Сушильная")
+    else:
+        m_type = raw_type
+
+    # 2. Исправление времени (используем ключи из scheduler.py)
+    # Формируем интервал: "14:00 – 15:30"
+    time_range = f"{booking_data.get('start_time_str')} – {booking_data.get('end_time_str')}"
+
+    # Формируем текст (включаем parse_mode="HTML" для поддержки <b> из словарей)
+    notification_text = t.get(
+        "slot_freed_notification",
+        "🔔 <b>Slot available!</b>\n\n📅 Date: {date}\n⏰ Time: {time}\n🧺 {m_type} #{m_num}"
+    ).format(
+        date=booking_data.get("date_str", ""),
+        time=time_range,  # Передаем сформированную строку
+        m_type=m_type,
+        m_num=booking_data.get("machine_num", "")
+    )
+    return notification_text, get_exit_keyboard(lang if lang in ALL_TEXTS else "RU")
 
-        # Выбор локали
-        lang = getattr(u, "language", "RU")
-        t = ALL_TEXTS.get(lang) or ALL_TEXTS.get("RU")
 
-        # 1. Исправление типа машины (база хранит "Стиральная"/"Сушильная")
+def _render_slots_freed(lang: str, slots: List[dict]) -> Tuple[str, InlineKeyboardMarkup]:
+    """Один слот — обычное уведомление, несколько — сводка со строкой на каждый слот."""
+    if len(slots) == 1:
+        return _render_slot_freed(lang, slots[0])
+
+    t = ALL_TEXTS.get(lang) or ALL_TEXTS.get("RU")
+    lines = []
+    for booking_data in slots:
         raw_type = booking_data.get("machine_type", "")
         if raw_type == "Стиральная":
             m_type = t.get("machine_type_wash", "Стиральная")
@@ -32,36 +60,131 @@ async def broadcast_slot_freed(bot: Bot, booking_data: dict, exclude_tg_id: int
             m_type = t.get("machine_type_dry", "Сушильная")
         else:
             m_type = raw_type
-
-        # 2. Исправление времени (используем ключи из scheduler.py)
-        # Формируем интервал: "14:00 – 15:30"
-        time_range = f"{booking_data.get('start_time_str')} – {booking_data.get('end_time_str')}"
-
-        # Формируем текст (включаем parse_mode="HTML" для поддержки <b> из словарей)
-        notification_text = t.get(
-            "slot_freed_notification",
-            "🔔 <b>Slot available!</b>\n\n📅 Date: {date}\n⏰ Time: {time}\n🧺 {m_type} #{m_num}"
-        ).format(
+        lines.append(t.get("slots_freed_digest_line", "📅 {date} ⏰ {time} — {m_type} #{m_num}").format(
             date=booking_data.get("date_str", ""),
-            time=time_range,  # Передаем сформированную строку
+            time=f"{booking_data.get('start_time_str')} – {booking_data.get('end_time_str')}",
             m_type=m_type,
             m_num=booking_data.get("machine_num", "")
-        )
+        ))
+    text = t.get("slots_freed_digest", "🔔 <b>Slots available!</b>\n\n{slots}").format(slots="\n".join(lines))
+    return text, get_exit_keyboard(lang if lang in ALL_TEXTS else "RU")
+
+
+async def broadcast_slots_freed(slots: List[dict], excluded: Optional[Dict[int, Set[int]]] = None) -> dict:
+    """
+    Ставит подписчикам освободившихся слотов в outbox одно сообщение со всеми совпавшими
+    слотами. excluded: tg_id -> индексы слотов, о которых этому жильцу писать не нужно
+    (сам отменил). Получатели берутся из индекса подписок, а не из списка всех жильцов,
+    текст собирается один раз на язык и набор слотов. Сама отправка (лимиты Telegram,
+    повторы) — дело outbox_worker. Возвращает статистику.
+    """
+    excluded = excluded or {}
+    started = time.monotonic()
+    rendered: Dict[Tuple[str, Tuple[int, ...]], Tuple[str, InlineKeyboardMarkup]] = {}
+
+    subscribers = await get_slot_subscribers([
+        (b["start_time"], b["end_time"], b.get("machine_type")) for b in slots
+    ])
+    # Несколько жильцов с одним tg_id уже слиты в один ключ — шлем ему одно сообщение
+    messages = []
+    for tg_id, (lang, matched) in subscribers.items():
+        own = excluded.get(tg_id)
+        indices = tuple(sorted(matched - own if own else matched))
+        if not indices:
+            continue
+        key = (lang, indices)
+        if key not in rendered:
+            rendered[key] = _render_slots_freed(lang, [slots[i] for i in indices])
+        text, keyboard = rendered[key]
+        messages.append(outbox_message(tg_id, text, keyboard))
+
+    queued = await enqueue_messages(messages)
+    if queued:
+        outbox_worker.wake()
+
+    stats = {
+        "queued": queued,
+        "slots": len(slots),
+        "subscribers": len(subscribers),
+        "elapsed": round(time.monotonic() - started, 3),
+    }
+    logging.info(
+        f"Broadcast of {len(slots)} freed slots queued {queued} messages for "
+        f"{len(subscribers)} subscribers in {stats['elapsed']}s."
+    )
+    return stats
+
+
+async def broadcast_slot_freed(booking_data: dict, exclude_tg_id: int = None) -> dict:
+    """Немедленная рассылка об одном освободившемся слоте (без сводки)."""
+    excluded = {exclude_tg_id: {0}} if exclude_tg_id is not None else None
+    return await broadcast_slots_freed([booking_data], excluded)
+
+
+class SlotFreedDigest:
+    """
+    Копит события "слот освободился" window секунд с первого события и рассылает их
+    одной сводкой на жильца. Повторные события по одному слоту сливаются, слоты,
+    которые успели снова занять или которые уже начались, из сводки выпадают.
+    window=0 — рассылка сразу (в фоне), без накопления.
+    """
 
+    def __init__(self, window: float):
+        self.window = window
+        # (machine_id, start_time) -> (booking_data, tg_id, которые не уведомляем)
+        self._pending: "OrderedDict[tuple, Tuple[dict, Set[int]]]" = OrderedDict()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def add(self, booking_data: dict, exclude_tg_id: int = None):
+        """
+        booking_data — поля для текста (date_str, start_time_str, end_time_str, machine_type,
+        machine_num) плюс machine_id, start_time, end_time для проверки, не заняли ли слот снова.
+        """
+        slot_key = (booking_data["machine_id"], booking_data["start_time"])
+        _, exclude = self._pending.setdefault(slot_key, (booking_data, set()))
+        if exclude_tg_id is not None:
+            exclude.add(exclude_tg_id)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
         try:
-            await bot.send_message(
-                chat_id=tg_id, 
-                text=notification_text, 
-                parse_mode="HTML",
-                reply_markup=get_exit_keyboard(lang)  # <--- ДОБАВЛЕНО: Клавиатура с кнопкой
-            )
-            count += 1
-            await asyncio.sleep(0.05) 
-        except TelegramRetryAfter as e:
-            await asyncio.sleep(e.retry_after)
-        except TelegramForbiddenError:
-            logging.warning(f"User {tg_id} blocked the bot.")
+            await self.flush()
         except Exception as e:
-            logging.error(f"Error sending to {tg_id}: {e}")
+            logging.error(f"Slot-freed digest failed: {e}")
+
+    async def flush(self) -> Optional[dict]:
+        pending, self._pending = self._pending, OrderedDict()
+        if not pending:
+            return None
+
+        now = datetime.now()
+        candidates = [
+            (booking_data, exclude) for booking_data, exclude in pending.values()
+            if booking_data["start_time"] > now
+        ]
+        taken = await get_taken_slots([
+            (b["machine_id"], b["start_time"], b["end_time"]) for b, _ in candidates
+        ])
+        fresh = [
+            (booking_data, exclude) for booking_data, exclude in candidates
+            if (booking_data["machine_id"], booking_data["start_time"]) not in taken
+        ]
+        logging.info(
+            f"Slot-freed digest: {len(pending)} events, {len(pending) - len(candidates)} started, "
+            f"{len(taken)} rebooked, {len(fresh)} to announce"
+        )
+        if not fresh:
+            return None
+
+        fresh.sort(key=lambda item: (item[0]["start_time"], str(item[0].get("machine_num", ""))))
+        slots = [booking_data for booking_data, _ in fresh]
+        excluded: Dict[int, Set[int]] = {}
+        for i, (_, exclude) in enumerate(fresh):
+            for tg_id in exclude:
+                excluded.setdefault(tg_id, set()).add(i)
+        return await broadcast_slots_freed(slots, excluded)
+
 
-    logging.info(f"Broadcast finished. Sent to {count} users.")
\ No newline at end of file
+slot_freed_digest = SlotFreedDigest(SLOT_DIGEST_WINDOW)
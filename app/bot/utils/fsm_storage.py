@@ -0,0 +1,368 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy import select, delete, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.config.config import FSM_STORAGE, FSM_SQLITE_PATH, FSM_FLUSH_INTERVAL, FSM_CACHE_TTL, FSM_CACHE_SIZE
+from app.db.base import engine
+from app.db.models.fsm_state import FsmState
+
+FSM_STORAGE_MODES = ("memory", "postgres", "sqlite")
+# Канал NOTIFY из триггера fsm_state_changed (миграция 0014)
+FSM_CHANNEL = "fsm_state_changed"
+# Пустые записи (state и data пустые) удаляются, если их не трогали столько секунд
+EMPTY_RECORD_RETENTION = 24 * 3600
+EMPTY_PURGE_INTERVAL = 3600
+
+
+def _encode(value: Any) -> Any:
+    """Данные FSM -> JSON: datetime/date (chosen_date, start_time) помечаются типом."""
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "__datetime__" in value:
+            return datetime.fromisoformat(value["__datetime__"])
+        if "__date__" in value:
+            return date.fromisoformat(value["__date__"])
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+class _Record:
+    __slots__ = ("state", "data", "expires_at", "version")
+
+    def __init__(self, state: Optional[str], data: Dict[str, Any], expires_at: float, version: int = 0):
+        self.state = state
+        self.data = data
+        self.expires_at = expires_at
+        # version строки в БД, от которой получена запись; 0 — строки нет
+        self.version = version
+
+
+class DbStorage(BaseStorage):
+    """
+    FSM-хранилище aiogram в таблице fsm_state (Postgres или SQLite через aiosqlite).
+
+    Чтение идет через кэш процесса: БД читается только при первом обращении к ключу
+    (или после cache_ttl). Запись — write-back: set_state/set_data меняют кэш и помечают
+    ключ грязным, а фоновый цикл раз в flush_interval секунд сбрасывает все грязные
+    ключи одним upsert (пустые записи удаляются позже, раз в час). Несколько нажатий
+    одного пользователя между сбросами дают одну запись. При аварийном падении теряется не больше
+    flush_interval секунд изменений; close() (shutdown диспетчера) дописывает остаток.
+    flush_interval=0 — сквозная запись на каждое изменение.
+
+    Несколько экземпляров на одной БД: запись условная — ключ пишется, только если его
+    version в БД та же, что была при чтении. Иначе ключ за это время записал другой
+    экземпляр: своя запись отбрасывается (conflicts в stats), ключ перечитывается из БД.
+    В Postgres listen() сбрасывает из кэша ключи, записанные другими экземплярами. Пока
+    изменение ждет сброса, другие экземпляры его не видят, поэтому при нескольких
+    экземплярах нужен flush_interval=0.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        flush_interval: float = 1.0,
+        cache_ttl: float = 600,
+        cache_size: int = 10_000,
+        key_builder: Optional[KeyBuilder] = None,
+        create_table: bool = False,
+        dispose_engine: bool = False,
+    ):
+        self.engine = engine
+        self.flush_interval = flush_interval
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self.dispose_engine = dispose_engine
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+        self.conflicts = 0
+        self.invalidations = 0
+        self._cache: "OrderedDict[str, _Record]" = OrderedDict()
+        self._dirty: set[str] = set()
+        # Ключи, которые сейчас пишутся в БД: их нельзя вытеснять и перечитывать
+        self._flushing: set[str] = set()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._table_ready = not create_table
+        self._next_purge = 0.0
+        self._insert = pg_insert if self.shared else sqlite_insert
+
+    @property
+    def shared(self) -> bool:
+        """Хранилище в основной БД, которую могут делить несколько экземпляров (есть NOTIFY)."""
+        return self.engine.dialect.name == "postgresql"
+
+    async def _ensure_table(self):
+        if not self._table_ready:
+            async with self.engine.begin() as conn:
+                await conn.run_sync(FsmState.__table__.create, checkfirst=True)
+            self._table_ready = True
+
+    # ---------- кэш ----------
+
+    def _pinned(self, key: str) -> bool:
+        return key in self._dirty or key in self._flushing
+
+    def _evict(self):
+        """Выкидывает самые старые чистые записи сверх cache_size (грязные ждут сброса)."""
+        if len(self._cache) <= self.cache_size:
+            return
+        for key in list(self._cache):
+            if len(self._cache) <= self.cache_size:
+                break
+            if not self._pinned(key):
+                del self._cache[key]
+
+    async def _load(self, key: str) -> _Record:
+        record = self._cache.get(key)
+        if record is not None and (self._pinned(key) or record.expires_at >= time.monotonic()):
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return record
+
+        self.misses += 1
+        await self._ensure_table()
+        async with self.engine.connect() as conn:
+            row = (await conn.execute(
+                select(FsmState.state, FsmState.data, FsmState.version).where(FsmState.key == key)
+            )).first()
+
+        loaded = _Record(
+            row.state if row else None,
+            _decode(row.data) if row else {},
+            time.monotonic() + self.cache_ttl,
+            row.version if row else 0,
+        )
+        # Пока шел SELECT, ключ могли записать — свежая запись в кэше важнее прочитанной
+        current = self._cache.get(key)
+        if current is not None and self._pinned(key):
+            return current
+        self._cache[key] = loaded
+        self._cache.move_to_end(key)
+        self._evict()
+        return loaded
+
+    async def _mark_dirty(self, key: str):
+        self._dirty.add(key)
+        if self.flush_interval <= 0:
+            await self.flush()
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    # ---------- BaseStorage ----------
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        k = self.key_builder.build(key)
+        record = await self._load(k)
+        record.state = state.state if isinstance(state, State) else state
+        await self._mark_dirty(k)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._load(self.key_builder.build(key))).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        k = self.key_builder.build(key)
+        record = await self._load(k)
+        record.data = dict(data)
+        await self._mark_dirty(k)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._load(self.key_builder.build(key))).data.copy()
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+        if self.dispose_engine:
+            await self.engine.dispose()
+
+    # ---------- сброс в БД ----------
+
+    async def _flush_loop(self):
+        while self._dirty:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"FSM storage flush failed, will retry: {e}")
+
+    async def flush(self) -> int:
+        """
+        Пишет все грязные ключи одним условным upsert (version в БД должна совпасть с
+        прочитанной). Ключи, которые успел записать другой экземпляр, выкидываются из кэша.
+        """
+        async with self._flush_lock:
+            if not self._dirty:
+                return 0
+            keys, self._dirty = self._dirty, set()
+            self._flushing = keys
+            now = datetime.now()
+            # Пустые записи тоже пишутся: удаление строки сбросило бы version
+            rows = [
+                {
+                    "key": key,
+                    "state": self._cache[key].state,
+                    "data": _encode(self._cache[key].data),
+                    "updated_at": now,
+                    "version": self._cache[key].version + 1,
+                }
+                for key in keys
+            ]
+
+            try:
+                await self._ensure_table()
+                async with self.engine.begin() as conn:
+                    stmt = self._insert(FsmState)
+                    written = set((await conn.execute(
+                        stmt.on_conflict_do_update(
+                            index_elements=[FsmState.key],
+                            set_={
+                                "state": stmt.excluded.state,
+                                "data": stmt.excluded.data,
+                                "updated_at": stmt.excluded.updated_at,
+                                "version": stmt.excluded.version,
+                            },
+                            where=FsmState.version == stmt.excluded.version - 1,
+                        ).returning(FsmState.key),
+                        rows,
+                    )).scalars())
+                    if time.monotonic() >= self._next_purge:
+                        await self._purge_empty(conn, now)
+                # Версии обновляются, пока ключи еще закреплены: NOTIFY о своей же
+                # записи не должен выкинуть их из кэша
+                for key in written:
+                    self._cache[key].version += 1
+            except Exception:
+                # Не потерять изменения: ключи снова грязные, следующий сброс повторит запись
+                self._dirty |= keys
+                raise
+            finally:
+                self._flushing = set()
+
+            conflicts = keys - written
+            for key in conflicts:
+                self._dirty.discard(key)
+                self._cache.pop(key, None)
+            if conflicts:
+                self.conflicts += len(conflicts)
+                logging.warning(f"FSM storage: {len(conflicts)} keys were changed by another instance, reloading them")
+
+            self.flushes += 1
+            self._evict()
+            return len(written)
+
+    async def _purge_empty(self, conn, now: datetime):
+        """Удаляет давно не менявшиеся пустые записи (в кэшах их уже нет: cache_ttl меньше)."""
+        self._next_purge = time.monotonic() + EMPTY_PURGE_INTERVAL
+        retention = max(EMPTY_RECORD_RETENTION, 2 * self.cache_ttl)
+        await conn.execute(
+            delete(FsmState).where(
+                FsmState.state.is_(None),
+                FsmState.data == {},
+                FsmState.updated_at < now - timedelta(seconds=retention),
+            )
+        )
+
+    # ---------- изменения других экземпляров ----------
+
+    def _on_changed(self, _connection, _pid, _channel: str, payload: str):
+        version, _, key = payload.partition(" ")
+        record = self._cache.get(key)
+        # Своя запись (та же version) и несброшенные ключи остаются: конфликт найдет flush()
+        if record is not None and not self._pinned(key) and record.version != int(version):
+            del self._cache[key]
+            self.invalidations += 1
+
+    def _drop_clean(self):
+        for key in [k for k in self._cache if not self._pinned(k)]:
+            del self._cache[key]
+
+    async def listen(self, url: Optional[str] = None, check_interval: float = 60, reconnect_delay: float = 5):
+        """
+        LISTEN fsm_state_changed на отдельном соединении (только Postgres): ключи, записанные
+        другими экземплярами, выкидываются из кэша и читаются заново. После (пере)подключения
+        кэш сбрасывается целиком (кроме несброшенных ключей). Нужно прямое подключение или
+        Session Pooler: transaction pooler не доставляет NOTIFY.
+        """
+        engine = create_async_engine(url or self.engine.url, poolclass=NullPool)
+        try:
+            while True:
+                try:
+                    async with engine.connect() as conn:
+                        raw = (await conn.get_raw_connection()).driver_connection
+                        await raw.add_listener(FSM_CHANNEL, self._on_changed)
+                        self._drop_clean()
+                        logging.info(f"Listening for {FSM_CHANNEL}")
+                        while True:
+                            await asyncio.sleep(check_interval)
+                            await conn.execute(text("SELECT 1"))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logging.error(f"FSM storage listener failed, reconnecting in {reconnect_delay}s: {e}")
+                    await asyncio.sleep(reconnect_delay)
+        finally:
+            await engine.dispose()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "dirty": len(self._dirty),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "flushes": self.flushes,
+            "conflicts": self.conflicts,
+            "invalidations": self.invalidations,
+        }
+
+
+def create_fsm_storage(mode: str = FSM_STORAGE) -> BaseStorage:
+    """
+    Хранилище FSM по FSM_STORAGE:
+      memory   — MemoryStorage aiogram (состояние теряется при перезапуске)
+      postgres — таблица fsm_state в основной БД (миграция 0005), общий движок app.db.base
+      sqlite   — отдельный файл FSM_SQLITE_PATH через aiosqlite, таблица создается сама
+    """
+    if mode not in FSM_STORAGE_MODES:
+        raise ValueError(f"Неизвестный FSM_STORAGE: {mode!r}, ожидается один из {FSM_STORAGE_MODES}")
+
+    options = dict(flush_interval=FSM_FLUSH_INTERVAL, cache_ttl=FSM_CACHE_TTL, cache_size=FSM_CACHE_SIZE)
+    if mode == "postgres":
+        return DbStorage(engine, **options)
+    if mode == "sqlite":
+        sqlite_engine = create_async_engine(f"sqlite+aiosqlite:///{FSM_SQLITE_PATH}")
+        return DbStorage(sqlite_engine, create_table=True, dispose_engine=True, **options)
+    return MemoryStorage()
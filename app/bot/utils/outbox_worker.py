@@ -0,0 +1,180 @@
+import asyncio
+import logging
+from datetime import timedelta
+from typing import List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup
+
+from app.config.config import (
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_CONCURRENCY,
+    OUTBOX_POLL_INTERVAL,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_LEASE
+)
+from app.bot.utils.rate_limiter import telegram_limiter
+from app.repositories.outbox_repo import (
+    claim_outbox_batch,
+    mark_outbox_sent,
+    retry_outbox_message,
+    mark_outbox_failed
+)
+
+# Пауза перед повтором после сетевой ошибки: 5с, 10с, 20с ... но не больше 5 минут
+RETRY_BASE_DELAY = 5
+RETRY_MAX_DELAY = 300
+
+
+def outbox_message(
+    chat_id: int,
+    text: str,
+    reply_markup: Optional[InlineKeyboardMarkup] = None,
+    parse_mode: Optional[str] = "HTML",
+    dedupe_key: Optional[str] = None,
+) -> dict:
+    """Строка для outbox: клавиатура сериализуется в JSON, воркер соберет ее обратно."""
+    return {
+        "chat_id": chat_id,
+        "text": text,
+        "parse_mode": parse_mode,
+        "reply_markup": reply_markup.model_dump(mode="json", exclude_none=True) if reply_markup else None,
+        "dedupe_key": dedupe_key,
+    }
+
+
+class OutboxWorker:
+    """
+    Доставляет сообщения из outbox: забирает пачку (с арендой на lease секунд), отправляет
+    параллельно в пределах telegram_limiter и одним UPDATE отмечает отправленные.
+    RetryAfter притормаживает всех отправителей и откладывает сообщение без штрафа,
+    сетевые ошибки повторяются с растущей паузой до max_attempts раз, заблокировавший
+    бота или несуществующий чат больше не пробуется.
+
+    Пока очередь не пуста, пачки идут подряд; когда пуста — воркер ждет poll_interval
+    или wake() от производителя в этом же процессе.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        concurrency: int = OUTBOX_CONCURRENCY,
+        poll_interval: float = OUTBOX_POLL_INTERVAL,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        lease: float = OUTBOX_LEASE,
+    ):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.lease = timedelta(seconds=lease)
+        self.stats = {"sent": 0, "retried": 0, "failed": 0}
+        self._bot: Optional[Bot] = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+    def wake(self):
+        """Новые сообщения закоммичены — не ждать следующего опроса."""
+        self._wakeup.set()
+
+    async def _send(self, row) -> Optional[int]:
+        """Отправляет одно сообщение. Возвращает id при успехе, иначе сам откладывает или списывает его."""
+        await telegram_limiter.acquire(row.chat_id)
+        try:
+            await self._bot.send_message(
+                chat_id=row.chat_id,
+                text=row.text,
+                parse_mode=row.parse_mode,
+                reply_markup=InlineKeyboardMarkup.model_validate(row.reply_markup) if row.reply_markup else None
+            )
+            return row.id
+        except TelegramRetryAfter as e:
+            # Флуд-лимит общий на бота: тормозим всех и повторяем без штрафа
+            telegram_limiter.retry_after(e.retry_after)
+            self.stats["retried"] += 1
+            await retry_outbox_message(row.id, timedelta(seconds=e.retry_after), str(e), count_attempt=False)
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            logging.warning(f"[Outbox] Dropping message {row.id} to {row.chat_id}: {e}")
+            self.stats["failed"] += 1
+            await mark_outbox_failed(row.id, str(e))
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            if row.attempts + 1 >= self.max_attempts:
+                logging.error(f"[Outbox] Giving up on message {row.id} to {row.chat_id} after {row.attempts + 1} attempts: {error}")
+                self.stats["failed"] += 1
+                await mark_outbox_failed(row.id, error)
+            else:
+                self.stats["retried"] += 1
+                delay = min(RETRY_BASE_DELAY * 2 ** row.attempts, RETRY_MAX_DELAY)
+                await retry_outbox_message(row.id, timedelta(seconds=delay), error)
+        return None
+
+    async def deliver_batch(self) -> int:
+        """Одна пачка: забрать, отправить, отметить. Возвращает число взятых сообщений."""
+        rows = await claim_outbox_batch(self.batch_size, self.lease)
+        if not rows:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(row) -> Optional[int]:
+            async with semaphore:
+                try:
+                    return await self._send(row)
+                except Exception as e:
+                    # Не удалось даже отметить ошибку — сообщение вернется после аренды
+                    logging.error(f"[Outbox] Failed to handle message {row.id}: {e}")
+                    return None
+
+        results = await asyncio.gather(*(send(row) for row in rows))
+        sent: List[int] = [message_id for message_id in results if message_id is not None]
+        await mark_outbox_sent(sent)
+        self.stats["sent"] += len(sent)
+        logging.info(f"[Outbox] Delivered {len(sent)} of {len(rows)} messages")
+        return len(rows)
+
+    async def run(self):
+        while not self._stopping:
+            # Сброс до запроса: wake() во время пачки не потеряется
+            self._wakeup.clear()
+            try:
+                taken = await self.deliver_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"[Outbox] Delivery pass failed: {e}")
+                taken = 0
+            if taken:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, bot: Bot):
+        if self._task is not None and not self._task.done():
+            return
+        self._bot = bot
+        self._stopping = False
+        self._task = asyncio.create_task(self.run())
+        logging.info("[Outbox] Delivery worker started")
+
+    async def stop(self, timeout: float = 10):
+        """Дает дослать текущую пачку (не дольше timeout), недоставленное вернется после аренды."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"[Outbox] Worker did not finish its batch in {timeout}s, cancelled")
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logging.info(f"[Outbox] Delivery worker stopped, stats={self.stats}")
+
+
+outbox_worker = OutboxWorker()
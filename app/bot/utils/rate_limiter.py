@@ -0,0 +1,85 @@
+import asyncio
+import time
+from typing import Dict
+
+from app.config.config import TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_INTERVAL
+
+
+class TokenBucket:
+    """
+    Классический token bucket: rate токенов в секунду, не больше capacity в запасе.
+    acquire() ждет, пока появится токен. pause() останавливает выдачу на время
+    (например, когда Telegram ответил RetryAfter — ждать должны все отправители).
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        # Под замком: ожидающие получают токены строго по очереди
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._refill(now)
+        self._tokens = 0
+
+
+class ChatThrottle:
+    """Не чаще одного сообщения в interval секунд в один и тот же чат."""
+
+    def __init__(self, interval: float, max_chats: int = 10_000):
+        self.interval = interval
+        self.max_chats = max_chats
+        self._next_allowed: Dict[int, float] = {}
+
+    async def wait(self, chat_id: int):
+        now = time.monotonic()
+        if len(self._next_allowed) >= self.max_chats:
+            # Чаты, по которым ограничение уже истекло, больше не нужны
+            self._next_allowed = {k: v for k, v in self._next_allowed.items() if v > now}
+
+        # Время отправки резервируется сразу, до sleep — параллельные вызовы встают в очередь
+        send_at = max(now, self._next_allowed.get(chat_id, 0.0))
+        self._next_allowed[chat_id] = send_at + self.interval
+        if send_at > now:
+            await asyncio.sleep(send_at - now)
+
+
+class TelegramRateLimiter:
+    """Общий для всех отправителей лимит: глобальный token bucket плюс интервал по чату."""
+
+    def __init__(self, global_rate: float = TELEGRAM_GLOBAL_RATE, chat_interval: float = TELEGRAM_CHAT_INTERVAL):
+        self.bucket = TokenBucket(global_rate)
+        self.chats = ChatThrottle(chat_interval)
+
+    async def acquire(self, chat_id: int):
+        await self.chats.wait(chat_id)
+        await self.bucket.acquire()
+
+    def retry_after(self, seconds: float):
+        """Telegram попросил подождать: флуд-лимит общий на бота, поэтому тормозим всех."""
+        self.bucket.pause(seconds)
+
+
+telegram_limiter = TelegramRateLimiter()
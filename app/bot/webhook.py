@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import signal
+from typing import Any, Dict, Optional, Set
+
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from app.config.config import (
+    WEBHOOK_BASE_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_SECRET,
+    WEBHOOK_MAX_IN_FLIGHT,
+    WEBHOOK_DRAIN_TIMEOUT
+)
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """
+    Webhook-обработчик: отвечает Telegram 200 сразу, а апдейт обрабатывает в фоне.
+    Одновременно обрабатывается не больше max_in_flight апдейтов — при заполнении
+    ответ задерживается, и Telegram сам притормаживает отправку (backpressure).
+    close() дожидается незавершенных апдейтов (не дольше drain_timeout), затем
+    закрывает сессию бота.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        max_in_flight: int = 64,
+        drain_timeout: float = 30,
+        secret_token: Optional[str] = None,
+        **data: Any,
+    ):
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=True, secret_token=secret_token, **data)
+        self.max_in_flight = max_in_flight
+        self.drain_timeout = drain_timeout
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._in_flight: Set[asyncio.Task] = set()
+
+    async def _feed_and_release(self, bot: Bot, update: Dict[str, Any]):
+        try:
+            await self._background_feed_update(bot=bot, update=update)
+        except Exception as e:
+            logging.error(f"[Webhook] Update handling failed: {e}")
+        finally:
+            self._slots.release()
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        update = await request.json(loads=bot.session.json_loads)
+        await self._slots.acquire()
+        task = asyncio.create_task(self._feed_and_release(bot, update))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def close(self) -> None:
+        if self._in_flight:
+            logging.info(f"[Webhook] Draining {len(self._in_flight)} in-flight updates")
+            _, pending = await asyncio.wait(set(self._in_flight), timeout=self.drain_timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                logging.warning(f"[Webhook] {len(pending)} updates cancelled after {self.drain_timeout}s drain timeout")
+        await super().close()
+
+
+def build_webhook_app(bot: Bot, dp: Dispatcher) -> web.Application:
+    """aiohttp-приложение с маршрутом WEBHOOK_PATH и регистрацией вебхука при старте."""
+    app = web.Application()
+    handler = BoundedRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        max_in_flight=WEBHOOK_MAX_IN_FLIGHT,
+        drain_timeout=WEBHOOK_DRAIN_TIMEOUT,
+        secret_token=WEBHOOK_SECRET,
+    )
+    # Порядок важен: сначала дожидаемся апдейтов, потом shutdown диспетчера (сброс FSM-хранилища)
+    handler.register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    async def _set_webhook(app: web.Application):
+        if not WEBHOOK_BASE_URL:
+            logging.warning("[Webhook] WEBHOOK_BASE_URL is not set, webhook is not registered in Telegram")
+            return
+        await bot.set_webhook(
+            f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            # Telegram не держит больше max_connections запросов одновременно (1..100)
+            max_connections=max(1, min(WEBHOOK_MAX_IN_FLIGHT, 100)),
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logging.info(f"[Webhook] Registered {WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}")
+
+    app.on_startup.append(_set_webhook)
+    return app
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    """Поднимает webhook-сервер и работает до SIGINT/SIGTERM, затем корректно завершается."""
+    app = build_webhook_app(bot, dp)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    logging.info(f"[Bot] Serving webhook on {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+    try:
+        await stop.wait()
+    finally:
+        logging.info("[Bot] Stopping webhook server")
+        # Сначала закрывается прием соединений, затем on_shutdown: дренаж и shutdown диспетчера
+        await runner.cleanup()
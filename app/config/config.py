@@ -2,12 +2,74 @@ import os
 from dotenv import load_dotenv, find_dotenv
 from pathlib import Path
 
-if not find_dotenv():  # Функция поиска переменных окружения
-    exit("Переменные окружения не загружены, так как отсутствует файл .env")
-else:
+if find_dotenv():  # Функция поиска переменных окружения
     load_dotenv()  # Загрузка переменных окружения
+elif not os.getenv("BOT_TOKEN"):
+    # Без .env настройки можно передать прямо через окружение (контейнер, тесты)
+    exit("Переменные окружения не загружены: нет файла .env и не задан BOT_TOKEN")
 
 root_path = Path(__file__).resolve().parents[1]
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
-DATABASE_URL  = os.getenv("DATABASE_URL")
\ No newline at end of file
+DATABASE_URL  = os.getenv("DATABASE_URL")
+# Хранилище задач планировщика (напоминания и дедлайны подтверждения по каждой брони).
+# Нужен синхронный драйвер SQLAlchemy; по умолчанию — файл SQLite в корне проекта.
+SCHEDULER_JOBSTORE_URL = os.getenv("SCHEDULER_JOBSTORE_URL", f"sqlite:///{root_path.parent / 'jobs.sqlite'}")
+# Хранилище FSM aiogram: memory (по умолчанию), postgres (таблица fsm_state, миграция 0005)
+# или sqlite (отдельный файл). Запись отложенная: раз в FSM_FLUSH_INTERVAL секунд, 0 — сразу.
+# При нескольких экземплярах нужен FSM_FLUSH_INTERVAL=0: ключи, записанные другими
+# экземплярами, выкидываются из кэша по NOTIFY fsm_state_changed (миграция 0014, CACHE_LISTEN).
+FSM_STORAGE = os.getenv("FSM_STORAGE", "memory").lower()
+FSM_SQLITE_PATH = os.getenv("FSM_SQLITE_PATH", str(root_path.parent / "fsm.sqlite"))
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "1.0"))
+FSM_CACHE_TTL = float(os.getenv("FSM_CACHE_TTL", "600"))
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "10000"))
+# Режим получения апдейтов: polling (по умолчанию) или webhook (aiohttp-сервер).
+# WEBHOOK_BASE_URL — публичный https-адрес, по которому Telegram достучится до сервера.
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None
+WEBHOOK_MAX_IN_FLIGHT = int(os.getenv("WEBHOOK_MAX_IN_FLIGHT", "64"))
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "30"))
+# Выбор ведущего экземпляра (планировщик работает только на нем) через advisory-блокировку
+# Postgres. LEADER_DATABASE_URL — прямое подключение, если основное идет через transaction pooler.
+LEADER_ELECTION = os.getenv("LEADER_ELECTION", "1") == "1"
+LEADER_LOCK_KEY = int(os.getenv("LEADER_LOCK_KEY", "73410001"))
+LEADER_CHECK_INTERVAL = float(os.getenv("LEADER_CHECK_INTERVAL", "5"))
+LEADER_DATABASE_URL = os.getenv("LEADER_DATABASE_URL") or None
+# Исходящие сообщения Telegram идут через таблицу outbox (миграция 0008) и фоновый воркер
+# на ведущем экземпляре: пачками по OUTBOX_BATCH_SIZE, с повторами до OUTBOX_MAX_ATTEMPTS раз.
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "20"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1.0"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_LEASE = float(os.getenv("OUTBOX_LEASE", "60"))
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+# Лимиты Telegram Bot API: ~30 сообщений в секунду на бота и ~1 сообщение в секунду в один чат.
+# Берем с запасом, чтобы не ловить RetryAfter в штатном режиме.
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "25"))
+TELEGRAM_CHAT_INTERVAL = float(os.getenv("TELEGRAM_CHAT_INTERVAL", "1.0"))
+# Сколько секунд копим освободившиеся слоты перед рассылкой сводки (0 — без накопления)
+SLOT_DIGEST_WINDOW = float(os.getenv("SLOT_DIGEST_WINDOW", "60"))
+# Рабочий день прачечной и длина слота: из них считаются слоты дня и вместимость
+WORK_START = int(os.getenv("WORK_START", "8"))
+WORK_END = int(os.getenv("WORK_END", "23"))
+SLOT_DURATION = int(os.getenv("SLOT_DURATION", "90"))
+# Каталог машин держится в памяти и перечитывается по NOTIFY из триггера (миграция 0009).
+# LISTEN идет по LEADER_DATABASE_URL (нужно прямое подключение); без него — опрос раз в
+# MACHINES_REFRESH_INTERVAL секунд.
+MACHINES_LISTEN = os.getenv("MACHINES_LISTEN", "1") == "1"
+MACHINES_REFRESH_INTERVAL = float(os.getenv("MACHINES_REFRESH_INTERVAL", "600"))
+# Жильцы, загруженность календаря и занятость машин тоже кэшируются в памяти; изменения
+# других экземпляров приходят по NOTIFY booking_changed / residents_changed (миграция 0013),
+# LISTEN — тоже по LEADER_DATABASE_URL. Без CACHE_LISTEN кэши догоняют БД только по TTL
+# и сверке занятости — тогда экземпляр бота должен быть один.
+CACHE_LISTEN = os.getenv("CACHE_LISTEN", "1") == "1"
+# Завершенные брони старше BOOKING_ARCHIVE_AFTER_DAYS дней ночью переносятся в booking_archive
+# (миграция 0012) пачками по BOOKING_ARCHIVE_BATCH. Уменьшать можно в любой момент; после
+# увеличения на K дней прошлые месяцы календаря K дней не видят уже перенесенные брони.
+BOOKING_ARCHIVE_AFTER_DAYS = int(os.getenv("BOOKING_ARCHIVE_AFTER_DAYS", "30"))
+BOOKING_ARCHIVE_BATCH = int(os.getenv("BOOKING_ARCHIVE_BATCH", "5000"))
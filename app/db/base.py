@@ -1,10 +1,13 @@
 import sys
 import asyncio
 import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+from uuid import uuid4
 from dotenv import load_dotenv
-from sqlalchemy.ext.asyncio import AsyncAttrs, create_async_engine, async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncAttrs, AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import text
+from sqlalchemy import event, text
 from sqlalchemy.pool import NullPool
 
 load_dotenv()
@@ -18,17 +21,138 @@ DBNAME = os.getenv("DBNAME")
 # Формируем URL
 DATABASE_URL = f"postgresql+asyncpg://{USER}:{PASSWORD}@{HOST}:{PORT}/{DBNAME}"
 
-# Создаем движок с NullPool
-# Это критично для работы через Supabase Session Pooler (порт 5432)
-engine = create_async_engine(
-    DATABASE_URL,
-    poolclass=NullPool,        # Отключаем встроенный пулинг SQLAlchemy
-    pool_pre_ping=True,        # Проверка соединения перед запросом
-    echo=False                 # Можно поставить True, чтобы видеть SQL запросы в консоли
+# Режим работы с соединениями:
+#   null      — без пула, новое соединение на каждую сессию (Supabase Session Pooler)
+#   pool      — собственный пул SQLAlchemy (прямое подключение к Postgres)
+#   pgbouncer — пул + отключенный кэш prepared statements (pgbouncer / Supabase
+#               Transaction Pooler, порт 6543)
+DB_POOL_MODE = os.getenv("DB_POOL_MODE", "null").lower()
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", str(DB_POOL_SIZE)))
+# В пуле соединение проверяется по pool_recycle, лишний ping на каждый checkout не нужен
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1" if DB_POOL_MODE == "null" else "0") == "1"
+
+POOL_MODES = ("null", "pool", "pgbouncer")
+
+# Реплика для чтения (streaming standby). Без REPLICA_HOST все идет в основную БД.
+# Пользователь, пароль и база по умолчанию те же, что у основной.
+REPLICA_HOST = os.getenv("REPLICA_HOST")
+REPLICA_PORT = os.getenv("REPLICA_PORT", PORT)
+REPLICA_USER = os.getenv("REPLICA_USER", USER)
+REPLICA_PASSWORD = os.getenv("REPLICA_PASSWORD", PASSWORD)
+REPLICA_DBNAME = os.getenv("REPLICA_DBNAME", DBNAME)
+REPLICA_DATABASE_URL = (
+    f"postgresql+asyncpg://{REPLICA_USER}:{REPLICA_PASSWORD}@{REPLICA_HOST}:{REPLICA_PORT}/{REPLICA_DBNAME}"
+    if REPLICA_HOST else None
 )
+# Реплика, отстающая больше REPLICA_MAX_LAG секунд, не используется. Отставание проверяется
+# раз в REPLICA_CHECK_INTERVAL секунд; недоступная реплика не задерживает чтение дольше
+# REPLICA_CONNECT_TIMEOUT.
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "5"))
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "1"))
+REPLICA_CONNECT_TIMEOUT = float(os.getenv("REPLICA_CONNECT_TIMEOUT", "2"))
+
+
+def _engine_options(mode: str) -> dict:
+    """Параметры create_async_engine для выбранного режима пула."""
+    if mode not in POOL_MODES:
+        raise ValueError(f"Неизвестный DB_POOL_MODE: {mode!r}, ожидается один из {POOL_MODES}")
+
+    options = {
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "echo": False,             # Можно поставить True, чтобы видеть SQL запросы в консоли
+    }
+    if mode == "null":
+        # Отключаем встроенный пулинг SQLAlchemy
+        options["poolclass"] = NullPool
+        return options
+
+    options.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    if mode == "pgbouncer":
+        # В transaction-режиме pgbouncer соседние запросы уходят в разные серверные
+        # соединения, поэтому prepared statements asyncpg кэшировать нельзя
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    return options
+
+
+engine = create_async_engine(DATABASE_URL, **_engine_options(DB_POOL_MODE))
+
+
+def _replica_engine_options() -> dict:
+    """Те же параметры пула, плюс короткий таймаут подключения: упавшая реплика не должна держать чтение."""
+    options = _engine_options(DB_POOL_MODE)
+    options["connect_args"] = {**options.get("connect_args", {}), "timeout": REPLICA_CONNECT_TIMEOUT}
+    return options
+
+
+# Маршрутизация чтений — app.db.replica.read_scope
+replica_engine = create_async_engine(REPLICA_DATABASE_URL, **_replica_engine_options()) if REPLICA_DATABASE_URL else None
 
 async_session = async_sessionmaker(engine, expire_on_commit=False)
 
+
+@asynccontextmanager
+async def session_scope(session: Optional[AsyncSession] = None) -> AsyncIterator[AsyncSession]:
+    """
+    Отдает сессию текущего апдейта, если она передана (DbSessionMiddleware),
+    иначе открывает собственную на время вызова (планировщик, фоновые задачи).
+    """
+    if session is not None:
+        yield session
+        return
+    async with async_session() as own_session:
+        yield own_session
+
+# Счетчики для оценки количества подключений на один апдейт
+_pool_counters = {"connects": 0, "checkouts": 0}
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    _pool_counters["connects"] += 1
+
+
+@event.listens_for(engine.sync_engine, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    _pool_counters["checkouts"] += 1
+
+
+def get_pool_stats() -> dict:
+    """Возвращает режим пула, число физических подключений и выдач соединений."""
+    return {
+        "mode": DB_POOL_MODE,
+        "connects": _pool_counters["connects"],
+        "checkouts": _pool_counters["checkouts"],
+        "status": engine.pool.status(),
+    }
+
+
+async def _warm_up_pool(size: int):
+    """Заранее открывает size соединений, чтобы первые апдейты не ждали handshake."""
+    if size <= 0:
+        return
+
+    async def _open():
+        conn = await engine.connect()
+        await conn.execute(text("SELECT 1"))
+        return conn
+
+    conns = await asyncio.gather(*(_open() for _ in range(size)))
+    for conn in conns:
+        await conn.close()  # Соединение возвращается в пул, а не закрывается
+
 class Base(AsyncAttrs, DeclarativeBase):
     pass
 
@@ -37,6 +161,8 @@ async def init_db():
         async with engine.begin() as conn:
             # await conn.run_sync(Base.metadata.create_all)
             pass
+        if DB_POOL_MODE != "null":
+            await _warm_up_pool(min(DB_POOL_WARMUP, DB_POOL_SIZE))
     except Exception as e:
         print(f"Ошибка при инициализации БД: {e}")
         raise
@@ -0,0 +1,113 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.db.base import DATABASE_URL
+
+
+class LeaderElection:
+    """
+    Выбор ведущего экземпляра бота через сессионную advisory-блокировку Postgres.
+
+    Каждый экземпляр держит отдельное соединение и раз в check_interval секунд
+    пробует pg_try_advisory_lock(lock_key). Кто взял блокировку — ведущий, пока жива
+    его сессия: если процесс упал или потерял связь с БД, Postgres снимает блокировку,
+    и ее забирает следующий экземпляр. Ведущий проверяет свое соединение тем же
+    интервалом и при ошибке слагает полномочия (on_demoted).
+
+    Блокировка сессионная, поэтому url не должен вести на pgbouncer в transaction-режиме
+    (Supabase Transaction Pooler, порт 6543) — там нужен прямой адрес или Session Pooler.
+    """
+
+    def __init__(
+        self,
+        lock_key: int,
+        on_elected: Callable[[], Awaitable[None]],
+        on_demoted: Callable[[], Awaitable[None]],
+        check_interval: float = 5.0,
+        url: Optional[str] = None,
+    ):
+        self.lock_key = lock_key
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.check_interval = check_interval
+        # Отдельный движок без пула: соединение с блокировкой живет все время работы
+        self._engine = create_async_engine(url or DATABASE_URL, poolclass=NullPool)
+        self._conn: Optional[AsyncConnection] = None
+        self._task: Optional[asyncio.Task] = None
+        self.is_leader = False
+
+    async def _connect(self) -> AsyncConnection:
+        if self._conn is None:
+            conn = await self._engine.connect()
+            # Без autocommit соединение висело бы "idle in transaction"
+            self._conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        return self._conn
+
+    async def _drop_connection(self):
+        if self._conn is not None:
+            try:
+                await self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+    async def _tick(self):
+        conn = await self._connect()
+        if self.is_leader:
+            # Соединение живо — значит, блокировка по-прежнему наша
+            await asyncio.wait_for(conn.execute(text("SELECT 1")), timeout=self.check_interval)
+            return
+
+        acquired = (await asyncio.wait_for(
+            conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.lock_key}),
+            timeout=self.check_interval,
+        )).scalar()
+        if acquired:
+            self.is_leader = True
+            logging.info(f"[Leader] Acquired advisory lock {self.lock_key}, this instance is the leader")
+            await self.on_elected()
+
+    async def _demote(self, reason: str):
+        if self.is_leader:
+            self.is_leader = False
+            logging.warning(f"[Leader] Lost leadership: {reason}")
+            await self.on_demoted()
+
+    async def run(self):
+        while True:
+            try:
+                await self._tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await self._drop_connection()
+                await self._demote(str(e) or type(e).__name__)
+            await asyncio.sleep(self.check_interval)
+
+    def start(self) -> asyncio.Task:
+        self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        """Останавливает выборы и отпускает блокировку, чтобы другой экземпляр сразу ее забрал."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.is_leader:
+            await self._demote("instance is stopping")
+        if self._conn is not None:
+            try:
+                await self._conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.lock_key})
+            except Exception:
+                pass
+        await self._drop_connection()
+        await self._engine.dispose()
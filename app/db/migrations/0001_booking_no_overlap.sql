@@ -0,0 +1,19 @@
+-- Запрет пересекающихся активных броней одной машины на уровне БД.
+-- После этой миграции create_booking не делает отдельную проверку is_slot_free:
+-- вставку, пересекающуюся с чужой бронью, отклоняет само ограничение.
+--
+-- Перед применением убедитесь, что пересечений уже нет:
+--   SELECT a.id, b.id FROM booking a JOIN booking b
+--     ON a.inidmachine = b.inidmachine AND a.id < b.id
+--    AND tsrange(a.start_time, a.end_time, '[)') && tsrange(b.start_time, b.end_time, '[)')
+--  WHERE a.status IS DISTINCT FROM 'Отменено' AND b.status IS DISTINCT FROM 'Отменено';
+
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+ALTER TABLE booking
+    ADD CONSTRAINT booking_no_overlap
+    EXCLUDE USING gist (
+        inidmachine WITH =,
+        tsrange(start_time, end_time, '[)') WITH &&
+    )
+    WHERE (status IS DISTINCT FROM 'Отменено');
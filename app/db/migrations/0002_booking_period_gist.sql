@@ -0,0 +1,19 @@
+-- Интервал брони как tsrange + GiST-индекс для запросов на пересечение (&&).
+-- Условие "три OR по start_time/end_time" не индексируется B-tree, а period && tsrange(...)
+-- обслуживается GiST-индексом и не деградирует с ростом истории броней.
+
+ALTER TABLE booking
+    ADD COLUMN period tsrange
+    GENERATED ALWAYS AS (tsrange(start_time, end_time, '[)')) STORED;
+
+-- Ограничение из 0001 переводим на колонку period (то же условие, без повторного вычисления)
+ALTER TABLE booking DROP CONSTRAINT IF EXISTS booking_no_overlap;
+ALTER TABLE booking
+    ADD CONSTRAINT booking_no_overlap
+    EXCLUDE USING gist (inidmachine WITH =, period WITH &&)
+    WHERE (status IS DISTINCT FROM 'Отменено');
+
+-- Для поиска занятых машин без фильтра по конкретной машине (get_available_machines)
+CREATE INDEX IF NOT EXISTS ix_booking_period ON booking USING gist (period);
+
+ANALYZE booking;
@@ -0,0 +1,3 @@
+-- Индекс для выборок загруженности за месяц: get_month_workload фильтрует
+-- полуоткрытым диапазоном start_time >= :month_start AND start_time < :next_month_start.
+CREATE INDEX IF NOT EXISTS ix_booking_start_time ON booking (start_time);
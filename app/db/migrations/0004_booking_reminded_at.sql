@@ -0,0 +1,7 @@
+-- Отметка о запросе подтверждения: claim_due_reminders ставит ее тем же UPDATE,
+-- которым выбирает брони, поэтому один и тот же запрос не уходит дважды.
+ALTER TABLE booking ADD COLUMN IF NOT EXISTS reminded_at timestamp without time zone;
+
+-- Брони, которые уже ждут ответа на момент миграции, считаем напомненными
+UPDATE booking SET reminded_at = start_time - interval '40 minutes'
+WHERE status = 'Ожидание' AND start_time <= now() + interval '40 minutes';
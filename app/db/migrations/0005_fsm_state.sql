@@ -0,0 +1,9 @@
+-- Хранилище FSM aiogram (FSM_STORAGE=postgres): состояние и данные диалога
+-- переживают перезапуск бота. Пустые записи удаляются, поэтому таблица
+-- содержит только пользователей с незавершенным сценарием или выбранным языком.
+CREATE TABLE IF NOT EXISTS fsm_state (
+    key        text PRIMARY KEY,
+    state      text,
+    data       jsonb NOT NULL DEFAULT '{}'::jsonb,
+    updated_at timestamp without time zone NOT NULL DEFAULT now()
+);
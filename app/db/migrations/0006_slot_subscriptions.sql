@@ -0,0 +1,15 @@
+-- Подписки на освободившиеся слоты. Сводку о свободных слотах получают только
+-- жильцы, чья подписка совпала по дню, интервалу и типу машины, поэтому рассылка
+-- растет с числом заинтересованных, а не со всем общежитием.
+CREATE TABLE IF NOT EXISTS slot_subscriptions (
+    id            bigserial PRIMARY KEY,
+    inidresidents bigint NOT NULL REFERENCES residents (id) ON DELETE CASCADE,
+    day           date NOT NULL,
+    time_from     time without time zone NOT NULL,
+    time_to       time without time zone NOT NULL,
+    machine_type  text,
+    created_at    timestamp without time zone NOT NULL DEFAULT now(),
+    CONSTRAINT uq_slot_subscription UNIQUE (inidresidents, day, time_from, time_to, machine_type)
+);
+
+CREATE INDEX IF NOT EXISTS ix_slot_subscriptions_day_type ON slot_subscriptions (day, machine_type);
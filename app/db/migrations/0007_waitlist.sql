@@ -0,0 +1,17 @@
+-- Очередь на занятые слоты. Когда бронь отменяется (вручную или авто-отменой),
+-- слот в той же транзакции переходит первому в очереди жильцу (cancel_booking,
+-- claim_expired_bookings). Голову очереди ищет индекс ix_waitlist_head.
+CREATE TABLE IF NOT EXISTS waitlist (
+    id            bigserial PRIMARY KEY,
+    inidresidents bigint NOT NULL REFERENCES residents (id) ON DELETE CASCADE,
+    machine_type  text NOT NULL,
+    slot_start    timestamp without time zone NOT NULL,
+    slot_end      timestamp without time zone NOT NULL,
+    created_at    timestamp without time zone NOT NULL DEFAULT now(),
+    CONSTRAINT uq_waitlist_entry UNIQUE (inidresidents, machine_type, slot_start)
+);
+
+CREATE INDEX IF NOT EXISTS ix_waitlist_head ON waitlist (machine_type, slot_start, id);
+
+-- Срок подтверждения брони, полученной из очереди; не подтвердили — слот идет дальше
+ALTER TABLE booking ADD COLUMN IF NOT EXISTS confirm_deadline timestamp without time zone;
@@ -0,0 +1,23 @@
+-- Очередь исходящих сообщений Telegram. Напоминания, уведомления об авто-отмене,
+-- выдача слота из очереди и рассылки пишутся сюда в транзакции, меняющей бронь,
+-- а отправляет их фоновый воркер (повторы, лимиты Telegram). Падение процесса
+-- или сбой Telegram больше не теряет сообщения.
+CREATE TABLE IF NOT EXISTS outbox (
+    id           bigserial PRIMARY KEY,
+    chat_id      bigint NOT NULL,
+    text         text NOT NULL,
+    parse_mode   text,
+    reply_markup jsonb,
+    dedupe_key   text UNIQUE,
+    attempts     integer NOT NULL DEFAULT 0,
+    available_at timestamp without time zone NOT NULL DEFAULT now(),
+    created_at   timestamp without time zone NOT NULL DEFAULT now(),
+    sent_at      timestamp without time zone,
+    failed_at    timestamp without time zone,
+    last_error   text
+);
+
+-- Воркер берет только ожидающие строки: индекс остается маленьким, сколько бы
+-- отправленных ни накопилось до очистки
+CREATE INDEX IF NOT EXISTS ix_outbox_pending ON outbox (available_at, id)
+    WHERE sent_at IS NULL AND failed_at IS NULL;
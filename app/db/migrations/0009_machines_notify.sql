@@ -0,0 +1,14 @@
+-- Каталог машин кэшируется в памяти каждого экземпляра бота. Любое изменение
+-- таблицы machines (поломка, ремонт, новая машина) рассылает NOTIFY machines_changed,
+-- и экземпляры перечитывают каталог, не опрашивая таблицу на каждый запрос.
+CREATE OR REPLACE FUNCTION notify_machines_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('machines_changed', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS machines_changed ON machines;
+CREATE TRIGGER machines_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON machines
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_machines_changed();
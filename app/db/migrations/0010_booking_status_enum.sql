@@ -0,0 +1,46 @@
+-- Статус брони: строки 'Ожидание' / 'Подтверждено' / 'Отменено' (и NULL у старых
+-- записей) -> smallint 0 / 1 / 2 (BookingStatus). Часть запросов фильтровала по
+-- status != 'cancelled' и не отсекала отмененные брони вовсе; теперь все запросы,
+-- ограничение booking_no_overlap и частичные индексы используют одно условие status <> 2.
+--
+-- Повторный запуск ничего не делает: перевод выполняется, только пока колонка текстовая.
+BEGIN;
+
+DO $$
+BEGIN
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_name = 'booking' AND column_name = 'status') <> 'smallint' THEN
+        -- Ограничение ссылается на старую колонку — пересоздается ниже
+        ALTER TABLE booking DROP CONSTRAINT IF EXISTS booking_no_overlap;
+
+        ALTER TABLE booking
+            ALTER COLUMN status DROP DEFAULT,
+            ALTER COLUMN status TYPE smallint USING (
+                CASE
+                    WHEN status = 'Подтверждено' THEN 1
+                    WHEN status IN ('Отменено', 'cancelled') THEN 2
+                    ELSE 0  -- 'Ожидание' и NULL
+                END
+            ),
+            ALTER COLUMN status SET DEFAULT 0,
+            ALTER COLUMN status SET NOT NULL;
+
+        ALTER TABLE booking ADD CONSTRAINT booking_status_check CHECK (status IN (0, 1, 2));
+        ALTER TABLE booking
+            ADD CONSTRAINT booking_no_overlap
+            EXCLUDE USING gist (inidmachine WITH =, period WITH &&)
+            WHERE (status <> 2);
+    END IF;
+END
+$$;
+
+-- Полные индексы заменяются частичными по активным броням
+DROP INDEX IF EXISTS ix_booking_period;
+DROP INDEX IF EXISTS ix_booking_start_time;
+CREATE INDEX IF NOT EXISTS ix_booking_live_period ON booking USING gist (period) WHERE status <> 2;
+CREATE INDEX IF NOT EXISTS ix_booking_live_start ON booking (start_time) WHERE status <> 2;
+CREATE INDEX IF NOT EXISTS ix_booking_live_resident ON booking (inidresidents, start_time) WHERE status <> 2;
+
+COMMIT;
+
+ANALYZE booking;
@@ -0,0 +1,82 @@
+-- Поиск жильца при авторизации по ФИО и номеру пропуска.
+-- ФИО пишут кириллицей, латиницей (в разных транслитерациях) и в любом порядке слов,
+-- поэтому сравниваются не сами строки, а нормализованный ключ:
+--   * регистр и Unicode-формы (NFKC) сводятся, ё -> е, диакритика снимается;
+--   * кириллица транслитерируется, частые варианты латиницы сводятся к одному
+--     написанию (Yuri / Juri / Iurii / Юрий -> iuri, Fyodor / Фёдор -> fedor,
+--     Aleksey / Alexei / Алексей -> aleksei);
+--   * дефисы, апострофы и точки убираются, повторы букв сжимаются;
+--   * слова сортируются — порядок "Имя Фамилия" и "Фамилия Имя" не важен.
+-- Ключ хранится в сгенерированных колонках с btree-индексами: поиск — одно сравнение
+-- по индексу. search_key_short — только фамилия и имя (отчество можно не вводить).
+
+-- Функции вызывают друг друга с явной схемой public: ключ считается в сгенерированных
+-- колонках, а pg_restore пересчитывает их с пустым search_path.
+
+-- Сжатие повторов букв (Alla -> ala, Kirill -> kiril). Цепочка replace в десятки раз
+-- быстрее regexp с обратной ссылкой (.)\1+; два прохода сводят до 4 одинаковых букв подряд.
+CREATE OR REPLACE FUNCTION resident_name_squeeze(name text) RETURNS text
+LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE AS $$
+    SELECT replace(replace(replace(replace(replace(replace(replace(replace(replace(replace(replace(replace(replace(replace(replace(replace(replace(replace(replace(replace(replace(
+        name,
+        'aa', 'a'), 'bb', 'b'), 'cc', 'c'), 'dd', 'd'), 'ee', 'e'), 'ff', 'f'), 'gg', 'g'),
+        'hh', 'h'), 'ii', 'i'), 'kk', 'k'), 'll', 'l'), 'mm', 'm'), 'nn', 'n'), 'oo', 'o'),
+        'pp', 'p'), 'rr', 'r'), 'ss', 's'), 'tt', 't'), 'uu', 'u'), 'vv', 'v'), 'zz', 'z')
+$$;
+
+-- Сведение одного написания имени к канонической латинице (без сортировки слов)
+CREATE OR REPLACE FUNCTION resident_name_fold(name text) RETURNS text
+LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE AS $$
+    SELECT public.resident_name_squeeze(                            -- повторы, появившиеся после замен ниже
+        regexp_replace(                                             -- c без h -> k: Victor -> viktor
+            replace(replace(                                        -- ie/io -> e: Yevgeny, Grigoryev, Fyodor
+                public.resident_name_squeeze(public.resident_name_squeeze(
+                    replace(                                        -- x -> ks: Alexey -> aleksei
+                        translate(                                  -- w->v, q->k, j/y->i
+                            replace(replace(replace(replace(replace(replace(
+                                regexp_replace(                     -- дефисы, апострофы, точки
+                                    translate(                      -- кириллица (одна буква) и диакритика
+                                        replace(replace(replace(replace(replace(replace(replace(replace(replace(replace(
+                                            lower(normalize(name, NFKC)),
+                                            'щ', 'sh'), 'ш', 'sh'), 'ж', 'zh'), 'ч', 'ch'), 'ц', 'ts'),
+                                            'х', 'h'), 'ю', 'iu'), 'я', 'ia'), 'ъ', ''), 'ь', ''),
+                                        'абвгдеёзийклмнопрстуфыэáàâäãåéèêëíìîïóòôöõúùûüýÿñçčšžł',
+                                        'abvgdeeziiklmnoprstufieaaaaaaeeeeiiiiooooouuuuyyncszl'
+                                    ),
+                                    '[-''`’ʼ.,_"()]+', '', 'g'
+                                ),
+                                'shch', 'sh'), 'sch', 'sh'), 'kh', 'h'), 'tz', 'ts'), 'ph', 'f'), 'ck', 'k'),
+                            'wqjy', 'vkii'
+                        ),
+                        'x', 'ks'
+                    )
+                )),
+                'ie', 'e'), 'io', 'e'),
+            'c(?!h)', 'k', 'g'
+        )
+    )
+$$;
+
+-- Ключ поиска: нормализованные слова в алфавитном порядке через пробел
+CREATE OR REPLACE FUNCTION resident_name_key(name text) RETURNS text
+LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE AS $$
+    SELECT coalesce(string_agg(word, ' ' ORDER BY word), '')
+    FROM regexp_split_to_table(public.resident_name_fold(name), '\s+') AS word
+    WHERE word <> ''
+$$;
+
+ALTER TABLE residents
+    ADD COLUMN IF NOT EXISTS search_key text GENERATED ALWAYS AS (
+        resident_name_key(last_name || ' ' || first_name || ' ' || coalesce(patronymic, ''))
+    ) STORED,
+    ADD COLUMN IF NOT EXISTS search_key_short text GENERATED ALWAYS AS (
+        resident_name_key(last_name || ' ' || first_name)
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS ix_residents_search_key ON residents (search_key);
+CREATE INDEX IF NOT EXISTS ix_residents_search_key_short ON residents (search_key_short);
+-- Вход по номеру пропуска и поиск жильца по Telegram (промах кэша в middleware)
+CREATE INDEX IF NOT EXISTS ix_residents_idcards ON residents (idcards);
+CREATE INDEX IF NOT EXISTS ix_residents_tg_id ON residents (tg_id);
+
+ANALYZE residents;
@@ -0,0 +1,26 @@
+-- Рабочая таблица booking растет бесконечно, хотя почти все запросы смотрят на
+-- ближайшие дни. Завершенные брони старше BOOKING_ARCHIVE_AFTER_DAYS ночная задача
+-- переносит в booking_archive (archive_finished_bookings), и booking вместе с индексами
+-- остается размером в несколько недель.
+--
+-- Вместо секционирования по месяцам: ограничение booking_no_overlap (EXCLUDE по
+-- машине и интервалу) нельзя поддерживать через секции, а первичный ключ пришлось бы
+-- расширить ключом секционирования.
+CREATE TABLE IF NOT EXISTS booking_archive (
+    id bigint PRIMARY KEY,
+    inidresidents bigint REFERENCES residents(id),
+    inidmachine integer NOT NULL REFERENCES machines(id),
+    start_time timestamp NOT NULL,
+    end_time timestamp NOT NULL,
+    status smallint NOT NULL,
+    reminded_at timestamp,
+    confirm_deadline timestamp,
+    archived_at timestamp NOT NULL DEFAULT now()
+);
+
+-- Прошлые месяцы календаря и история жильца
+CREATE INDEX IF NOT EXISTS ix_booking_archive_start ON booking_archive (start_time) WHERE status <> 2;
+CREATE INDEX IF NOT EXISTS ix_booking_archive_resident ON booking_archive (inidresidents, start_time);
+
+-- Выборка пачки на перенос (включая отмененные брони, которых нет в частичных индексах)
+CREATE INDEX IF NOT EXISTS ix_booking_end_time ON booking (end_time);
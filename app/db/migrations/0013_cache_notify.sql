@@ -0,0 +1,75 @@
+-- Каждый экземпляр бота держит в памяти занятость машин по дням, загруженность месяцев
+-- календаря и жильцов по tg_id. Изменения броней и жильцов, сделанные другим экземпляром
+-- (или вручную, импортом списка жильцов), рассылаются через NOTIFY, и экземпляры
+-- сбрасывают только затронутое:
+--   booking_changed   — день брони ('YYYY-MM-DD'), если изменилась занятость;
+--   residents_changed — tg_id жильца, если изменилась привязанная к Telegram запись.
+-- Пустая строка — TRUNCATE: сбрасывается все. Одинаковые уведомления одной транзакции
+-- Postgres склеивает, поэтому пачка броней одного дня дает одно уведомление.
+
+CREATE OR REPLACE FUNCTION notify_booking_changed() RETURNS trigger AS $$
+DECLARE
+    old_live boolean;
+    new_live boolean;
+BEGIN
+    IF TG_LEVEL = 'STATEMENT' THEN
+        PERFORM pg_notify('booking_changed', '');
+        RETURN NULL;
+    END IF;
+    old_live := TG_OP <> 'INSERT' AND OLD.status <> 2;
+    new_live := TG_OP <> 'DELETE' AND NEW.status <> 2;
+    -- Подтверждение, отметка о напоминании: слоты заняты те же
+    IF TG_OP = 'UPDATE' AND old_live = new_live
+       AND (OLD.inidmachine, OLD.start_time, OLD.end_time) = (NEW.inidmachine, NEW.start_time, NEW.end_time) THEN
+        RETURN NULL;
+    END IF;
+    IF old_live THEN
+        PERFORM pg_notify('booking_changed', OLD.start_time::date::text);
+    END IF;
+    IF new_live THEN
+        PERFORM pg_notify('booking_changed', NEW.start_time::date::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS booking_changed ON booking;
+CREATE TRIGGER booking_changed
+    AFTER INSERT OR UPDATE OR DELETE ON booking
+    FOR EACH ROW EXECUTE FUNCTION notify_booking_changed();
+
+DROP TRIGGER IF EXISTS booking_truncated ON booking;
+CREATE TRIGGER booking_truncated
+    AFTER TRUNCATE ON booking
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_booking_changed();
+
+CREATE OR REPLACE FUNCTION notify_residents_changed() RETURNS trigger AS $$
+BEGIN
+    IF TG_LEVEL = 'STATEMENT' THEN
+        PERFORM pg_notify('residents_changed', '');
+        RETURN NULL;
+    END IF;
+    -- Импорт списка жильцов переписывает строки без изменений
+    IF TG_OP = 'UPDATE' AND OLD IS NOT DISTINCT FROM NEW THEN
+        RETURN NULL;
+    END IF;
+    -- Новый жилец без tg_id никем не закэширован; привязка tg_id сбрасывает "не зарегистрирован"
+    IF TG_OP <> 'INSERT' AND OLD.tg_id IS NOT NULL THEN
+        PERFORM pg_notify('residents_changed', OLD.tg_id::text);
+    END IF;
+    IF TG_OP <> 'DELETE' AND NEW.tg_id IS NOT NULL THEN
+        PERFORM pg_notify('residents_changed', NEW.tg_id::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS residents_changed ON residents;
+CREATE TRIGGER residents_changed
+    AFTER INSERT OR UPDATE OR DELETE ON residents
+    FOR EACH ROW EXECUTE FUNCTION notify_residents_changed();
+
+DROP TRIGGER IF EXISTS residents_truncated ON residents;
+CREATE TRIGGER residents_truncated
+    AFTER TRUNCATE ON residents
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_residents_changed();
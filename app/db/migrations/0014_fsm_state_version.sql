@@ -0,0 +1,24 @@
+-- FSM-хранилище при нескольких экземплярах бота (FSM_STORAGE=postgres).
+-- version растет при каждой записи ключа: экземпляр пишет состояние, только если строка
+-- не изменилась с тех пор, как он ее прочитал, иначе его запись отбрасывается
+-- (раньше выигрывал последний сброс). Пустые записи больше не удаляются сразу —
+-- удаление сбросило бы version, — их раз в час чистит само хранилище.
+-- NOTIFY fsm_state_changed ('<version> <key>') сбрасывает ключ в кэшах других экземпляров.
+
+ALTER TABLE fsm_state ADD COLUMN IF NOT EXISTS version bigint NOT NULL DEFAULT 1;
+
+CREATE OR REPLACE FUNCTION notify_fsm_state_changed() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('fsm_state_changed', '0 ' || OLD.key);
+    ELSE
+        PERFORM pg_notify('fsm_state_changed', NEW.version || ' ' || NEW.key);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS fsm_state_changed ON fsm_state;
+CREATE TRIGGER fsm_state_changed
+    AFTER INSERT OR UPDATE OR DELETE ON fsm_state
+    FOR EACH ROW EXECUTE FUNCTION notify_fsm_state_changed();
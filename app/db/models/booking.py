@@ -1,10 +1,33 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import BigInteger, Integer, DateTime, String, ForeignKey
+from sqlalchemy import BigInteger, Integer, SmallInteger, DateTime, ForeignKey, Computed, Index, CheckConstraint, literal_column
+from sqlalchemy.dialects.postgresql import ExcludeConstraint, Range, TSRANGE
 from datetime import datetime
+from enum import IntEnum
+from typing import Optional
 from app.db.models.machine import Machine
 from app.db.models.residents import Resident
 from app.db.base import Base
 
+
+class BookingStatus(IntEnum):
+    """Статус брони (smallint, миграция 0010). Раньше — строки 'Ожидание'/'Подтверждено'/'Отменено'."""
+    PENDING = 0     # ждет подтверждения
+    CONFIRMED = 1   # подтверждена владельцем
+    CANCELLED = 2   # отменена вручную или авто-отменой — конечный статус
+
+
+# Допустимые переходы: новый статус -> статусы, из которых в него можно попасть
+BOOKING_TRANSITIONS = {
+    BookingStatus.PENDING: (),
+    BookingStatus.CONFIRMED: (BookingStatus.PENDING,),
+    BookingStatus.CANCELLED: (BookingStatus.PENDING, BookingStatus.CONFIRMED),
+}
+
+# Условие "бронь активна" одним текстом для запросов, ограничения и частичных индексов.
+# Константа, а не параметр: иначе Postgres не сопоставит условие с частичным индексом.
+_LIVE_SQL = f"status <> {BookingStatus.CANCELLED.value}"
+
+
 class Booking(Base):
     __tablename__ = "booking"
 
@@ -16,9 +39,49 @@ class Booking(Base):
     
     start_time: Mapped[datetime] = mapped_column(DateTime, nullable=False)
     end_time: Mapped[datetime] = mapped_column(DateTime, nullable=False)
-    status: Mapped[str] = mapped_column(String, nullable=True)
+    status: Mapped[int] = mapped_column(SmallInteger, nullable=False, default=BookingStatus.PENDING, server_default="0")
+    # Когда владельцу ушел запрос на подтверждение (миграция 0004); NULL — еще не уходил
+    reminded_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    # Срок подтверждения брони, выданной из очереди (миграция 0007); NULL — обычная бронь
+    confirm_deadline: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    # Интервал брони [start_time, end_time), вычисляется самой БД (миграция 0002).
+    # Все проверки пересечений идут через period && tsrange(...) по GiST-индексу.
+    period: Mapped[Range[datetime]] = mapped_column(
+        TSRANGE, Computed("tsrange(start_time, end_time, '[)')", persisted=True)
+    )
 
     # ДОБАВЬ ЭТУ СТРОКУ:
     # Она создает виртуальное поле .machine, которое SQLAlchemy будет подгружать
     machine: Mapped["Machine"] = relationship("Machine")
-    user: Mapped["Resident"] = relationship("Resident")
\ No newline at end of file
+    user: Mapped["Resident"] = relationship("Resident")
+
+    __table_args__ = (
+        # Активные брони одной машины не могут пересекаться (миграции 0001/0002, нужен btree_gist)
+        ExcludeConstraint(
+            (inidmachine, "="),
+            (period, "&&"),
+            name="booking_no_overlap",
+            using="gist",
+            where=literal_column(_LIVE_SQL),
+        ),
+        CheckConstraint("status IN (0, 1, 2)", name="booking_status_check"),
+        # Частичные индексы только по активным броням (миграция 0010): отмененные строки
+        # копятся в истории, но горячие запросы их не касаются.
+        # Пересечения без конкретной машины (get_available_machines, занятость дня)
+        Index("ix_booking_live_period", period, postgresql_using="gist", postgresql_where=literal_column(_LIVE_SQL)),
+        # Диапазонные выборки по месяцу/дню (get_month_workload, напоминания)
+        Index("ix_booking_live_start", start_time, postgresql_where=literal_column(_LIVE_SQL)),
+        # Записи жильца (get_user_bookings, проверка очереди)
+        Index("ix_booking_live_resident", inidresidents, start_time, postgresql_where=literal_column(_LIVE_SQL)),
+        # Перенос завершенных броней в архив (миграция 0012)
+        Index("ix_booking_end_time", end_time),
+    )
+
+
+def live_booking(model=None):
+    """
+    Условие "бронь не отменена" — то же, что у booking_no_overlap и частичных индексов.
+    model — Booking (по умолчанию) или BookingArchive.
+    """
+    return (model or Booking).status != literal_column(str(BookingStatus.CANCELLED.value))
@@ -0,0 +1,35 @@
+from sqlalchemy import BigInteger, Integer, SmallInteger, DateTime, ForeignKey, Index, literal_column, func
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime
+from typing import Optional
+from app.db.base import Base
+from app.db.models.booking import BookingStatus
+
+
+class BookingArchive(Base):
+    """
+    Завершенные брони старше BOOKING_ARCHIVE_AFTER_DAYS (миграция 0012). Ночная задача
+    переносит их из booking пачками, чтобы рабочая таблица и ее индексы оставались
+    размером в несколько недель. Колонки те же, id сохраняется.
+    """
+    __tablename__ = "booking_archive"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    inidresidents: Mapped[int] = mapped_column(BigInteger, ForeignKey("residents.id"))
+    inidmachine: Mapped[int] = mapped_column(Integer, ForeignKey("machines.id"), nullable=False)
+    start_time: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    end_time: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    status: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+    reminded_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    confirm_deadline: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    archived_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        # Загрузка прошлых месяцев календаря
+        Index(
+            "ix_booking_archive_start", start_time,
+            postgresql_where=literal_column(f"status <> {BookingStatus.CANCELLED.value}")
+        ),
+        # История жильца
+        Index("ix_booking_archive_resident", inidresidents, start_time),
+    )
@@ -0,0 +1,17 @@
+from sqlalchemy import String, DateTime, JSON, BigInteger
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime
+from typing import Optional
+from app.db.base import Base
+
+class FsmState(Base):
+    """Состояние FSM aiogram одного чата/пользователя (миграция 0005)."""
+    __tablename__ = "fsm_state"
+
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    state: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    data: Mapped[dict] = mapped_column(JSON().with_variant(JSONB, "postgresql"), nullable=False, default=dict)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.now)
+    # Номер записи ключа для условной записи из нескольких экземпляров (миграция 0014)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=1, server_default="1")
@@ -0,0 +1,36 @@
+from sqlalchemy import BigInteger, DateTime, Integer, String, Text, JSON, Index
+from sqlalchemy import text as sql_text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime
+from typing import Optional
+from app.db.base import Base
+
+class OutboxMessage(Base):
+    """
+    Исходящее сообщение Telegram (миграция 0008). Пишется в той же транзакции, что и
+    изменение брони, доставляется фоновым воркером. Ожидают отправки строки с пустыми
+    sent_at и failed_at; available_at — когда можно брать (повтор, аренда воркером).
+    """
+    __tablename__ = "outbox"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+    parse_mode: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    reply_markup: Mapped[Optional[dict]] = mapped_column(JSON().with_variant(JSONB, "postgresql"), nullable=True)
+    # Одно и то же событие (например, напоминание по брони) ставится в очередь один раз
+    dedupe_key: Mapped[Optional[str]] = mapped_column(String, nullable=True, unique=True)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    available_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.now)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.now)
+    sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    failed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    __table_args__ = (
+        Index(
+            "ix_outbox_pending", "available_at", "id",
+            postgresql_where=sql_text("sent_at IS NULL AND failed_at IS NULL")
+        ),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import String, BigInteger, Integer
+from sqlalchemy import String, BigInteger, Integer, Computed, Index
 from sqlalchemy.orm import Mapped, mapped_column
 from app.db.base import Base
 
@@ -12,4 +12,23 @@ class Resident(Base):
     last_name: Mapped[str] = mapped_column(String, nullable=False)
     first_name: Mapped[str] = mapped_column(String, nullable=False)
     patronymic: Mapped[str] = mapped_column(String, nullable=False)
-    language: Mapped[str] = mapped_column(String, default='RU', nullable=False)
\ No newline at end of file
+    language: Mapped[str] = mapped_column(String, default='RU', nullable=False)
+    # Нормализованные ключи поиска по ФИО (миграция 0011, функция resident_name_key):
+    # транслитерация, регистр, ё/е, слова по алфавиту. short — без отчества.
+    search_key: Mapped[str] = mapped_column(
+        String,
+        Computed("resident_name_key(last_name || ' ' || first_name || ' ' || coalesce(patronymic, ''))", persisted=True),
+        nullable=True
+    )
+    search_key_short: Mapped[str] = mapped_column(
+        String,
+        Computed("resident_name_key(last_name || ' ' || first_name)", persisted=True),
+        nullable=True
+    )
+
+    __table_args__ = (
+        Index("ix_residents_search_key", search_key),
+        Index("ix_residents_search_key_short", search_key_short),
+        Index("ix_residents_idcards", idcards),
+        Index("ix_residents_tg_id", tg_id),
+    )
@@ -0,0 +1,24 @@
+from sqlalchemy import BigInteger, Date, DateTime, String, Time, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import date, datetime, time
+from typing import Optional
+from app.db.base import Base
+
+class SlotSubscription(Base):
+    """Подписка жильца на освободившиеся слоты: день, интервал времени, тип машины (миграция 0006)."""
+    __tablename__ = "slot_subscriptions"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    inidresidents: Mapped[int] = mapped_column(BigInteger, ForeignKey("residents.id", ondelete="CASCADE"), nullable=False)
+    day: Mapped[date] = mapped_column(Date, nullable=False)
+    time_from: Mapped[time] = mapped_column(Time, nullable=False)
+    time_to: Mapped[time] = mapped_column(Time, nullable=False)
+    # NULL — любой тип машины
+    machine_type: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (
+        UniqueConstraint("inidresidents", "day", "time_from", "time_to", "machine_type", name="uq_slot_subscription"),
+        # Поиск подписчиков освободившегося слота: день + тип, интервал проверяется по найденным
+        Index("ix_slot_subscriptions_day_type", "day", "machine_type"),
+    )
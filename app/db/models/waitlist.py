@@ -0,0 +1,23 @@
+from sqlalchemy import BigInteger, DateTime, String, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime
+from app.db.base import Base
+
+class WaitlistEntry(Base):
+    """
+    Очередь на занятый слот (время начала + тип машины), FIFO по id (миграция 0007).
+    Голова очереди берется по индексу (machine_type, slot_start, id) — O(log n).
+    """
+    __tablename__ = "waitlist"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    inidresidents: Mapped[int] = mapped_column(BigInteger, ForeignKey("residents.id", ondelete="CASCADE"), nullable=False)
+    machine_type: Mapped[str] = mapped_column(String, nullable=False)
+    slot_start: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    slot_end: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (
+        UniqueConstraint("inidresidents", "machine_type", "slot_start", name="uq_waitlist_entry"),
+        Index("ix_waitlist_head", "machine_type", "slot_start", "id"),
+    )
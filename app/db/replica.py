@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from app.db.base import (
+    engine,
+    replica_engine,
+    session_scope,
+    REPLICA_MAX_LAG,
+    REPLICA_CHECK_INTERVAL,
+)
+
+# Метка сессий реплики в Session.info: их коммиты не считаются записью
+REPLICA_SESSION = "replica"
+# Метка сессий, чьи коммиты не влияют на чтения с реплики (служебные таблицы вроде outbox)
+SKIP_WRITE_FENCE = "skip_write_fence"
+
+_PRIMARY_LSN = text("SELECT pg_current_wal_lsn()::text")
+# Сколько байт WAL реплике осталось воспроизвести до позиции основной БД.
+# NULL — сервер не standby (например, копия для тестов): считаем его догнавшим.
+_REPLAY_BEHIND = text("SELECT pg_wal_lsn_diff(CAST(CAST(:lsn AS text) AS pg_lsn), pg_last_wal_replay_lsn())")
+
+
+class ReplicaRouter:
+    """
+    Решает, куда идет чтение: на реплику или в основную БД.
+
+    Раз в check_interval секунд снимает позицию WAL на основной БД и сравнивает ее с
+    воспроизведенной на реплике. Если реплика ее догнала, на ней есть все, что было
+    закоммичено до начала проверки (fresh_at). Чтение идет на реплику, только если:
+      - реплика отвечает и была свежей не больше max_lag секунд назад;
+      - этот процесс ничего не коммитил в основную БД после fresh_at — иначе жилец
+        не увидел бы только что созданную бронь, а кэши и движок занятости запомнили
+        бы старые данные;
+      - переданная сессия не в транзакции (в ней могут быть незакоммиченные изменения).
+    Во всех остальных случаях, и если к реплике не удалось подключиться, чтение идет
+    в основную БД. Упавшая реплика выключается до следующей успешной проверки.
+    """
+
+    def __init__(
+        self,
+        replica: Optional[AsyncEngine],
+        max_lag: float = REPLICA_MAX_LAG,
+        check_interval: float = REPLICA_CHECK_INTERVAL,
+    ):
+        self.engine = replica
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._sessions = (
+            async_sessionmaker(replica, expire_on_commit=False, info={REPLICA_SESSION: True})
+            if replica is not None else None
+        )
+        # None — еще не проверяли
+        self.available: Optional[bool] = None
+        # Моменты time.monotonic(): на реплике есть все, что закоммичено до fresh_at;
+        # last_write — последний коммит этого процесса в основную БД
+        self.fresh_at: Optional[float] = None
+        self.last_write = 0.0
+        self._lagging = False
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {"replica": 0, "primary": 0, "fallbacks": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.engine is not None
+
+    def note_write(self):
+        """В основную БД закоммичено изменение: до следующей проверки чтения идут туда же."""
+        self.last_write = time.monotonic()
+
+    def lag(self) -> Optional[float]:
+        """Насколько данные реплики могут быть старше основной БД, в секундах."""
+        return None if self.fresh_at is None else time.monotonic() - self.fresh_at
+
+    def usable(self, session: Optional[AsyncSession] = None) -> bool:
+        if not self.enabled or not self.available or self.fresh_at is None:
+            return False
+        if session is not None and session.in_transaction():
+            return False
+        return self.last_write < self.fresh_at and self.lag() <= self.max_lag
+
+    async def open(self, session: Optional[AsyncSession] = None) -> Optional[AsyncSession]:
+        """Сессия реплики с уже открытым соединением или None, если читать нужно из основной БД."""
+        if not self.usable(session):
+            self.counters["primary"] += 1
+            return None
+        replica_session = self._sessions()
+        try:
+            await replica_session.connection()
+        except Exception as e:
+            await replica_session.close()
+            self._mark_down(e)
+            self.counters["fallbacks"] += 1
+            return None
+        self.counters["replica"] += 1
+        return replica_session
+
+    def _mark_down(self, error: Exception):
+        if self.available is not False:
+            logging.warning(f"[Replica] Unavailable, reading from primary: {str(error) or type(error).__name__}")
+        self.available = False
+
+    # ---------- проверка отставания ----------
+
+    async def check(self):
+        started = time.monotonic()
+        async with engine.connect() as conn:
+            lsn = (await conn.execute(_PRIMARY_LSN)).scalar()
+        try:
+            async with self.engine.connect() as conn:
+                behind = (await conn.execute(_REPLAY_BEHIND, {"lsn": lsn})).scalar()
+        except Exception as e:
+            self._mark_down(e)
+            return
+        if self.available is not True:
+            logging.info("[Replica] Available, routing reads to replica")
+        self.available = True
+        if behind is None or behind <= 0:
+            if self._lagging:
+                logging.info("[Replica] Caught up, routing reads to replica")
+            self._lagging = False
+            self.fresh_at = started
+        elif not self._lagging and self.lag() is not None and self.lag() > self.max_lag:
+            self._lagging = True
+            logging.warning(f"[Replica] Lagging {self.lag():.1f}s ({int(behind)} bytes of WAL behind), reading from primary")
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.check(), timeout=max(self.max_lag, self.check_interval))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Не ответила основная БД (или обе): о реплике ничего нового не узнали
+                logging.error(f"[Replica] Lag check failed: {str(e) or type(e).__name__}")
+            await asyncio.sleep(self.check_interval)
+
+    def start(self) -> Optional[asyncio.Task]:
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.enabled:
+            await self.engine.dispose()
+
+    def stats(self) -> dict:
+        lag = self.lag()
+        return {
+            "enabled": self.enabled,
+            "available": self.available,
+            "lag": round(lag, 2) if lag is not None else None,
+            **self.counters,
+        }
+
+
+replica_router = ReplicaRouter(replica_engine)
+
+
+@event.listens_for(Session, "after_commit")
+def _on_commit(session: Session):
+    if not session.info.get(REPLICA_SESSION) and not session.info.get(SKIP_WRITE_FENCE):
+        replica_router.note_write()
+
+
+@asynccontextmanager
+async def read_scope(session: Optional[AsyncSession] = None) -> AsyncIterator[AsyncSession]:
+    """
+    Как session_scope, но для запросов только на чтение: отдает сессию реплики, если
+    replica_router считает ее достаточно свежей, иначе — переданную или новую сессию
+    основной БД. Внутри нельзя ничего менять: запись на реплике упадет.
+    """
+    replica_session = await replica_router.open(session)
+    if replica_session is None:
+        async with session_scope(session) as session:
+            yield session
+        return
+    async with replica_session:
+        yield replica_session
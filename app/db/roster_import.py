@@ -0,0 +1,288 @@
+"""
+Загрузка списка жильцов из CSV (в том числе CSV, сохраненного из Excel).
+
+    python -m app.db.roster_import roster.csv [--prune] [--dry-run] [--encoding cp1251]
+
+Файл читается построчно и потоком уходит в Postgres через COPY во временную таблицу,
+затем один запрос сводит ее с residents и rooms. Память не зависит от размера файла.
+Жилец узнается по номеру пропуска (idcards): у найденных обновляются комната и ФИО,
+привязка к Telegram (tg_id) и язык сохраняются, новые добавляются.
+
+Без --prune жильцы, которых нет в файле, только считаются. С --prune они удаляются,
+а те, у кого есть история броней, остаются, но отвязываются от Telegram. Заодно
+удаляются комнаты, в которых больше никто не живет. Жильцы из отклоненных строк файла
+(например, с опечаткой в номере комнаты) не удаляются; если в отклоненной строке не
+читается номер пропуска, --prune отказывается работать — неясно, кого она описывает.
+--dry-run показывает разницу, ничего не меняя. Бот сбрасывает закэшированных жильцов
+по NOTIFY residents_changed (миграция 0013).
+"""
+import argparse
+import asyncio
+import csv
+import logging
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+
+from app.db.base import engine
+
+STAGING_TABLE = "roster_staging"
+STAGING_COLUMNS = ["lineno", "room", "idcards", "last_name", "first_name", "patronymic"]
+# Номера пропусков из отклоненных строк: эти жильцы есть в файле, --prune их не трогает
+REJECTED_TABLE = "roster_rejected"
+
+# Заголовки столбцов: как их называют в выгрузках -> поле
+HEADER_ALIASES = {
+    "room": "room", "комната": "room", "№ комнаты": "room", "номер комнаты": "room",
+    "id_card": "idcards", "idcards": "idcards", "idcard": "idcards", "пропуск": "idcards",
+    "номер пропуска": "idcards", "студенческий": "idcards",
+    "last_name": "last_name", "фамилия": "last_name",
+    "first_name": "first_name", "имя": "first_name",
+    "patronymic": "patronymic", "отчество": "patronymic",
+    "fio": "fio", "фио": "fio",
+}
+# Сколько примеров отклоненных строк показывать в отчете
+REJECTED_SAMPLE = 20
+
+
+class RosterFormatError(ValueError):
+    """Файл не похож на список жильцов (нет нужных столбцов)."""
+
+
+def _columns(header: List[str]) -> Dict[str, int]:
+    """Поле -> номер столбца по заголовку файла."""
+    columns = {}
+    for i, name in enumerate(header):
+        field = HEADER_ALIASES.get(name.strip().lower())
+        if field and field not in columns:
+            columns[field] = i
+    has_name = "fio" in columns or {"last_name", "first_name"} <= columns.keys()
+    if "room" not in columns or "idcards" not in columns or not has_name:
+        raise RosterFormatError(
+            f"Нужны столбцы комнаты, номера пропуска и ФИО (или фамилии и имени), в заголовке: {header}"
+        )
+    return columns
+
+
+def _int(value: str) -> Optional[int]:
+    value = value.strip()
+    # Excel любит сохранять числа как "1234.0"
+    if value.endswith(".0"):
+        value = value[:-2]
+    return int(value) if value.isdigit() else None
+
+
+class RosterReader:
+    """
+    Построчно разбирает CSV в записи для COPY: (номер строки, комната, пропуск, фамилия,
+    имя, отчество). Разделитель (",", ";" или табуляция) определяется по заголовку.
+    Строки без комнаты, пропуска или имени пропускаются и попадают в rejected; читаемые
+    номера пропусков из них собираются в rejected_cards, остальные считает unidentified.
+    """
+
+    def __init__(self, path: str, encoding: str = "utf-8-sig", delimiter: Optional[str] = None):
+        self.path = path
+        self.encoding = encoding
+        self.delimiter = delimiter
+        self.rows = 0
+        self.rejected = 0
+        self.rejected_sample: List[Tuple[int, str]] = []
+        self.rejected_cards: Set[int] = set()
+        self.unidentified = 0
+
+    def _reject(self, lineno: int, reason: str, idcards: Optional[int]):
+        self.rejected += 1
+        if idcards is not None:
+            self.rejected_cards.add(idcards)
+        else:
+            self.unidentified += 1
+        if len(self.rejected_sample) < REJECTED_SAMPLE:
+            self.rejected_sample.append((lineno, reason))
+
+    def __iter__(self) -> Iterator[tuple]:
+        with open(self.path, newline="", encoding=self.encoding) as f:
+            first_line = f.readline()
+            delimiter = self.delimiter or max((";", ",", "\t"), key=first_line.count)
+            columns = _columns(next(csv.reader([first_line], delimiter=delimiter)))
+            reader = csv.reader(f, delimiter=delimiter)
+
+            for lineno, row in enumerate(reader, start=2):
+                if not any(value.strip() for value in row):
+                    continue
+                cells = {
+                    field: row[i].strip() if i < len(row) else ""
+                    for field, i in columns.items()
+                }
+
+                room, idcards = _int(cells["room"]), _int(cells["idcards"])
+                if "fio" in cells:
+                    last_name, first_name, *rest = cells["fio"].split() + ["", ""]
+                    patronymic = " ".join(word for word in rest if word)
+                else:
+                    last_name, first_name, patronymic = cells["last_name"], cells["first_name"], cells.get("patronymic", "")
+
+                if room is None:
+                    self._reject(lineno, f"комната {cells['room']!r}", idcards)
+                elif idcards is None:
+                    self._reject(lineno, f"пропуск {cells['idcards']!r}", idcards)
+                elif not last_name or not first_name:
+                    self._reject(lineno, "нет фамилии или имени", idcards)
+                else:
+                    self.rows += 1
+                    yield lineno, room, idcards, last_name, first_name, patronymic
+
+
+# Одна выборка — одно сведение: у дублей пропуска в файле побеждает последняя строка.
+# Все CTE видят один снимок, поэтому обновляемые и добавляемые строки не пересекаются.
+_UPSERT = text(f"""
+WITH src AS (
+    SELECT DISTINCT ON (idcards) room, idcards, last_name, first_name, patronymic
+    FROM {STAGING_TABLE}
+    ORDER BY idcards, lineno DESC
+),
+new_rooms AS (
+    INSERT INTO rooms (idroom)
+    SELECT DISTINCT room FROM src
+    ON CONFLICT (idroom) DO NOTHING
+    RETURNING idroom
+),
+changed AS (
+    -- old — та же строка до обновления (RETURNING видит уже новые значения r)
+    UPDATE residents r
+    SET inidroom = s.room, last_name = s.last_name, first_name = s.first_name, patronymic = s.patronymic
+    FROM src s, residents old
+    WHERE r.idcards = s.idcards AND old.id = r.id
+      AND (r.inidroom, r.last_name, r.first_name, r.patronymic)
+          IS DISTINCT FROM (s.room, s.last_name, s.first_name, s.patronymic)
+    RETURNING r.id, old.inidroom <> s.room AS moved
+),
+added AS (
+    INSERT INTO residents (inidroom, idcards, last_name, first_name, patronymic, language)
+    SELECT s.room, s.idcards, s.last_name, s.first_name, s.patronymic, 'RU'
+    FROM src s
+    -- NOT IN, а не NOT EXISTS: подзапрос хэшируется один раз. На пустой таблице (первый
+    -- импорт) NOT EXISTS планируется вложенным циклом с просмотром residents на каждую
+    -- строку файла, а страницы residents тем временем наполняет эта же вставка
+    WHERE s.idcards NOT IN (SELECT idcards FROM residents)
+    RETURNING id
+)
+SELECT
+    (SELECT count(*) FROM {STAGING_TABLE}) AS staged,
+    (SELECT count(*) FROM src) AS distinct_cards,
+    (SELECT count(*) FROM added) AS added,
+    (SELECT count(*) FROM changed) AS updated,
+    (SELECT count(*) FROM changed WHERE moved) AS moved,
+    (SELECT count(*) FROM new_rooms) AS rooms_added,
+    (SELECT count(*) FROM residents r
+     WHERE NOT EXISTS (SELECT 1 FROM src WHERE src.idcards = r.idcards)
+       AND NOT EXISTS (SELECT 1 FROM {REJECTED_TABLE} k WHERE k.idcards = r.idcards)) AS missing
+""")
+
+# Ушедшие жильцы: без истории броней удаляются (подписки и очередь — каскадом),
+# с историей остаются, но теряют доступ к боту
+_PRUNE = text(f"""
+WITH gone AS (
+    SELECT r.id,
+           EXISTS (SELECT 1 FROM booking b WHERE b.inidresidents = r.id)
+           OR EXISTS (SELECT 1 FROM booking_archive a WHERE a.inidresidents = r.id) AS has_history
+    FROM residents r
+    WHERE NOT EXISTS (SELECT 1 FROM {STAGING_TABLE} s WHERE s.idcards = r.idcards)
+      AND NOT EXISTS (SELECT 1 FROM {REJECTED_TABLE} k WHERE k.idcards = r.idcards)
+),
+deleted AS (
+    DELETE FROM residents r USING gone g
+    WHERE r.id = g.id AND NOT g.has_history
+    RETURNING r.id
+),
+detached AS (
+    UPDATE residents r SET tg_id = NULL
+    FROM gone g
+    WHERE r.id = g.id AND g.has_history AND r.tg_id IS NOT NULL
+    RETURNING r.id
+)
+SELECT (SELECT count(*) FROM deleted) AS deleted, (SELECT count(*) FROM detached) AS detached
+""")
+
+_PRUNE_ROOMS = text("""
+DELETE FROM rooms WHERE NOT EXISTS (SELECT 1 FROM residents r WHERE r.inidroom = rooms.idroom)
+""")
+
+
+async def import_roster(reader: RosterReader, prune: bool = False, dry_run: bool = False) -> dict:
+    """Загружает список одной транзакцией и возвращает отчет о разнице."""
+    async with engine.connect() as conn:
+        async with conn.begin() as transaction:
+            await conn.execute(text(
+                f"CREATE TEMP TABLE {STAGING_TABLE} ("
+                "lineno integer, room integer, idcards integer, "
+                "last_name text, first_name text, patronymic text"
+                ") ON COMMIT DROP"
+            ))
+            raw = (await conn.get_raw_connection()).driver_connection
+            # asyncpg забирает записи из генератора порциями — файл целиком в памяти не бывает
+            await raw.copy_records_to_table(STAGING_TABLE, records=reader, columns=STAGING_COLUMNS)
+            await conn.execute(text(f"ANALYZE {STAGING_TABLE}"))
+            await conn.execute(text(f"CREATE TEMP TABLE {REJECTED_TABLE} (idcards integer) ON COMMIT DROP"))
+            await raw.copy_records_to_table(
+                REJECTED_TABLE, records=[(card,) for card in reader.rejected_cards], columns=["idcards"]
+            )
+
+            report = dict((await conn.execute(_UPSERT)).mappings().one())
+            report["duplicates"] = report.pop("staged") - report["distinct_cards"]
+            report["unchanged"] = report.pop("distinct_cards") - report["added"] - report["updated"]
+            report["rejected"] = reader.rejected
+            if prune:
+                if reader.unidentified:
+                    raise RosterFormatError(
+                        f"--prune: в {reader.unidentified} отклоненных строках не читается номер пропуска, "
+                        "удалять жильцов по такому файлу нельзя. Исправьте строки или запустите без --prune"
+                    )
+                report.update((await conn.execute(_PRUNE)).mappings().one())
+                report["rooms_removed"] = (await conn.execute(_PRUNE_ROOMS)).rowcount
+
+            if dry_run:
+                await transaction.rollback()
+    return report
+
+
+def _print_report(report: dict, reader: RosterReader, prune: bool, dry_run: bool):
+    lines = [
+        f"Строк в файле: {reader.rows + reader.rejected}, отклонено: {reader.rejected}, "
+        f"повторов пропуска: {report['duplicates']}",
+        f"Добавлено: {report['added']}, обновлено: {report['updated']} "
+        f"(переселено: {report['moved']}), без изменений: {report['unchanged']}",
+        f"Нет в файле: {report['missing']}",
+        f"Новых комнат: {report['rooms_added']}",
+    ]
+    if prune:
+        lines.append(
+            f"Удалено жильцов: {report['deleted']}, отвязано от Telegram (есть история броней): "
+            f"{report['detached']}, удалено комнат: {report['rooms_removed']}"
+        )
+    for lineno, reason in reader.rejected_sample:
+        lines.append(f"  строка {lineno}: {reason}")
+    if dry_run:
+        lines.append("Пробный запуск: изменения не сохранены")
+    print("\n".join(lines))
+
+
+async def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Загрузка списка жильцов и комнат из CSV")
+    parser.add_argument("path", help="CSV-файл: комната, пропуск, ФИО (или фамилия, имя, отчество)")
+    parser.add_argument("--prune", action="store_true", help="удалить жильцов и комнаты, которых нет в файле")
+    parser.add_argument("--dry-run", action="store_true", help="показать разницу, ничего не меняя")
+    parser.add_argument("--encoding", default="utf-8-sig", help="кодировка файла (Excel на Windows: cp1251)")
+    parser.add_argument("--delimiter", default=None, help="разделитель, по умолчанию определяется по заголовку")
+    args = parser.parse_args(argv)
+
+    reader = RosterReader(args.path, encoding=args.encoding, delimiter=args.delimiter)
+    try:
+        report = await import_roster(reader, prune=args.prune, dry_run=args.dry_run)
+    finally:
+        await engine.dispose()
+    _print_report(report, reader, args.prune, args.dry_run)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main())
@@ -28,6 +28,18 @@ CNtexts = {
         "select_time_prompt": "选择 {date} 的时间:",
         "select_date_prompt": "请选择日期",
         "day_fully_booked": "该日期已被全部预订。",
+        "day_fully_booked_subscribed": "该日期已被全部预订。如有空位，我们会通知您。",
+        "subscribe_btn": "🔔 有空位时通知我",
+        "subscribe_range_prompt": "{date} 您方便的时间是？如有空位，我们会通知您。",
+        "subscribe_whole_day": "全天",
+        "subscribed": "🔔 好的！{date}（{time}）如有空位，我们会通知您。",
+        "waitlist_prompt": "{date} 已约满。选择时间加入排队，空出的时段将分配给您：",
+        "waitlist_joined": "🕒 您已加入 {date} {time} 的排队，当前位置：{position}。",
+        "waitlist_granted_prompt": (
+            "🎉 您等待的时段已分配给您：{machine_type} 机器 №{machine_num}，<b>{date}</b> "
+            "（时间：{time_range}）。\n"
+            "请在 {deadline} 前确认，否则将转给排队中的下一位。"
+        ),
         "no_slots_available": "所选日期没有可用的时间段。",
         "no_available_slots_alert": "此时间没有可用的机器。",
 
@@ -54,6 +66,8 @@ CNtexts = {
         "cancel_confirm_success": "✅ 预订已成功取消。\n已向其他住户发送空位通知。",
         "cancel_error": "❌ 取消失败或预订已失效。",
         "slot_freed_notification": "🔔 <b>有空位了！</b>\n\n📅 日期: {date}\n⏰ 时间: {time}\n🧺 {m_type} №{m_num}\n\n快去预订吧！",
+        "slots_freed_digest": "🔔 <b>有空位了！</b>\n\n{slots}\n\n快去预订吧！",
+        "slots_freed_digest_line": "📅 {date} ⏰ {time} — {m_type} №{m_num}",
 
         "machines_none": "抱歉！此时间所有机器都已被占用。",
         "machine_prompt": "选择 {date} 的机器, {start} – {end}:",
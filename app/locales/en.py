@@ -40,6 +40,18 @@ ENtexts = {
         "select_time_prompt": "Select a time for {date}:",
         "select_date_prompt": "Please select a date",
         "day_fully_booked": "This date is fully booked.",
+        "day_fully_booked_subscribed": "This date is fully booked. We will notify you if a slot frees up.",
+        "subscribe_btn": "🔔 Notify me when a slot frees up",
+        "subscribe_range_prompt": "What time on {date} suits you? We will notify you if a slot frees up.",
+        "subscribe_whole_day": "Whole day",
+        "subscribed": "🔔 Done! We will notify you if a slot frees up on {date} ({time}).",
+        "waitlist_prompt": "{date} is fully booked. Pick a time to join the waitlist — a freed slot will go to you:",
+        "waitlist_joined": "🕒 You are on the waitlist for {date} {time}, position: {position}.",
+        "waitlist_granted_prompt": (
+            "🎉 A slot you were waiting for is yours: {machine_type} machine №{machine_num} on <b>{date}</b> "
+            "(time: {time_range}).\n"
+            "Confirm it by {deadline}, otherwise it goes to the next in line."
+        ),
         "no_slots_available": "No slots available on the selected date.",
         "no_available_slots_alert": "No available machines at this time.",
         "slots_none": "No free slots available on {date}",
@@ -47,6 +59,8 @@ ENtexts = {
         "cancel_confirm_success": "✅ Booking cancelled successfully.\nA notification about the free slot has been sent to other residents.",
         "cancel_error": "❌ Failed to cancel booking or it is already inactive.",
         "slot_freed_notification": "🔔 <b>Slot available!</b>\n\n📅 Date: {date}\n⏰ Time: {time}\n🧺 {m_type} #{m_num}\n\nBook it now!",
+        "slots_freed_digest": "🔔 <b>Slots available!</b>\n\n{slots}\n\nBook now!",
+        "slots_freed_digest_line": "📅 {date} ⏰ {time} — {m_type} #{m_num}",
 
         "machine_type_wash": "Washing",
         "machine_type_dry": "Drying",
@@ -28,6 +28,18 @@ RUtexts = {
         "select_time_prompt": "Выберите время на {date}:",
         "select_date_prompt": "Выберите дату",
         "day_fully_booked": "На выбранную дату нет свободных мест.",
+        "day_fully_booked_subscribed": "На выбранную дату нет свободных мест. Мы сообщим, если место освободится.",
+        "subscribe_btn": "🔔 Сообщить, когда освободится",
+        "subscribe_range_prompt": "В какое время {date} вам удобно? Сообщим, если освободится место.",
+        "subscribe_whole_day": "Весь день",
+        "subscribed": "🔔 Готово! Сообщим, если {date} ({time}) освободится место.",
+        "waitlist_prompt": "На {date} все занято. Выберите время — встанете в очередь, и освободившийся слот достанется вам:",
+        "waitlist_joined": "🕒 Вы в очереди на {date} {time}, место в очереди: {position}.",
+        "waitlist_granted_prompt": (
+            "🎉 Освободилось место, которого вы ждали: {machine_type} машина №{machine_num}, <b>{date}</b> "
+            "(время: {time_range}).\n"
+            "Подтвердите до {deadline}, иначе слот перейдет следующему в очереди."
+        ),
         "no_slots_available": "На выбранную дату нет доступных временных слотов.",
         "no_available_slots_alert": "Нет доступных машин на это время.",
 
@@ -42,6 +54,9 @@ RUtexts = {
 
         # {date} - дата, {time} - время, {datetime} - дата + время, {m_type} - тип, {m_num} - номер
         "slot_freed_notification": "🔔 <b>Освободилось место!</b>\n\n📅 Дата: {date}\n⏰ Время: {time}\n🧺 {m_type} №{m_num}\n\nУспейте записаться!",
+        # Сводка о нескольких освободившихся слотах: {slots} - строки slots_freed_digest_line
+        "slots_freed_digest": "🔔 <b>Освободились места!</b>\n\n{slots}\n\nУспейте записаться!",
+        "slots_freed_digest_line": "📅 {date} ⏰ {time} — {m_type} №{m_num}",
 
         "machine_type_wash": "Стиральная",
         "machine_type_dry": "Сушильная",
@@ -0,0 +1,129 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+# Маркер "ключа нет в кэше" — отличает промах от закэшированного None
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Ограниченный по размеру LRU-кэш с временем жизни записей.
+    Считает попадания и промахи, чтобы было видно, сколько запросов к БД он экономит.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return MISSING
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key: Hashable, value: Any):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable, Any], bool]):
+        for key in [k for k, (_, v) in self._data.items() if predicate(k, v)]:
+            del self._data[key]
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+class _LeaderCancelled(Exception):
+    """Вызов, который выполнял общий запрос, отменили — ждущим придется выполнить свой."""
+
+
+class SingleFlight:
+    """
+    Склейка одновременных одинаковых запросов: первый вызов с ключом выполняет
+    функцию, остальные, пришедшие пока он идет, ждут его результат (или ошибку).
+    Запрос выполняется в сессии первого вызова, ждущие сессию не трогают. Если
+    первый вызов отменили, ждущие выполняют запрос сами.
+
+    forget() отвязывает ключи от идущих запросов: после записи новые вызовы
+    не присоединятся к чтению, начатому до нее.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.executed = 0
+        self.shared = 0
+        # Сэкономленные запросы по виду чтения (первый элемент ключа-кортежа)
+        self.shared_by_kind: Dict[Hashable, int] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        while (future := self._inflight.get(key)) is not None:
+            try:
+                # shield: отмена ждущего не отменяет общий результат для остальных
+                result = await asyncio.shield(future)
+                self.shared += 1
+                kind = key[0] if isinstance(key, tuple) else key
+                self.shared_by_kind[kind] = self.shared_by_kind.get(kind, 0) + 1
+                return result
+            except _LeaderCancelled:
+                # Запрос перехватит первый проснувшийся, остальные снова подождут
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.executed += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            future.exception()  # ждущих может не быть — не пишем "exception was never retrieved"
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def forget(self, predicate: Callable[[Hashable], bool]):
+        for key in [k for k in self._inflight if predicate(k)]:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "executed": self.executed,
+            "shared": self.shared,
+            "saved_rate": round(self.shared / self.calls, 3) if self.calls else 0.0,
+            "shared_by_kind": dict(self.shared_by_kind),
+            "in_flight": len(self._inflight),
+        }
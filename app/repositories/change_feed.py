@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.db.base import DATABASE_URL
+from app.db.replica import replica_router
+from app.repositories.laundry_repo import invalidate_resident_cache, invalidate_month_workload
+from app.repositories.occupancy import occupancy
+
+# Каналы NOTIFY из триггеров миграции 0013
+BOOKING_CHANNEL = "booking_changed"
+RESIDENTS_CHANNEL = "residents_changed"
+
+
+class ChangeFeed:
+    """
+    Сбрасывает кэши процесса по изменениям, сделанным другими экземплярами бота, импортом
+    жильцов или вручную в БД. Триггеры (миграция 0013) присылают день измененной брони —
+    выгружаются день движка занятости и загруженность его месяца, и tg_id измененного
+    жильца — забывается закэшированный жилец (в том числе "не зарегистрирован").
+    Свои изменения процесс тоже получает: это одна лишняя перезагрузка дня.
+
+    Перечитывание после сброса идет в основную БД: реплика могла еще не получить изменение.
+    """
+
+    def __init__(self):
+        self.connected = False
+        self.received = 0
+        self.resets = 0
+
+    def _on_booking(self, payload: str):
+        if not payload:
+            self.reset()
+            return
+        day = date.fromisoformat(payload)
+        replica_router.note_write()
+        occupancy.invalidate_day(day)
+        invalidate_month_workload(datetime(day.year, day.month, day.day))
+
+    def _on_resident(self, payload: str):
+        if not payload:
+            self.reset()
+            return
+        tg_id = int(payload)
+        replica_router.note_write()
+        invalidate_resident_cache(tg_id=tg_id)
+
+    def _notify(self, _connection, _pid, channel: str, payload: str):
+        self.received += 1
+        try:
+            if channel == BOOKING_CHANNEL:
+                self._on_booking(payload)
+            else:
+                self._on_resident(payload)
+        except ValueError:
+            logging.error(f"Bad {channel} payload: {payload!r}")
+
+    def reset(self):
+        """Сбрасывает все кэши: уведомления могли быть пропущены."""
+        self.resets += 1
+        replica_router.note_write()
+        occupancy.invalidate_all()
+        invalidate_month_workload()
+        invalidate_resident_cache()
+
+    async def listen(self, url: Optional[str] = None, check_interval: float = 60, reconnect_delay: float = 5):
+        """
+        Держит отдельное соединение с LISTEN на оба канала. После (пере)подключения кэши
+        сбрасываются целиком — изменения, сделанные без связи, не теряются. Соединение
+        проверяется раз в check_interval. Нужно прямое подключение или Session Pooler:
+        transaction pooler не доставляет NOTIFY.
+        """
+        engine = create_async_engine(url or DATABASE_URL, poolclass=NullPool)
+        try:
+            while True:
+                try:
+                    async with engine.connect() as conn:
+                        raw = (await conn.get_raw_connection()).driver_connection
+                        await raw.add_listener(BOOKING_CHANNEL, self._notify)
+                        await raw.add_listener(RESIDENTS_CHANNEL, self._notify)
+                        self.reset()
+                        self.connected = True
+                        logging.info(f"Listening for {BOOKING_CHANNEL}, {RESIDENTS_CHANNEL}")
+                        while True:
+                            await asyncio.sleep(check_interval)
+                            await conn.execute(text("SELECT 1"))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logging.error(f"Cache change feed failed, reconnecting in {reconnect_delay}s: {e}")
+                    await asyncio.sleep(reconnect_delay)
+                finally:
+                    self.connected = False
+        finally:
+            await engine.dispose()
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.connected,
+            "received": self.received,
+            "resets": self.resets,
+        }
+
+
+change_feed = ChangeFeed()
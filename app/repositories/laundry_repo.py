@@ -1,68 +1,127 @@
 import asyncio
 from datetime import datetime, timedelta, time
-from typing import List, Optional
+from typing import Callable, List, Optional
 
-from sqlalchemy import select, update, delete, and_, func, extract, Integer, or_
-from sqlalchemy.orm import joinedload
+from sqlalchemy import select, insert, update, delete, and_, func, extract, Integer, or_, literal_column
+from sqlalchemy import values, column, cast, exists, literal, union_all, Date, DateTime, String, Time
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, aliased
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.base import async_session
+from app.config.config import BOOKING_ARCHIVE_AFTER_DAYS, BOOKING_ARCHIVE_BATCH
+from app.db.base import session_scope
+from app.db.replica import read_scope
+from app.repositories.cache import TTLCache, SingleFlight, MISSING
+from app.repositories.occupancy import occupancy, SLOT_DURATION
+from app.repositories.machines import machine_registry
+from app.repositories.outbox_repo import add_to_outbox
 from app.db.models.residents import Resident as User
 from app.db.models.machine import Machine as Machine
-from app.db.models.booking import Booking as Booking
+from app.db.models.booking import Booking as Booking, BookingStatus, BOOKING_TRANSITIONS, live_booking
+from app.db.models.booking_archive import BookingArchive
 from app.db.models.notification import Notification
+from app.db.models.subscription import SlotSubscription
+from app.db.models.waitlist import WaitlistEntry
+
+# Одновременные одинаковые чтения (волна нажатий после рассылки о свободном слоте)
+# склеиваются в один запрос к БД. Ключ — (что читаем, аргументы); read_flight.stats()
+# показывает, сколько запросов сэкономлено.
+read_flight = SingleFlight()
 
 # ==========================================
 # РАБОТА С ПОЛЬЗОВАТЕЛЯМИ (АУТЕНТИФИКАЦИЯ)
 # ==========================================
 
-async def get_user_by_tg_id(tg_id: int):
-    async with async_session() as session:
+# Кэш tg_id -> Resident (или None для незарегистрированных).
+# Жильцы меняются редко, поэтому почти каждое нажатие кнопки обходится без запроса к БД.
+# Изменения из других процессов сбрасывает change_feed (NOTIFY residents_changed).
+RESIDENT_CACHE_TTL = 600
+RESIDENT_CACHE_SIZE = 10_000
+resident_cache = TTLCache(maxsize=RESIDENT_CACHE_SIZE, ttl=RESIDENT_CACHE_TTL)
+# Номер сброса: чтение, начатое до сброса, не кладет свой результат в кэш
+_resident_generation = 0
+
+
+def invalidate_resident_cache(tg_id: Optional[int] = None, resident_id: Optional[int] = None):
+    """Сбрасывает закэшированного жильца по tg_id и/или по id жильца; без аргументов — всех."""
+    global _resident_generation
+    _resident_generation += 1
+    if tg_id is None and resident_id is None:
+        resident_cache.clear()
+        read_flight.forget(lambda key: key[0] == "resident")
+    if tg_id is not None:
+        resident_cache.invalidate(tg_id)
+        read_flight.forget(lambda key: key == ("resident", tg_id))
+    if resident_id is not None:
+        resident_cache.invalidate_where(lambda _, user: user is not None and user.id == resident_id)
+        read_flight.forget(lambda key: key[0] == "resident")
+
+
+async def _load_resident(tg_id: int, session: Optional[AsyncSession] = None):
+    async with read_scope(session) as session:
         query = select(User).where(User.tg_id == tg_id)
         result = await session.execute(query)
-        return result.scalar_one_or_none()
-
-async def find_resident_by_fio(fio_parts: list[str]):
+        user = result.scalar_one_or_none()
+        if user is not None:
+            # В кэше лежит отсоединенный объект, чтобы его не трогали чужие сессии
+            session.expunge(user)
+        return user
+
+
+async def get_user_by_tg_id(tg_id: int, session: Optional[AsyncSession] = None, use_cache: bool = True):
+    generation = _resident_generation
+    if not use_cache:
+        user = await _load_resident(tg_id, session)
+    else:
+        cached = resident_cache.get(tg_id)
+        if cached is not MISSING:
+            return cached
+        # Двойное нажатие до первого ответа — один запрос на оба апдейта
+        user = await read_flight.do(("resident", tg_id), lambda: _load_resident(tg_id, session))
+
+    if generation == _resident_generation:
+        resident_cache.set(tg_id, user)
+    return user
+
+async def find_resident_by_fio(fio_parts: list[str], session: Optional[AsyncSession] = None):
+    """
+    Ищет жильца по ФИО в любом порядке слов, кириллицей или латиницей: введенный текст
+    сводится к тому же ключу resident_name_key, что хранится в search_key (миграция 0011).
+    Отчество можно не вводить — тогда сравнение идет с search_key_short, но полное
+    совпадение важнее ("Иванов Иван" без отчества найдется рядом с "Иванов Иван Петрович").
+    Один запрос по индексу; возвращает жильца, только если он определен однозначно.
+    """
     if len(fio_parts) < 2:
         return None
 
-    # Гибкое присваивание
-    last_name = fio_parts[0]
-    first_name = fio_parts[1]
-    patronymic = ' '.join(fio_parts[2:]) if len(fio_parts) > 2 else ''  # Объединяем лишние слова или оставляем пустым
-
-    async with async_session() as session:
-        # Используем ilike для case-insensitive (полезно для транслитерации)
-        conditions = [
-            User.last_name.ilike(last_name),
-            User.first_name.ilike(first_name)
-        ]
-        if patronymic:
-            conditions.append(User.patronymic.ilike(patronymic))
-        else:
-            # Если patronymic не указан, ищем где оно пустое или NULL
-            conditions.append(or_(User.patronymic == '', User.patronymic.is_(None)))
-
-        query = select(User).where(and_(*conditions))
-        result = await session.execute(query)
-        found_users = result.scalars().all()
-        
-        if len(found_users) == 1:
-            return found_users[0]
+    key = func.resident_name_key(' '.join(fio_parts))
+    exact = User.search_key == key
+    async with read_scope(session) as session:
+        query = (
+            select(User, exact.label("exact"))
+            .where(or_(exact, User.search_key_short == key))
+            .order_by(exact.desc())
+            .limit(2)
+        )
+        found = (await session.execute(query)).all()
+
+        if len(found) == 1 or (len(found) == 2 and found[0].exact and not found[1].exact):
+            return found[0][0]
         return None
 
 
-async def find_resident_by_id_card(id_card: int):
-    async with async_session() as session:
+async def find_resident_by_id_card(id_card: int, session: Optional[AsyncSession] = None):
+    async with read_scope(session) as session:
         query = select(User).where(User.idcards == id_card)
         result = await session.execute(query)
         return result.scalar_one_or_none()
 
-async def activate_resident_user(resident_id: int, tg_id: int, language: str = 'RU'):
+async def activate_resident_user(resident_id: int, tg_id: int, language: str = 'RU', session: Optional[AsyncSession] = None):
     """
     Привязывает tg_id к жильцу и сохраняет выбранный язык.
     """
-    async with async_session() as session:
+    async with session_scope(session) as session:
         # Обновляем и tg_id, и language
         stmt = update(User).where(User.id == resident_id).values(
             tg_id=tg_id, 
@@ -70,71 +129,111 @@ async def activate_resident_user(resident_id: int, tg_id: int, language: str = '
         )
         await session.execute(stmt)
         await session.commit()
-        
-        result = await session.execute(select(User).where(User.id == resident_id))
+        invalidate_resident_cache(tg_id=tg_id, resident_id=resident_id)
+
+        result = await session.execute(
+            select(User).where(User.id == resident_id).execution_options(populate_existing=True)
+        )
         return result.scalar_one()
     
 # 👇 Добавьте эту функцию, она пригодится для кнопки "Сменить язык" в будущем
-async def update_user_language(tg_id: int, new_language: str):
+async def update_user_language(tg_id: int, new_language: str, session: Optional[AsyncSession] = None):
     """
     Обновляет язык для уже зарегистрированного пользователя.
     """
-    async with async_session() as session:
+    async with session_scope(session) as session:
         stmt = update(User).where(User.tg_id == tg_id).values(language=new_language)
         await session.execute(stmt)
         await session.commit()
+        invalidate_resident_cache(tg_id=tg_id)
 
 # ==========================================
 # РАБОТА С МАШИНАМИ И БРОНЯМИ
 # ==========================================
 
-async def get_all_machines() -> List[Machine]:
-    async with async_session() as session:
-        result = await session.execute(select(Machine).order_by(Machine.number_machine))
-        return result.scalars().all()
+async def get_all_machines(session: Optional[AsyncSession] = None) -> List[Machine]:
+    """Все машины по номеру — из каталога в памяти (machine_registry)."""
+    await machine_registry.ensure()
+    return machine_registry.all()
 
-async def is_slot_free(machine_id: int, date: datetime, duration_minutes: int = 90) -> bool:
-    end_time = date + timedelta(minutes=duration_minutes)
-    async with async_session() as session:
+def _overlaps(start_time: datetime, end_time: datetime):
+    """Условие "бронь пересекается с [start_time, end_time)" — period && tsrange, идет по GiST-индексу."""
+    return Booking.period.overlaps(func.tsrange(start_time, end_time, literal_column("'[)'")))
+
+async def get_taken_slots(slots: List[tuple[int, datetime, datetime]], session: Optional[AsyncSession] = None) -> set[tuple[int, datetime]]:
+    """
+    Из слотов (machine_id, start_time, end_time) возвращает {(machine_id, start_time)} тех,
+    что снова заняты активной бронью. Одним запросом на весь список.
+    """
+    if not slots:
+        return set()
+    async with read_scope(session) as session:
         result = await session.execute(
-            select(Booking.id).where(
-                Booking.inidmachine == machine_id,
-                Booking.status != 'cancelled',
-                or_(
-                    and_(Booking.start_time <= date, Booking.end_time > date),
-                    and_(Booking.start_time < end_time, Booking.end_time >= end_time),
-                    and_(Booking.start_time >= date, Booking.end_time <= end_time)
-                )
-            ).limit(1)
+            select(Booking.inidmachine, Booking.start_time, Booking.end_time).where(
+                live_booking(),
+                or_(*(
+                    and_(Booking.inidmachine == machine_id, _overlaps(start_time, end_time))
+                    for machine_id, start_time, end_time in slots
+                ))
+            )
         )
-        return result.scalar_one_or_none() is None
+        booked = result.all()
 
-async def create_booking(user_id: int, machine_id: int, start_time: datetime, duration_minutes: int = 90) -> dict:
+    return {
+        (machine_id, start_time)
+        for machine_id, start_time, end_time in slots
+        if any(b.inidmachine == machine_id and b.start_time < end_time and b.end_time > start_time for b in booked)
+    }
+
+def _is_overlap_violation(error: IntegrityError) -> bool:
+    """Нарушено ли ограничение booking_no_overlap (SQLSTATE 23P01 exclusion_violation)."""
+    orig = getattr(error, "orig", None)
+    for exc in (orig, getattr(orig, "__cause__", None)):
+        if getattr(exc, "sqlstate", None) == "23P01":
+            return True
+    return "booking_no_overlap" in str(error)
+
+
+async def create_booking(user_id: int, machine_id: int, start_time: datetime, duration_minutes: int = 90, session: Optional[AsyncSession] = None) -> dict:
+    """
+    Создает бронь одним запросом: INSERT ... RETURNING в CTE + строка машины в том же SELECT.
+    Пересечение с чужой бронью отсекает ограничение booking_no_overlap в БД, поэтому
+    из нескольких одновременных попыток занять слот проходит ровно одна.
+    При занятом слоте бросает ValueError.
+    """
     end_time = start_time + timedelta(minutes=duration_minutes)
-    
-    # Проверка внутри транзакции (лучше, но пока оставим логику с is_slot_free)
-    if not await is_slot_free(machine_id, start_time, duration_minutes):
-        raise ValueError("Слот уже занят")
 
-    async with async_session() as session:
-        booking = Booking(
+    new_booking = (
+        insert(Booking)
+        .values(
             inidresidents=user_id,
             inidmachine=machine_id,
             start_time=start_time,
             end_time=end_time,
-            status="Ожидание"
+            status=BookingStatus.PENDING
         )
-        session.add(booking)
-        await session.commit()
-        await session.refresh(booking)
-        
-        machine_result = await session.execute(select(Machine).where(Machine.id == machine_id))
-        machine = machine_result.scalar_one()
-        
+        .returning(*Booking.__table__.c)
+        .cte("new_booking")
+    )
+    booking_row = aliased(Booking, new_booking)
+    query = select(booking_row, Machine).join(Machine, Machine.id == booking_row.inidmachine)
+
+    async with session_scope(session) as session:
+        try:
+            booking, machine = (await session.execute(query)).one()
+            await session.commit()
+        except IntegrityError as e:
+            await session.rollback()
+            if _is_overlap_violation(e):
+                raise ValueError("Слот уже занят") from e
+            raise
+
+        invalidate_month_workload(start_time)
+        occupancy.mark(machine.id, start_time, end_time)
         return {'booking': booking, 'machine': machine}
 
-async def get_user_bookings(user_id: int) -> List[Booking]:
-    async with async_session() as session:
+async def get_user_bookings(user_id: int, session: Optional[AsyncSession] = None) -> List[Booking]:
+    async with read_scope(session) as session:
         now = datetime.now()  # Получаем текущее время
         
         query = (
@@ -142,7 +241,7 @@ async def get_user_bookings(user_id: int) -> List[Booking]:
             .options(joinedload(Booking.machine))
             .where(
                 Booking.inidresidents == user_id,
-                Booking.status != 'Отменено',
+                live_booking(),
                 Booking.end_time > now  # ФИЛЬТР: только те, что еще не закончились
             )
             .order_by(Booking.start_time.asc()) # Сортируем от ближайших к более поздним
@@ -151,188 +250,197 @@ async def get_user_bookings(user_id: int) -> List[Booking]:
         result = await session.execute(query)
         return result.scalars().all()
 
-async def cancel_booking(booking_id: int, user_tg_id: int = None) -> bool:
+async def cancel_booking(booking_id: int, user_tg_id: int = None, session: Optional[AsyncSession] = None, messages: Optional[Callable] = None):
     """
-    Если user_tg_id передан — проверяем, принадлежит ли бронь этому юзеру.
-    Если user_tg_id is None — считаем, что это системная отмена (планировщик), и удаляем без проверок владельца.
+    Если user_tg_id передан — отменяется только бронь этого жильца.
+    Если user_tg_id is None — считаем, что это системная отмена (планировщик), и отменяем без проверок владельца.
+    Освободившийся будущий слот в той же транзакции отдается первому в очереди;
+    messages(handoff) -> сообщения для outbox, пишутся в этой же транзакции.
+    Возвращает None, если отменить не удалось (брони нет, она чужая или уже отменена),
+    иначе {"handoff": выданная бронь или None}.
     """
-    async with async_session() as session:
-        # 1. Находим бронь
-        stmt_get = select(Booking).where(Booking.id == booking_id)
-        result = await session.execute(stmt_get)
-        booking = result.scalar_one_or_none()
-        
-        if not booking:
-            return False
-
-        # 2. Если это ручная отмена пользователем — проверяем владельца
+    async with session_scope(session) as session:
+        conditions = [Booking.id == booking_id, live_booking()]
+        # 1. Если это ручная отмена пользователем — только своя бронь
         if user_tg_id is not None:
-            user_query = select(User).where(User.tg_id == user_tg_id)
-            user_result = await session.execute(user_query)
-            user = user_result.scalar_one_or_none()
-            
-            if not user or booking.inidresidents != user.id:
-                return False # Пытается отменить чужую запись
-
-        # 3. Меняем статус (или удаляем)
-        # Если вы хотите оставлять историю со статусом:
-        booking.status = 'Отменено' # Убедитесь, что это совпадает с ENUM в базе или логикой
-        
-        await session.commit()
-        return True
+            user = await get_user_by_tg_id(user_tg_id, session=session)
+            if not user:
+                return None
+            conditions.append(Booking.inidresidents == user.id)
+
+        # 2. Меняем статус одним условным UPDATE (история броней сохраняется): из
+        # параллельных отмен одной брони строку получит только одна, и только она
+        # отдаст слот очереди и поправит занятость
+        cancelled = (await session.execute(
+            update(Booking)
+            .where(*conditions)
+            .values(status=BookingStatus.CANCELLED)
+            .returning(Booking.inidmachine, Booking.start_time, Booking.end_time)
+            # Объекты сессии не синхронизируем: иначе ORM дописывает id в RETURNING
+            # и строка изредка читается со сдвигом колонок
+            .execution_options(synchronize_session=False)
+        )).first()
+        if cancelled is None:
+            return None
+
+        handoff = await _hand_off_slot(session, cancelled.inidmachine, cancelled.start_time, cancelled.end_time)
+        if handoff is not None and messages is not None:
+            await add_to_outbox(session, messages(handoff))
 
-async def get_all_users_with_tg() -> List[tuple[int, str]]:
-    """
-    Возвращает список кортежей (tg_id, language) всех пользователей.
-    """
-    async with async_session() as session:
-        # Запрашиваем и ID, и язык
-        query = select(User.tg_id, User.language).where(User.tg_id.is_not(None))
-        result = await session.execute(query)
-        # Возвращаем список кортежей, например: [(123, 'RU'), (456, 'CN')]
-        return result.all()
+        await session.commit()
+        invalidate_month_workload(cancelled.start_time)
+        occupancy.unmark(cancelled.inidmachine, cancelled.start_time, cancelled.end_time)
+        if handoff is not None:
+            occupancy.mark(handoff.inidmachine, handoff.start_time, handoff.end_time)
+        return {"handoff": handoff}
 
 # ==========================================
 # ОПТИМИЗИРОВАННАЯ ЛОГИКА КАЛЕНДАРЯ
 # ==========================================
 
-async def get_month_workload(year: int, month: int, machine_type: Optional[str] = None) -> dict:
-    """Один быстрый запрос для получения загруженности"""
-    async with async_session() as session:
+# Кэш загруженности месяца: (year, month, machine_type) -> {day: count}.
+# Сбрасывается при создании/отмене брони и смене статуса, изменения других процессов —
+# через change_feed (NOTIFY booking_changed). TTL страхует от пропущенных уведомлений.
+WORKLOAD_CACHE_TTL = 300
+workload_cache = TTLCache(maxsize=256, ttl=WORKLOAD_CACHE_TTL)
+# Версия данных по ключу кэша: меняется при каждой загрузке из БД
+_workload_versions: dict[tuple, int] = {}
+_workload_version_counter = 0
+# Номер сброса по месяцу (None — сброс всех месяцев): чтение, начатое до сброса,
+# не кладет свой результат в кэш
+_workload_generations: dict[Optional[tuple], int] = {}
+
+
+def _workload_generation(month_key: tuple) -> tuple[int, int]:
+    return _workload_generations.get(None, 0), _workload_generations.get(month_key, 0)
+
+
+def invalidate_month_workload(start_time: Optional[datetime] = None):
+    """Сбрасывает загруженность месяца, в который попадает бронь (для всех типов машин); без start_time — всех месяцев."""
+    month_key = (start_time.year, start_time.month) if start_time is not None else None
+    _workload_generations[month_key] = _workload_generations.get(month_key, 0) + 1
+    if month_key is None:
+        workload_cache.clear()
+        read_flight.forget(lambda key: key[0] == "workload")
+        return
+    workload_cache.invalidate_where(lambda key, _: key[:2] == month_key)
+    read_flight.forget(lambda key: key[0] == "workload" and key[1:3] == month_key)
+
+
+def get_workload_version(year: int, month: int, machine_type: Optional[str] = None) -> int:
+    """Версия закэшированной загруженности; 0 — данных в кэше еще не было."""
+    return _workload_versions.get((year, month, machine_type), 0)
+
+
+async def get_month_workload(year: int, month: int, machine_type: Optional[str] = None, session: Optional[AsyncSession] = None) -> dict:
+    """Загруженность по дням месяца. В обычном случае отдается из кэша без запроса к БД."""
+    global _workload_version_counter
+
+    cache_key = (year, month, machine_type)
+    cached = workload_cache.get(cache_key)
+    if cached is not MISSING:
+        return cached
+
+    # После сброса кэша календарь открывают многие сразу — запрос к БД идет один
+    generation = _workload_generation((year, month))
+    workload = await read_flight.do(
+        ("workload",) + cache_key,
+        lambda: _load_month_workload(year, month, machine_type, session)
+    )
+    if _workload_generation((year, month)) != generation:
+        return workload  # месяц изменился, пока шел запрос — такой результат не кэшируем
+
+    workload_cache.set(cache_key, workload)
+    _workload_version_counter += 1
+    _workload_versions[cache_key] = _workload_version_counter
+    return workload
+
+
+def archive_horizon() -> datetime:
+    """
+    Брони, начавшиеся не раньше этого момента, гарантированно еще в рабочей таблице:
+    в архив уходят только закончившиеся раньше now - BOOKING_ARCHIVE_AFTER_DAYS.
+    """
+    return datetime.now() - timedelta(days=BOOKING_ARCHIVE_AFTER_DAYS)
+
+
+def _booking_tables(since: datetime) -> tuple:
+    """Таблицы, в которых могут лежать брони, начавшиеся с since: архив — только для прошлого."""
+    return (Booking, BookingArchive) if since < archive_horizon() else (Booking,)
+
+
+async def _load_month_workload(year: int, month: int, machine_type: Optional[str], session: Optional[AsyncSession]) -> dict:
+    # Полуоткрытый диапазон по start_time вместо extract(): запрос идет по индексу
+    month_start = datetime(year, month, 1)
+    next_month_start = datetime(year + month // 12, month % 12 + 1, 1)
+
+    machine_ids = None
+    if machine_type:
+        # Машины нужного типа берем из каталога в памяти вместо JOIN с machines
+        await machine_registry.ensure()
+        machine_ids = [m.id for m in machine_registry.all() if m.type_machine == machine_type]
+
+    # Текущий и будущие месяцы читаются только из рабочей таблицы, прошлые — еще и из архива
+    parts = []
+    for model in _booking_tables(month_start):
+        part = select(model.start_time).where(
+            model.start_time >= month_start,
+            model.start_time < next_month_start,
+            live_booking(model)
+        )
+        if machine_ids is not None:
+            part = part.where(model.inidmachine.in_(machine_ids))
+        parts.append(part)
+    bookings = (union_all(*parts) if len(parts) > 1 else parts[0]).subquery()
+
+    async with read_scope(session) as session:
         query = (
             select(
-                extract('day', Booking.start_time).cast(Integer).label('day'),
-                func.count(Booking.id).label('count')
-            )
-            .join(Machine, Booking.inidmachine == Machine.id)
-            .where(
-                extract('year', Booking.start_time) == year,
-                extract('month', Booking.start_time) == month,
-                Booking.status != 'cancelled'
+                extract('day', bookings.c.start_time).cast(Integer).label('day'),
+                func.count().label('count')
             )
+            .group_by('day')
         )
-        if machine_type:
-            query = query.where(Machine.type_machine == machine_type)
-            
-        query = query.group_by('day')
         result = await session.execute(query)
         return {row.day: row.count for row in result.all()}
 
-async def get_total_daily_capacity_by_type(machine_type: Optional[str] = None) -> int:
+async def get_total_daily_capacity_by_type(machine_type: Optional[str] = None, session: Optional[AsyncSession] = None) -> int:
     """
-    Возвращает ОБЩЕЕ КОЛИЧЕСТВО СЛОТОВ в день (Кол-во машин * Кол-во слотов).
+    Возвращает ОБЩЕЕ КОЛИЧЕСТВО СЛОТОВ в день (Кол-во работающих машин * Кол-во слотов
+    рабочего дня) — из каталога машин в памяти, без запроса к БД.
     """
-    async with async_session() as session:
-        conditions = [Machine.status == 'Работает']
-        if machine_type:
-            conditions.append(Machine.type_machine == machine_type)
-        
-        query = select(func.count(Machine.id)).where(and_(*conditions))
-        active_machines = (await session.execute(query)).scalar() or 0
-
-    # Считаем слоты: с 8:00 до 23:00 = 15 часов = 900 минут.
-    # 900 / 90 минут = 10 слотов на одну машину.
-    slots_per_machine = 10 
-    total_slots = active_machines * slots_per_machine
-    
-    # print(f"DEBUG: Type={machine_type}, Machines={active_machines}, Total Slots={total_slots}")
-    return total_slots
+    await machine_registry.ensure()
+    return machine_registry.daily_capacity(machine_type)
 
 # ==========================================
 # ОПТИМИЗИРОВАННЫЙ ПОИСК СЛОТОВ 
 # ==========================================
 
-async def get_available_machines(start_time: datetime, machine_type: str) -> List[Machine]:
-    """1 запрос вместо 10. Ищем занятые и исключаем их."""
-    duration_minutes = 90
-    end_time = start_time + timedelta(minutes=duration_minutes)
-
-    async with async_session() as session:
-        # 1. Находим ID машин, которые ЗАНЯТЫ в это время
-        busy_subquery = select(Booking.inidmachine).where(
-            Booking.status != 'cancelled',
-            or_(
-                and_(Booking.start_time <= start_time, Booking.end_time > start_time),
-                and_(Booking.start_time < end_time, Booking.end_time >= end_time),
-                and_(Booking.start_time >= start_time, Booking.end_time <= end_time)
-            )
-        )
-
-        # 2. Выбираем машины нужного типа, которых НЕТ в списке занятых
-        query = select(Machine).where(
-            Machine.status == 'Работает',
-            Machine.type_machine == machine_type,
-            Machine.id.not_in(busy_subquery)
-        )
-        
-        result = await session.execute(query)
-        return result.scalars().all()
+async def get_available_machines(start_time: datetime, machine_type: str, session: Optional[AsyncSession] = None) -> List[Machine]:
+    """Свободные работающие машины нужного типа на слот — из движка занятости, без запроса к БД."""
+    end_time = start_time + timedelta(minutes=SLOT_DURATION)
+    return list(await read_flight.do(
+        ("machines", start_time, machine_type),
+        lambda: occupancy.available_machines(start_time, end_time, machine_type)
+    ))
 
 async def get_available_slots(
     date: datetime,
     machine_type: Optional[str] = None,
-    work_start: int = 8,
-    work_end: int = 23,
-    slot_duration: int = 90
+    session: Optional[AsyncSession] = None
 ) -> List[datetime]:
     """
-    Оптимизированный поиск слотов:
-    1. Берем все брони на день одним запросом.
-    2. Считаем доступность в памяти.
+    Слоты дня (с WORK_START до WORK_END по SLOT_DURATION минут), в которых свободна
+    хотя бы одна машина нужного типа. Считается движком занятости за O(слотов):
+    день читается из БД только при первом обращении, дальше обновляется инкрементально.
     """
-    # Границы рабочего дня
-    start_of_day = date.replace(hour=work_start, minute=0, second=0, microsecond=0)
-    end_of_day = date.replace(hour=work_end, minute=0, second=0, microsecond=0)
-
-    async with async_session() as session:
-        # 1. Получаем кол-во активных машин этого типа
-        conditions = [Machine.status == 'Работает']
-        if machine_type:
-            conditions.append(Machine.type_machine == machine_type)
-        
-        # Получаем ID активных машин
-        machines_query = select(Machine.id).where(and_(*conditions))
-        active_machine_ids = (await session.execute(machines_query)).scalars().all()
-        
-        total_machines = len(active_machine_ids)
-        if total_machines == 0:
-            return []
-
-        # 2. Получаем ВСЕ брони на этот день для этих машин
-        bookings_query = select(Booking).where(
-            Booking.start_time >= start_of_day,
-            Booking.start_time < end_of_day, # Начало брони должно быть внутри рабочего дня
-            Booking.status != 'cancelled',
-            Booking.inidmachine.in_(active_machine_ids)
-        )
-        bookings_result = await session.execute(bookings_query)
-        bookings = bookings_result.scalars().all()
-
-    # 3. Алгоритм в памяти (быстрый)
-    available_slots = []
-    current_slot = start_of_day
-
-    while current_slot + timedelta(minutes=slot_duration) <= end_of_day:
-        slot_end = current_slot + timedelta(minutes=slot_duration)
-        
-        # Считаем, сколько машин занято в этот конкретный слот
-        busy_count = 0
-        for b in bookings:
-            # Пересечение интервалов
-            # (StartA < EndB) and (EndA > StartB)
-            if b.start_time < slot_end and b.end_time > current_slot:
-                busy_count += 1
-        
-        # Если занято меньше машин, чем всего есть -> слот свободен
-        if busy_count < total_machines:
-            available_slots.append(current_slot)
-            
-        current_slot += timedelta(minutes=slot_duration)
-
-    return available_slots
+    return list(await read_flight.do(
+        ("slots", date.date(), machine_type),
+        lambda: occupancy.available_slots(date.date(), machine_type)
+    ))
 
-async def create_notification(resident_id: int, description: str, booking_id: Optional[int] = None):
-    async with async_session() as session:
+async def create_notification(resident_id: int, description: str, booking_id: Optional[int] = None, session: Optional[AsyncSession] = None):
+    async with session_scope(session) as session:
         notification = Notification(
             id_residents=resident_id,
             create_date=datetime.now(),
@@ -344,61 +452,361 @@ async def create_notification(resident_id: int, description: str, booking_id: Op
         return notification
     
 
-async def get_booking_by_id(booking_id: int) -> Optional[Booking]:
-    """Получает бронь по ID с подгрузкой машины (для текста уведомления)."""
-    async with async_session() as session:
+# ==========================================
+# ПОДПИСКИ НА ОСВОБОДИВШИЕСЯ СЛОТЫ
+# ==========================================
+
+async def add_slot_subscription(resident_id: int, day, time_from, time_to, machine_type: Optional[str], session: Optional[AsyncSession] = None) -> bool:
+    """Подписывает жильца на день/интервал/тип машины. Повторная такая же подписка не создается."""
+    async with session_scope(session) as session:
+        query = (
+            pg_insert(SlotSubscription)
+            .values(
+                inidresidents=resident_id,
+                day=day,
+                time_from=time_from,
+                time_to=time_to,
+                machine_type=machine_type,
+                created_at=datetime.now()
+            )
+            .on_conflict_do_nothing(constraint="uq_slot_subscription")
+            .returning(SlotSubscription.id)
+        )
+        created = (await session.execute(query)).scalar_one_or_none() is not None
+        await session.commit()
+        return created
+
+
+async def get_slot_subscribers(slots: List[tuple[datetime, datetime, str]], session: Optional[AsyncSession] = None) -> dict:
+    """
+    Подписчики освободившихся слотов (start_time, end_time, machine_type) — одним запросом
+    по индексу (day, machine_type). Жильцы, у которых на это время уже есть активная
+    бронь, пропускаются. Возвращает {tg_id: (language, {индексы слотов})}.
+    """
+    if not slots:
+        return {}
+    freed = values(
+        column("idx", Integer), column("day", Date), column("start_at", DateTime),
+        column("end_at", DateTime), column("machine_type", String),
+        name="freed"
+    ).data([
+        (i, start_time.date(), start_time, end_time, machine_type)
+        for i, (start_time, end_time, machine_type) in enumerate(slots)
+    ])
+    already_booked = exists().where(
+        Booking.inidresidents == User.id,
+        live_booking(),
+        Booking.period.overlaps(func.tsrange(freed.c.start_at, freed.c.end_at, literal_column("'[)'")))
+    )
+    query = (
+        select(User.tg_id, User.language, freed.c.idx)
+        .select_from(freed)
+        .join(SlotSubscription, and_(
+            SlotSubscription.day == freed.c.day,
+            or_(SlotSubscription.machine_type.is_(None), SlotSubscription.machine_type == freed.c.machine_type),
+            SlotSubscription.time_from < cast(freed.c.end_at, Time),
+            SlotSubscription.time_to > cast(freed.c.start_at, Time)
+        ))
+        .join(User, User.id == SlotSubscription.inidresidents)
+        .where(User.tg_id.is_not(None), ~already_booked)
+    )
+    async with read_scope(session) as session:
+        rows = (await session.execute(query)).all()
+
+    subscribers: dict = {}
+    for tg_id, language, idx in rows:
+        subscribers.setdefault(tg_id, (language or "RU", set()))[1].add(idx)
+    return subscribers
+
+
+async def purge_expired_subscriptions(session: Optional[AsyncSession] = None) -> int:
+    """Удаляет подписки на прошедшие дни."""
+    async with session_scope(session) as session:
+        result = await session.execute(
+            delete(SlotSubscription).where(SlotSubscription.day < datetime.now().date())
+        )
+        await session.commit()
+        return result.rowcount
+
+
+async def get_booking_by_id(booking_id: int, session: Optional[AsyncSession] = None) -> Optional[Booking]:
+    """Получает бронь по ID с подгрузкой машины и жильца (для текста уведомления)."""
+    async with session_scope(session) as session:
         query = (
             select(Booking)
-            .options(joinedload(Booking.machine))
+            .options(joinedload(Booking.machine), joinedload(Booking.user))
             .where(Booking.id == booking_id)
         )
         result = await session.execute(query)
         return result.scalar_one_or_none()
-    
 
 
+async def get_pending_bookings(start_after: datetime, session: Optional[AsyncSession] = None) -> List[Booking]:
+    """Неподтвержденные брони, которые начнутся позже start_after (для сверки задач планировщика)."""
+    async with session_scope(session) as session:
+        query = select(Booking).where(
+            Booking.start_time > start_after,
+            Booking.status == BookingStatus.PENDING
+        )
+        result = await session.execute(query)
+        return result.scalars().all()
+
+
+def _with_owner_and_machine(claimed, *extra):
+    """SELECT по CTE с UPDATE ... RETURNING: поля брони + язык/tg_id владельца + машина."""
+    return (
+        select(
+            claimed.c.id, claimed.c.start_time, claimed.c.end_time, claimed.c.inidmachine,
+            User.tg_id, User.language, Machine.type_machine, Machine.number_machine, *extra
+        )
+        .select_from(claimed)
+        .outerjoin(User, User.id == claimed.c.inidresidents)
+        .outerjoin(Machine, Machine.id == claimed.c.inidmachine)
+    )
+
+
+# ==========================================
+# ОЧЕРЕДЬ НА ЗАНЯТЫЕ СЛОТЫ
+# ==========================================
 
-async def get_bookings_to_remind(minutes_before: int = 40):
-    """Ищет записи, которые начнутся через minutes_before, и статус еще не 'wait_confirm'/'confirmed'"""
-    # Логика: start_time в интервале [now + minutes_before, now + minutes_before + 2 min]
-    # Чтобы не спамить, берем узкое окно
+# Сколько есть у жильца из очереди, чтобы подтвердить доставшийся слот
+WAITLIST_CONFIRM_TIME = timedelta(minutes=15)
+
+
+async def join_waitlist(resident_id: int, machine_type: str, slot_start: datetime, duration_minutes: int = 90, session: Optional[AsyncSession] = None) -> int:
+    """Ставит жильца в очередь на слот (тип машины + время начала). Возвращает место в очереди."""
+    async with session_scope(session) as session:
+        await session.execute(
+            pg_insert(WaitlistEntry)
+            .values(
+                inidresidents=resident_id,
+                machine_type=machine_type,
+                slot_start=slot_start,
+                slot_end=slot_start + timedelta(minutes=duration_minutes),
+                created_at=datetime.now()
+            )
+            .on_conflict_do_nothing(constraint="uq_waitlist_entry")
+        )
+        mine = (
+            select(WaitlistEntry.id)
+            .where(
+                WaitlistEntry.inidresidents == resident_id,
+                WaitlistEntry.machine_type == machine_type,
+                WaitlistEntry.slot_start == slot_start
+            )
+            .scalar_subquery()
+        )
+        position = (await session.execute(
+            select(func.count()).where(
+                WaitlistEntry.machine_type == machine_type,
+                WaitlistEntry.slot_start == slot_start,
+                WaitlistEntry.id <= mine
+            )
+        )).scalar_one()
+        await session.commit()
+        return position
+
+
+async def _hand_off_slot(session: AsyncSession, machine_id: int, start_time: datetime, end_time: datetime):
+    """
+    В текущей транзакции отдает освободившийся слот первому в очереди: голова очереди
+    (индекс ix_waitlist_head, FOR UPDATE SKIP LOCKED) удаляется и в том же запросе
+    становится бронью с коротким сроком подтверждения. Жильцы, у которых на это время
+    уже есть бронь, пропускаются. Возвращает новую бронь с владельцем и машиной или None.
+    Обычная запись на этот слот ждет коммита и упирается в booking_no_overlap, так что
+    гонки с ней нет.
+    """
     now = datetime.now()
-    target_time = now + timedelta(minutes=minutes_before)
-    window = timedelta(minutes=2) 
-    
-    async with async_session() as session:
-        # Ищем записи, статус которых (active или None) и время подходит
-        query = select(Booking).options(joinedload(Booking.user)).where(
-            and_(
-                Booking.start_time >= target_time,
-                Booking.start_time <= target_time + window,
-                or_(Booking.status == 'Ожидание', Booking.status == None) 
+    if start_time <= now:
+        return None
+
+    machine_type = select(Machine.type_machine).where(Machine.id == machine_id).scalar_subquery()
+    already_booked = exists().where(
+        Booking.inidresidents == WaitlistEntry.inidresidents,
+        live_booking(),
+        _overlaps(start_time, end_time)
+    )
+    head = (
+        select(WaitlistEntry.id)
+        .where(
+            WaitlistEntry.machine_type == machine_type,
+            WaitlistEntry.slot_start == start_time,
+            ~already_booked
+        )
+        .order_by(WaitlistEntry.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .cte("head")
+    )
+    taken = (
+        delete(WaitlistEntry)
+        .where(WaitlistEntry.id == head.c.id)
+        .returning(WaitlistEntry.inidresidents)
+        .cte("taken")
+    )
+    granted = (
+        insert(Booking)
+        .from_select(
+            ["inidresidents", "inidmachine", "start_time", "end_time", "status", "reminded_at", "confirm_deadline"],
+            select(
+                taken.c.inidresidents, literal(machine_id), literal(start_time), literal(end_time),
+                literal(BookingStatus.PENDING.value), literal(now), literal(min(now + WAITLIST_CONFIRM_TIME, start_time))
             )
         )
-        result = await session.execute(query)
-        return result.scalars().all()
-    
-async def set_booking_status(booking_id: int, status: str):
-    async with async_session() as session:
-        query = update(Booking).where(Booking.id == booking_id).values(status=status)
-        await session.execute(query)
+        .returning(Booking.id, Booking.start_time, Booking.end_time, Booking.inidmachine, Booking.inidresidents, Booking.confirm_deadline)
+        .cte("granted")
+    )
+    try:
+        # Savepoint: если выдать слот не вышло, отмена исходной брони все равно проходит
+        async with session.begin_nested():
+            return (await session.execute(_with_owner_and_machine(granted, granted.c.confirm_deadline))).first()
+    except IntegrityError:
+        return None
+
+
+async def purge_expired_waitlist(session: Optional[AsyncSession] = None) -> int:
+    """Удаляет из очереди записи на уже начавшиеся слоты."""
+    async with session_scope(session) as session:
+        result = await session.execute(delete(WaitlistEntry).where(WaitlistEntry.slot_start < datetime.now()))
         await session.commit()
+        return result.rowcount
+
 
-async def get_expired_unconfirmed_bookings(minutes_before_deadline: int = 30):
-    """Ищет записи, которые вот-вот начнутся (30 мин), но статус 'wait_confirm' (не подтвердили)"""
+async def claim_due_reminders(remind_before: timedelta, session: Optional[AsyncSession] = None, messages: Optional[Callable] = None) -> list:
+    """
+    Забирает все брони, которым пора отправить запрос подтверждения, и помечает их
+    reminded_at — одним UPDATE ... RETURNING. Параллельный вызов эти же брони уже
+    не получит, поэтому напоминание уходит ровно один раз. messages(rows) -> запросы
+    подтверждения для outbox, пишутся в той же транзакции, что и reminded_at.
+    """
     now = datetime.now()
-    # Если время старта <= now + 30 min и статус все еще wait_confirm
-    # Берем записи, которые стартуют в ближайшие 30-31 минуту
-    target_time = now + timedelta(minutes=minutes_before_deadline)
-    window = timedelta(minutes=2)
-
-    async with async_session() as session:
-        query = select(Booking).options(joinedload(Booking.machine), joinedload(Booking.user)).where(
-            and_(
-                Booking.start_time <= target_time + window,
-                Booking.start_time >= target_time, 
-                Booking.status == 'Ожидание'
+    claimed = (
+        update(Booking)
+        .where(
+            Booking.start_time > now,
+            Booking.start_time <= now + remind_before,
+            Booking.reminded_at.is_(None),
+            Booking.status == BookingStatus.PENDING
+        )
+        .values(reminded_at=now)
+        .returning(Booking.id, Booking.start_time, Booking.end_time, Booking.inidmachine, Booking.inidresidents)
+        .cte("claimed")
+    )
+    async with session_scope(session) as session:
+        rows = (await session.execute(_with_owner_and_machine(claimed))).all()
+        if messages is not None:
+            await add_to_outbox(session, messages(rows))
+        await session.commit()
+        return rows
+
+
+async def claim_expired_bookings(deadline_before: timedelta, answer_time: timedelta, session: Optional[AsyncSession] = None, messages: Optional[Callable] = None) -> tuple[list, list]:
+    """
+    Отменяет одним UPDATE ... RETURNING все неподтвержденные брони, у которых прошел
+    дедлайн (deadline_before до начала), но не раньше чем через answer_time после запроса,
+    а также брони из очереди с истекшим confirm_deadline. В той же транзакции каждый
+    освободившийся слот отдается следующему в очереди. messages(rows, handoffs) ->
+    уведомления для outbox, пишутся в этой же транзакции.
+    Возвращает (отмененные брони, выданные из очереди брони) с владельцами и машинами.
+    """
+    now = datetime.now()
+    claimed = (
+        update(Booking)
+        .where(
+            Booking.start_time > now,
+            Booking.status == BookingStatus.PENDING,
+            or_(
+                and_(
+                    Booking.confirm_deadline.is_(None),
+                    Booking.start_time <= now + deadline_before,
+                    Booking.reminded_at <= now - answer_time
+                ),
+                Booking.confirm_deadline <= now
             )
         )
-        result = await session.execute(query)
-        return result.scalars().all()
\ No newline at end of file
+        .values(status=BookingStatus.CANCELLED)
+        .returning(Booking.id, Booking.start_time, Booking.end_time, Booking.inidmachine, Booking.inidresidents)
+        .cte("claimed")
+    )
+    async with session_scope(session) as session:
+        rows = (await session.execute(_with_owner_and_machine(claimed))).all()
+        handoffs = []
+        for row in rows:
+            granted = await _hand_off_slot(session, row.inidmachine, row.start_time, row.end_time)
+            if granted is not None:
+                handoffs.append(granted)
+        if messages is not None:
+            await add_to_outbox(session, messages(rows, handoffs))
+        await session.commit()
+
+    for month_start in {row.start_time.replace(day=1) for row in rows}:
+        invalidate_month_workload(month_start)
+    for row in rows:
+        occupancy.unmark(row.inidmachine, row.start_time, row.end_time)
+    for granted in handoffs:
+        occupancy.mark(granted.inidmachine, granted.start_time, granted.end_time)
+    return rows, handoffs
+
+
+async def set_booking_status(booking_id: int, status: BookingStatus, session: Optional[AsyncSession] = None) -> bool:
+    """
+    Переводит бронь в status, если переход разрешен BOOKING_TRANSITIONS (проверка в том же
+    UPDATE, поэтому подтверждение не воскресит бронь, отмененную параллельно).
+    Возвращает False, если брони нет или переход недопустим. Отмена — через cancel_booking.
+    """
+    async with session_scope(session) as session:
+        query = (
+            update(Booking)
+            .where(Booking.id == booking_id, Booking.status.in_(BOOKING_TRANSITIONS[status]))
+            .values(status=status)
+            .returning(Booking.start_time)
+        )
+        start_time = (await session.execute(query)).scalar_one_or_none()
+        await session.commit()
+
+    if start_time is None:
+        return False
+    invalidate_month_workload(start_time)
+    return True
+
+
+_ARCHIVE_COLUMNS = [
+    "id", "inidresidents", "inidmachine", "start_time", "end_time", "status", "reminded_at", "confirm_deadline"
+]
+
+
+async def archive_finished_bookings(
+    older_than: timedelta = timedelta(days=BOOKING_ARCHIVE_AFTER_DAYS),
+    batch_size: int = BOOKING_ARCHIVE_BATCH,
+    session: Optional[AsyncSession] = None
+) -> int:
+    """
+    Переносит брони, закончившиеся раньше now - older_than, в booking_archive: каждая
+    пачка — один DELETE ... RETURNING + INSERT отдельной короткой транзакцией, строки
+    берутся с SKIP LOCKED и не мешают записи. Возвращает число перенесенных броней.
+    """
+    cutoff = datetime.now() - older_than
+    total = 0
+    while True:
+        picked = (
+            select(Booking.id)
+            .where(Booking.end_time < cutoff)
+            .order_by(Booking.end_time)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        moved = (
+            delete(Booking)
+            .where(Booking.id.in_(picked.scalar_subquery()))
+            .returning(*(Booking.__table__.c[name] for name in _ARCHIVE_COLUMNS))
+            .cte("moved")
+        )
+        query = insert(BookingArchive).from_select(
+            _ARCHIVE_COLUMNS, select(*(moved.c[name] for name in _ARCHIVE_COLUMNS)), include_defaults=False
+        )
+        async with session_scope(session) as s:
+            count = (await s.execute(query)).rowcount
+            await s.commit()
+        total += count
+        if count < batch_size:
+            return total
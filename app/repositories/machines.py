@@ -0,0 +1,130 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.config.config import WORK_START, WORK_END, SLOT_DURATION
+from app.db.base import session_scope, DATABASE_URL
+from app.db.models.machine import Machine
+
+# Слотов в рабочем дне одной машины (8:00–23:00 по 90 минут -> 10)
+SLOTS_PER_DAY = (WORK_END - WORK_START) * 60 // SLOT_DURATION
+# Канал NOTIFY из триггера machines_changed (миграция 0009)
+MACHINES_CHANNEL = "machines_changed"
+WORKING_STATUS = 'Работает'
+
+
+class MachineRegistry:
+    """
+    Каталог машин в памяти процесса. Загружается один раз, дальше перечитывается
+    целиком (несколько десятков строк) по NOTIFY machines_changed, по refresh() или по
+    таймеру. Читатели получают отсоединенные от сессии объекты Machine и не ходят в БД.
+    Вместимость дня считается из числа работающих машин и рабочих часов.
+    """
+
+    def __init__(self):
+        self._machines: Optional[Dict[int, Machine]] = None
+        self._loading: Optional[asyncio.Task] = None
+        self.version = 0
+        self.reloads = 0
+
+    async def _load(self, session: Optional[AsyncSession] = None) -> Dict[int, Machine]:
+        async with session_scope(session) as session:
+            machines = (await session.execute(select(Machine).order_by(Machine.number_machine))).scalars().all()
+            for m in machines:
+                session.expunge(m)
+        return {m.id: m for m in machines}
+
+    async def refresh(self, session: Optional[AsyncSession] = None) -> bool:
+        """Перечитывает каталог. Возвращает True, если он изменился."""
+        fresh = await self._load(session)
+        old = self._machines
+        # Подменяем каталог целиком: читатели видят либо старый, либо новый
+        self._machines = fresh
+        self.reloads += 1
+        changed = old is None or {
+            m.id: (m.type_machine, m.number_machine, m.status) for m in old.values()
+        } != {
+            m.id: (m.type_machine, m.number_machine, m.status) for m in fresh.values()
+        }
+        if changed:
+            self.version += 1
+            if old is not None:
+                logging.info(f"Machine catalog changed, {len(self.working())} machines working")
+        return changed
+
+    async def ensure(self):
+        """Первая загрузка; параллельные вызовы ждут один запрос."""
+        if self._machines is not None:
+            return
+        if self._loading is None or self._loading.done():
+            self._loading = asyncio.ensure_future(self.refresh())
+        await asyncio.shield(self._loading)
+
+    # ---------- чтение (после ensure) ----------
+
+    def all(self) -> List[Machine]:
+        return sorted((self._machines or {}).values(), key=lambda m: m.number_machine)
+
+    def get(self, machine_id: int) -> Optional[Machine]:
+        return (self._machines or {}).get(machine_id)
+
+    def working(self, machine_type: Optional[str] = None) -> List[Machine]:
+        """Работающие машины (нужного типа), по номеру."""
+        return [
+            m for m in self.all()
+            if m.status == WORKING_STATUS and (not machine_type or m.type_machine == machine_type)
+        ]
+
+    def daily_capacity(self, machine_type: Optional[str] = None) -> int:
+        """Слотов в день: работающие машины * слоты рабочего дня."""
+        return len(self.working(machine_type)) * SLOTS_PER_DAY
+
+    # ---------- подписка на изменения ----------
+
+    async def listen(self, url: Optional[str] = None, check_interval: float = 60, reconnect_delay: float = 5):
+        """
+        Держит отдельное соединение с LISTEN machines_changed и перечитывает каталог на
+        каждое уведомление. После (пере)подключения каталог перечитывается сразу — изменения,
+        пропущенные без связи, не теряются. Соединение проверяется раз в check_interval.
+        Нужно прямое подключение или Session Pooler: transaction pooler не доставляет NOTIFY.
+        """
+        engine = create_async_engine(url or DATABASE_URL, poolclass=NullPool)
+        try:
+            while True:
+                try:
+                    async with engine.connect() as conn:
+                        raw = (await conn.get_raw_connection()).driver_connection
+                        changed = asyncio.Event()
+                        await raw.add_listener(MACHINES_CHANNEL, lambda *_: changed.set())
+                        await self.refresh()
+                        logging.info(f"Listening for {MACHINES_CHANNEL}")
+                        while True:
+                            try:
+                                await asyncio.wait_for(changed.wait(), timeout=check_interval)
+                            except asyncio.TimeoutError:
+                                await conn.execute(text("SELECT 1"))
+                                continue
+                            changed.clear()
+                            await self.refresh()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logging.error(f"Machine catalog listener failed, reconnecting in {reconnect_delay}s: {e}")
+                    await asyncio.sleep(reconnect_delay)
+        finally:
+            await engine.dispose()
+
+    def stats(self) -> dict:
+        return {
+            "machines": len(self._machines or {}),
+            "working": len(self.working()),
+            "version": self.version,
+            "reloads": self.reloads,
+        }
+
+
+machine_registry = MachineRegistry()
@@ -0,0 +1,218 @@
+import asyncio
+import logging
+from datetime import date as date_type, datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, func, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.config import WORK_START, SLOT_DURATION
+from app.db.base import session_scope
+from app.db.replica import read_scope
+from app.db.models.booking import Booking, live_booking
+from app.db.models.machine import Machine
+from app.repositories.machines import machine_registry, SLOTS_PER_DAY
+
+# Рабочий день прачечной (по умолчанию с 8:00 до 23:00, слоты по 90 минут -> 10 слотов на машину)
+_FREE_DAY = (0,) * SLOTS_PER_DAY
+
+
+def _day_start(day: date_type) -> datetime:
+    return datetime(day.year, day.month, day.day, WORK_START)
+
+
+def _slot_range(start_time: datetime, end_time: datetime) -> range:
+    """Индексы слотов дня, которые пересекаются с интервалом [start_time, end_time)."""
+    base = _day_start(start_time.date())
+    first = int((start_time - base).total_seconds() // 60 // SLOT_DURATION)
+    last = -int(-(end_time - base).total_seconds() // 60 // SLOT_DURATION)  # округление вверх
+    return range(max(first, 0), min(last, SLOTS_PER_DAY))
+
+
+class OccupancyEngine:
+    """
+    Занятость машин в памяти: для каждого загруженного дня и каждой машины —
+    массив счетчиков броней по слотам. День подгружается из БД один раз
+    при первом обращении, дальше обновляется инкрементально из create_booking
+    и cancel_booking. Списки свободных слотов и машин считаются за O(слотов)
+    без запроса к БД. Какие машины работают, берется из machine_registry, поэтому
+    счетчики ведутся по всем машинам с бронями: починенная машина сразу видна со своими
+    бронями, без перечитывания дней.
+
+    Изменения других процессов (и сделанные вручную в БД) приходят через change_feed:
+    затронутый день выгружается и при следующем обращении читается заново.
+    Пропущенное ловит reconcile(): он перечитывает загруженные дни и возвращает
+    число разошедшихся ячеек.
+    """
+
+    def __init__(self):
+        self._days: Dict[date_type, Dict[int, List[int]]] = {}
+        self._loading: Dict[date_type, asyncio.Task] = {}
+        # Дни, которые изменились, пока шла их загрузка из БД: такие дни перечитываются
+        self._dirty: set = set()
+        self._reconciling = False
+        self.last_drift = 0
+        self.total_drift = 0
+
+    # ---------- загрузка из БД ----------
+
+    async def _load_day(self, day: date_type, session: AsyncSession) -> Dict[int, List[int]]:
+        start_of_day = _day_start(day)
+        end_of_day = start_of_day + timedelta(minutes=SLOT_DURATION * SLOTS_PER_DAY)
+        # Условие "бронь активна" совпадает с ограничением booking_no_overlap
+        result = await session.execute(
+            select(Booking.inidmachine, Booking.start_time, Booking.end_time).where(
+                Booking.period.overlaps(func.tsrange(start_of_day, end_of_day, literal_column("'[)'"))),
+                live_booking(),
+            )
+        )
+        counters: Dict[int, List[int]] = {}
+        for machine_id, start_time, end_time in result.all():
+            slots = counters.setdefault(machine_id, [0] * SLOTS_PER_DAY)
+            for i in _slot_range(max(start_time, start_of_day), end_time):
+                slots[i] += 1
+        return counters
+
+    async def _ensure_day(self, day: date_type) -> Dict[int, List[int]]:
+        counters = self._days.get(day)
+        if counters is not None:
+            return counters
+
+        # Параллельные запросы одного дня ждут одну загрузку
+        task = self._loading.get(day)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_day(day))
+            self._loading[day] = task
+            task.add_done_callback(lambda _: self._loading.pop(day, None))
+        return await asyncio.shield(task)
+
+    async def _fetch_day(self, day: date_type, attempts: int = 3) -> Dict[int, List[int]]:
+        # Загрузка идет в собственной сессии: она может пережить апдейт, который ее запустил.
+        # Сессия берется на каждую попытку: повтор после брони, отмеченной во время загрузки,
+        # уйдет в основную БД, если реплика этой брони еще не видит
+        for _ in range(attempts):
+            self._dirty.discard(day)
+            async with read_scope() as session:
+                counters = await self._load_day(day, session)
+            if day not in self._dirty:
+                break
+        # Если день менялся при каждой попытке, остаток расхождения поправит reconcile()
+        self._dirty.discard(day)
+        # Публикуем день до завершения задачи, чтобы ни одно обновление не проскочило между ними
+        return self._days.setdefault(day, counters)
+
+    # ---------- инкрементальные обновления ----------
+
+    @staticmethod
+    def _apply(counters: Dict[int, List[int]], machine_id: int, start_time: datetime, end_time: datetime, delta: int):
+        slots = counters.setdefault(machine_id, [0] * SLOTS_PER_DAY)
+        for i in _slot_range(start_time, end_time):
+            slots[i] = max(slots[i] + delta, 0)
+
+    def _update(self, machine_id: int, start_time: datetime, end_time: datetime, delta: int):
+        day = start_time.date()
+        counters = self._days.get(day)
+        if counters is not None:
+            self._apply(counters, machine_id, start_time, end_time, delta)
+            if self._reconciling:
+                self._dirty.add(day)
+        elif day in self._loading:
+            self._dirty.add(day)
+        # Если день не загружен — ничего не делаем, он прочитается из БД при первом обращении
+
+    def mark(self, machine_id: int, start_time: datetime, end_time: datetime):
+        """Бронь создана: слоты машины заняты."""
+        self._update(machine_id, start_time, end_time, +1)
+
+    def unmark(self, machine_id: int, start_time: datetime, end_time: datetime):
+        """Бронь отменена (вручную или автоотменой): слоты машины освободились."""
+        self._update(machine_id, start_time, end_time, -1)
+
+    def invalidate_day(self, day: date_type):
+        """День изменился в БД в обход этого процесса: выгружаем, следующее обращение прочитает его заново."""
+        self._days.pop(day, None)
+        # Идущая загрузка или сверка могла прочитать день до изменения
+        if day in self._loading or self._reconciling:
+            self._dirty.add(day)
+
+    def invalidate_all(self):
+        """Выгружает все дни (пропущены уведомления об изменениях)."""
+        self._dirty.update(self._loading)
+        if self._reconciling:
+            self._dirty.update(self._days)
+        self._days.clear()
+
+    # ---------- чтение ----------
+
+    async def available_slots(self, day: date_type, machine_type: Optional[str] = None) -> List[datetime]:
+        """Начала слотов, в которых свободна хотя бы одна машина нужного типа."""
+        await machine_registry.ensure()
+        counters = await self._ensure_day(day)
+        machine_ids = [m.id for m in machine_registry.working(machine_type)]
+        if not machine_ids:
+            return []
+
+        base = _day_start(day)
+        return [
+            base + timedelta(minutes=SLOT_DURATION * i)
+            for i in range(SLOTS_PER_DAY)
+            if any(counters.get(mid, _FREE_DAY)[i] == 0 for mid in machine_ids)
+        ]
+
+    async def available_machines(self, start_time: datetime, end_time: datetime, machine_type: str) -> List[Machine]:
+        """Работающие машины нужного типа, свободные на всем интервале [start_time, end_time)."""
+        await machine_registry.ensure()
+        counters = await self._ensure_day(start_time.date())
+        slots = _slot_range(start_time, end_time)
+        return [
+            m for m in machine_registry.working(machine_type)
+            if all(counters.get(m.id, _FREE_DAY)[i] == 0 for i in slots)
+        ]
+
+    # ---------- сверка с БД ----------
+
+    async def reconcile(self, session: Optional[AsyncSession] = None) -> int:
+        """
+        Перечитывает из БД все загруженные дни (прошедшие выгружает), заменяет ими
+        состояние в памяти и возвращает число разошедшихся ячеек.
+        """
+        today = datetime.now().date()
+        for day in [d for d in self._days if d < today]:
+            del self._days[day]
+
+        drift = 0
+        self._reconciling = True
+        try:
+            async with session_scope(session) as session:
+                fresh_days = {day: await self._load_day(day, session) for day in list(self._days)}
+        finally:
+            self._reconciling = False
+        # Дни, изменившиеся во время сверки, оставляем как есть — их проверит следующая сверка
+        for day in [d for d in fresh_days if d in self._dirty]:
+            del fresh_days[day]
+            self._dirty.discard(day)
+
+        for day, fresh in fresh_days.items():
+            old = self._days.get(day, {})
+            for machine_id in fresh.keys() | old.keys():
+                old_slots = old.get(machine_id, _FREE_DAY)
+                drift += sum(1 for a, b in zip(old_slots, fresh.get(machine_id, _FREE_DAY)) if a != b)
+
+        # Подменяем состояние целиком, без await посередине
+        self._days.update(fresh_days)
+
+        self.last_drift = drift
+        self.total_drift += drift
+        if drift:
+            logging.warning(f"Occupancy drift: {drift} slot cells differed from DB, fixed")
+        return drift
+
+    def stats(self) -> dict:
+        return {
+            "loaded_days": len(self._days),
+            "last_drift": self.last_drift,
+            "total_drift": self.total_drift,
+        }
+
+
+occupancy = OccupancyEngine()
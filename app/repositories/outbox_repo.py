@@ -0,0 +1,146 @@
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Iterable, List, Optional
+
+from sqlalchemy import select, update, delete, or_, and_, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.base import async_session
+from app.db.replica import SKIP_WRITE_FENCE
+from app.db.models.outbox import OutboxMessage
+
+
+@asynccontextmanager
+async def _outbox_scope(session: Optional[AsyncSession] = None) -> AsyncIterator[AsyncSession]:
+    """
+    session_scope для запросов только к outbox: их коммиты не меняют того, что читается
+    с реплики, поэтому не переводят чтения на основную БД (см. app.db.replica).
+    """
+    if session is not None:
+        yield session
+        return
+    async with async_session(info={SKIP_WRITE_FENCE: True}) as own_session:
+        yield own_session
+
+
+async def add_to_outbox(session: AsyncSession, messages: Iterable[dict]) -> int:
+    """
+    Добавляет сообщения в outbox в транзакции вызывающего (без commit): сообщение
+    появится тогда и только тогда, когда закоммитится изменение, о котором оно.
+    Повтор с тем же dedupe_key пропускается.
+    """
+    messages = list(messages)
+    if not messages:
+        return 0
+    now = datetime.now()
+    rows = [{**m, "available_at": now, "created_at": now} for m in messages]
+    await session.execute(
+        pg_insert(OutboxMessage).on_conflict_do_nothing(index_elements=[OutboxMessage.dedupe_key]),
+        rows
+    )
+    return len(rows)
+
+
+async def enqueue_messages(messages: Iterable[dict], session: Optional[AsyncSession] = None) -> int:
+    """Ставит сообщения в очередь отдельной транзакцией (рассылки, не привязанные к изменению брони)."""
+    async with _outbox_scope(session) as session:
+        added = await add_to_outbox(session, messages)
+        await session.commit()
+        return added
+
+
+async def claim_outbox_batch(limit: int, lease: timedelta, session: Optional[AsyncSession] = None) -> list:
+    """
+    Забирает до limit готовых к отправке сообщений (FOR UPDATE SKIP LOCKED) и сдвигает
+    их available_at на lease вперед: если воркер упадет, не отметив отправку, сообщения
+    снова станут доступны после аренды. Доставка — "хотя бы один раз".
+    """
+    now = datetime.now()
+    due = (
+        select(OutboxMessage.id)
+        .where(
+            OutboxMessage.sent_at.is_(None),
+            OutboxMessage.failed_at.is_(None),
+            OutboxMessage.available_at <= now
+        )
+        .order_by(OutboxMessage.available_at, OutboxMessage.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    async with _outbox_scope(session) as session:
+        rows = (await session.execute(
+            update(OutboxMessage)
+            .where(OutboxMessage.id.in_(due))
+            .values(available_at=now + lease)
+            .returning(
+                OutboxMessage.id, OutboxMessage.chat_id, OutboxMessage.text, OutboxMessage.parse_mode,
+                OutboxMessage.reply_markup, OutboxMessage.attempts
+            )
+        )).all()
+        await session.commit()
+    return sorted(rows, key=lambda row: row.id)
+
+
+async def mark_outbox_sent(ids: List[int], session: Optional[AsyncSession] = None):
+    if not ids:
+        return
+    async with _outbox_scope(session) as session:
+        await session.execute(
+            update(OutboxMessage).where(OutboxMessage.id.in_(ids)).values(sent_at=datetime.now(), last_error=None)
+        )
+        await session.commit()
+
+
+async def retry_outbox_message(message_id: int, delay: timedelta, error: str, count_attempt: bool = True, session: Optional[AsyncSession] = None):
+    """Откладывает сообщение на delay. count_attempt=False — задержка не по вине сообщения (RetryAfter)."""
+    async with _outbox_scope(session) as session:
+        await session.execute(
+            update(OutboxMessage)
+            .where(OutboxMessage.id == message_id)
+            .values(
+                available_at=datetime.now() + delay,
+                attempts=OutboxMessage.attempts + (1 if count_attempt else 0),
+                last_error=error[:1000]
+            )
+        )
+        await session.commit()
+
+
+async def mark_outbox_failed(message_id: int, error: str, session: Optional[AsyncSession] = None):
+    """Больше не пытаемся: чат недоступен или исчерпаны попытки."""
+    async with _outbox_scope(session) as session:
+        await session.execute(
+            update(OutboxMessage)
+            .where(OutboxMessage.id == message_id)
+            .values(failed_at=datetime.now(), attempts=OutboxMessage.attempts + 1, last_error=error[:1000])
+        )
+        await session.commit()
+
+
+async def purge_outbox(older_than: timedelta, session: Optional[AsyncSession] = None) -> int:
+    """Удаляет отправленные и окончательно не доставленные сообщения старше older_than."""
+    cutoff = datetime.now() - older_than
+    async with _outbox_scope(session) as session:
+        result = await session.execute(
+            delete(OutboxMessage).where(or_(
+                and_(OutboxMessage.sent_at.is_not(None), OutboxMessage.sent_at < cutoff),
+                and_(OutboxMessage.failed_at.is_not(None), OutboxMessage.failed_at < cutoff)
+            ))
+        )
+        await session.commit()
+        return result.rowcount
+
+
+async def get_outbox_stats(session: Optional[AsyncSession] = None) -> dict:
+    """Сколько сообщений ждет отправки и сколько окончательно не доставлено."""
+    async with _outbox_scope(session) as session:
+        row = (await session.execute(
+            select(
+                func.count().filter(and_(OutboxMessage.sent_at.is_(None), OutboxMessage.failed_at.is_(None))),
+                func.count().filter(OutboxMessage.failed_at.is_not(None)),
+                func.min(OutboxMessage.created_at).filter(and_(OutboxMessage.sent_at.is_(None), OutboxMessage.failed_at.is_(None)))
+            )
+        )).one()
+    return {"pending": row[0], "failed": row[1], "oldest_pending": row[2]}
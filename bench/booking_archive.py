@@ -0,0 +1,114 @@
+"""
+Горячие запросы к booking до и после переноса старых броней в booking_archive
+(archive_finished_bookings). История — три года по 20 машинам и 10 слотам в день,
+~90% слотов занято, часть броней отменена. Тесты ходят в базу без пула, поэтому в каждом
+замере ~10 мс на соединение; смотреть стоит на разницу до и после.
+
+    TEST_DBNAME=stirka_test python bench/booking_archive.py
+"""
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tests"))
+
+from dbschema import use_test_database, create_schema  # noqa: E402
+
+if not use_test_database():
+    sys.exit("Задайте TEST_DBNAME — схема этой базы будет пересоздана")
+
+from sqlalchemy import text  # noqa: E402
+
+from app.db.base import engine, session_scope  # noqa: E402
+from app.repositories import laundry_repo  # noqa: E402
+from app.repositories.occupancy import occupancy  # noqa: E402
+
+HISTORY_DAYS = 1095
+
+
+async def seed():
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "INSERT INTO machines (id, type_machine, number_machine, status) "
+            "SELECT g, CASE WHEN g % 2 = 0 THEN 'Стиральная' ELSE 'Сушильная' END, g, 'Работает' "
+            "FROM generate_series(1, 20) g"
+        ))
+        await conn.execute(text(
+            "INSERT INTO residents (id, inidroom, idcards, last_name, first_name, patronymic, language) "
+            "SELECT g, g / 2, g, 'Фам' || g, 'Имя', '', 'RU' FROM generate_series(1, 2000) g"
+        ))
+        await conn.execute(text(f"""
+            INSERT INTO booking (inidresidents, inidmachine, start_time, end_time, status, reminded_at)
+            SELECT 1 + (hashtext(d::text || m || s::text) & 2047) % 2000, m, st, st + interval '90 min',
+                   CASE WHEN st > now() THEN 0 WHEN (hashtext(s::text || m || d::text) & 7) = 0 THEN 2 ELSE 1 END,
+                   CASE WHEN st < now() THEN st - interval '40 min' END
+            FROM generate_series(date_trunc('day', now()) - interval '{HISTORY_DAYS} days',
+                                 date_trunc('day', now()) + interval '14 days', interval '1 day') d,
+                 generate_series(1, 20) m, generate_series(0, 9) s,
+                 LATERAL (SELECT d + interval '8 hours' + s * interval '90 min' AS st) x
+            WHERE (hashtext(d::text || m || 'x' || s::text) & 15) <> 0
+        """))
+        await conn.execute(text("ANALYZE booking"))
+
+
+async def timeit(label: str, fn, runs: int = 30):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    print(f"  {label:<36} {statistics.median(timings):8.2f} ms")
+
+
+async def queries():
+    now = datetime.now()
+    old = now - timedelta(days=700)
+    tomorrow = (now + timedelta(days=1)).replace(hour=11, minute=0, second=0, microsecond=0)
+
+    async def load_day():
+        async with session_scope() as session:
+            await occupancy._load_day(tomorrow.date(), session)
+
+    await timeit("month workload, current", lambda: laundry_repo._load_month_workload(now.year, now.month, None, None))
+    await timeit("month workload, 2 years ago", lambda: laundry_repo._load_month_workload(old.year, old.month, None, None))
+    await timeit("get_user_bookings", lambda: laundry_repo.get_user_bookings(777))
+    await timeit("get_taken_slots, 3 slots", lambda: laundry_repo.get_taken_slots(
+        [(m, tomorrow, tomorrow + timedelta(minutes=90)) for m in (1, 2, 3)]
+    ))
+    await timeit("get_pending_bookings", lambda: laundry_repo.get_pending_bookings(now))
+    await timeit("occupancy day load", load_day)
+
+
+async def vacuum():
+    async with engine.connect() as conn:
+        raw = (await conn.get_raw_connection()).driver_connection
+        await raw.execute("VACUUM ANALYZE booking")
+        await raw.execute("ANALYZE booking_archive")
+        hot = await raw.fetchval("SELECT count(*) FROM booking")
+        size = await raw.fetchval("SELECT pg_size_pretty(pg_total_relation_size('booking'))")
+        archived = await raw.fetchval("SELECT count(*) FROM booking_archive")
+        print(f"  booking {hot} rows, {size}; archive {archived} rows")
+
+
+async def main():
+    await create_schema()
+    await seed()
+    print("before archiving")
+    await vacuum()
+    await queries()
+
+    started = time.perf_counter()
+    moved = await laundry_repo.archive_finished_bookings()
+    print(f"archived {moved} bookings in {time.perf_counter() - started:.1f}s")
+    print("after archiving")
+    await vacuum()
+    await queries()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,54 @@
+"""
+Отрисовка календаря записи: SimpleCalendar из aiogram_calendar (его клавиатуру раньше
+строил и перекрашивал CustomLaundryCalendar), прямая отрисовка CustomLaundryCalendar
+и она же из кэша по версии загруженности. База не нужна.
+
+    python bench/calendar_render.py [RENDERS=1000]
+"""
+import asyncio
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram_calendar import SimpleCalendar  # noqa: E402
+
+from app.bot.calendar_utils import CustomLaundryCalendar  # noqa: E402
+
+WORKLOAD = {day: day % 11 for day in range(1, 32)}
+
+
+async def measure(name: str, render, renders: int):
+    started = time.perf_counter()
+    for i in range(renders):
+        await render(i)
+    elapsed = (time.perf_counter() - started) / renders * 1e6
+    print(f"{name:<32} {elapsed:9.1f} us/render")
+
+
+async def main(renders: int):
+    now = datetime.now()
+
+    async def simple(i: int):
+        # Без locale: на сервере без установленной ru-локали setlocale падает, а с ней
+        # старый путь был бы еще медленнее
+        await SimpleCalendar(show_alerts=True).start_calendar(year=now.year, month=now.month)
+
+    async def direct(i: int):
+        calendar = CustomLaundryCalendar(WORKLOAD, max_capacity=10, locale="ru")
+        await calendar.start_calendar(year=now.year, month=now.month, back_callback="back_to_machine_type")
+
+    async def memoized(i: int):
+        # Версия меняется раз в 100 отрисовок — как после редких изменений загруженности
+        calendar = CustomLaundryCalendar(WORKLOAD, max_capacity=10, locale="ru", workload_version=i // 100)
+        await calendar.start_calendar(year=now.year, month=now.month, back_callback="back_to_machine_type")
+
+    await measure("SimpleCalendar (aiogram_calendar)", simple, renders)
+    await measure("CustomLaundryCalendar, direct", direct, renders)
+    await measure("CustomLaundryCalendar, memoized", memoized, renders)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000))
@@ -0,0 +1,63 @@
+"""
+Задержка операций FSM: MemoryStorage aiogram против DbStorage с отложенной и сквозной
+записью. 500 пользователей, на шаг — set_state, update_data, get_state, get_data.
+Всегда меряется SQLite во временном файле, Postgres — если задан TEST_DBNAME
+(без пула соединений: сквозная запись открывает соединение на каждый сброс).
+
+    [TEST_DBNAME=stirka_test] python bench/fsm_storage.py
+"""
+import asyncio
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tests"))
+
+from dbschema import use_test_database, create_schema  # noqa: E402
+
+TEST_DBNAME = use_test_database()
+
+from aiogram.fsm.storage.base import BaseStorage, StorageKey  # noqa: E402
+from aiogram.fsm.storage.memory import MemoryStorage  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+
+from app.bot.utils.fsm_storage import DbStorage  # noqa: E402
+
+USERS = 500
+
+
+async def measure(name: str, storage: BaseStorage, steps: int):
+    keys = [StorageKey(bot_id=1, chat_id=i, user_id=i) for i in range(USERS)]
+    started = time.perf_counter()
+    for i in range(steps):
+        key = keys[i % USERS]
+        await storage.set_state(key, "AddRecord:waiting_for_time")
+        await storage.update_data(key, {"start_time": datetime(2026, 1, 1, 8, 0), "lang": "RU"})
+        await storage.get_state(key)
+        await storage.get_data(key)
+    await storage.close()
+    elapsed = (time.perf_counter() - started) / steps / 4 * 1e6
+    stats = storage.stats() if isinstance(storage, DbStorage) else {}
+    print(f"{name:<28} {elapsed:9.1f} us/op  {stats}")
+
+
+async def main():
+    await measure("memory", MemoryStorage(), 20_000)
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite+aiosqlite:///{Path(tmp) / 'fsm.sqlite'}"
+        await measure("sqlite write-back", DbStorage(create_async_engine(url), create_table=True, dispose_engine=True), 20_000)
+        await measure("sqlite write-through", DbStorage(create_async_engine(url), flush_interval=0, dispose_engine=True), 2_000)
+    if TEST_DBNAME:
+        from app.db.base import engine
+
+        await create_schema()
+        await measure("postgres write-back", DbStorage(engine), 20_000)
+        await measure("postgres write-through", DbStorage(engine, flush_interval=0), 2_000)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
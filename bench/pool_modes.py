@@ -0,0 +1,96 @@
+"""
+Режимы DB_POOL_MODE (app/db/base.py) на типичном апдейте: одна сессия на апдейт
+и три коротких чтения (записи жильца, занятость слотов, бронь по id). Для каждого
+режима — апдейтов в секунду, задержка p50/p95 и физические подключения на апдейт.
+Режим pgbouncer здесь идет напрямую в Postgres: видна только цена отключенного кэша
+prepared statements.
+
+    TEST_DBNAME=stirka_test python bench/pool_modes.py [UPDATES=2000] [CONCURRENCY=20]
+"""
+import asyncio
+import statistics
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tests"))
+
+from dbschema import use_test_database, create_schema  # noqa: E402
+
+if not use_test_database():
+    sys.exit("Задайте TEST_DBNAME — схема этой базы будет пересоздана")
+
+from sqlalchemy import event, select  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker  # noqa: E402
+
+from app.db.base import DATABASE_URL, POOL_MODES, DB_POOL_SIZE, engine, _engine_options  # noqa: E402
+from app.db.models.booking import Booking  # noqa: E402
+from app.repositories.laundry_repo import get_user_bookings, get_taken_slots  # noqa: E402
+
+from seed import slot, add_machines, add_resident, add_booking  # noqa: E402
+
+RESIDENTS = 200
+
+
+async def seed() -> tuple:
+    await create_schema()
+    machines = await add_machines(10)
+    residents = [await add_resident(idcards=i, tg_id=i) for i in range(1, RESIDENTS + 1)]
+    for i, resident in enumerate(residents):
+        await add_booking(resident, machines[i % len(machines)], slot(days_ahead=1 + i // 100, index=i // 10 % 10))
+    await engine.dispose()
+    return machines, residents
+
+
+async def run_mode(mode: str, machines: list, residents: list, updates: int, concurrency: int):
+    mode_engine = create_async_engine(DATABASE_URL, **_engine_options(mode))
+    sessions = async_sessionmaker(mode_engine, expire_on_commit=False)
+    connects = 0
+
+    @event.listens_for(mode_engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        nonlocal connects
+        connects += 1
+
+    start = slot(days_ahead=1, index=3)
+    taken = [(m, start, start + timedelta(minutes=90)) for m in machines[:3]]
+    limit = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def update(i: int):
+        async with limit:
+            started = time.perf_counter()
+            async with sessions() as session:
+                await get_user_bookings(residents[i % len(residents)], session=session)
+                await get_taken_slots(taken, session=session)
+                await session.scalar(select(Booking.id).where(Booking.inidresidents == residents[i % len(residents)]))
+            timings.append((time.perf_counter() - started) * 1000)
+
+    if mode != "null":
+        # Как init_db(): пул прогрет до первого апдейта
+        await asyncio.gather(*(update(i) for i in range(DB_POOL_SIZE)))
+        timings.clear()
+        connects = 0
+
+    started = time.perf_counter()
+    await asyncio.gather(*(update(i) for i in range(updates)))
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    print(
+        f"{mode:<10} {updates / elapsed:8.0f} upd/s  p50 {statistics.median(timings):6.2f} ms  "
+        f"p95 {timings[int(len(timings) * 0.95)]:6.2f} ms  connects/update {connects / updates:.2f}"
+    )
+    await mode_engine.dispose()
+
+
+async def main(updates: int, concurrency: int):
+    machines, residents = await seed()
+    for mode in POOL_MODES:
+        await run_mode(mode, machines, residents, updates, concurrency)
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    asyncio.run(main(*(args + [2000, 20][len(args):])))
@@ -0,0 +1,88 @@
+"""
+Волна нажатий после рассылки о свободном слоте: N жильцов за SPREAD секунд открывают
+календарь месяца и слоты дня сразу после того, как отмена сбросила кэш месяца.
+С --off склейка одинаковых чтений (read_flight) отключена. Печатает время волны,
+статистику read_flight и число запросов к booking. Одновременно обрабатывается не больше
+WEBHOOK_MAX_IN_FLIGHT апдейтов, как в webhook-режиме.
+
+    TEST_DBNAME=stirka_test python bench/read_stampede.py [N=300] [SPREAD=0.3] [--off]
+"""
+import asyncio
+import random
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tests"))
+
+from dbschema import use_test_database, create_schema  # noqa: E402
+
+if not use_test_database():
+    sys.exit("Задайте TEST_DBNAME — схема этой базы будет пересоздана")
+
+from sqlalchemy import event  # noqa: E402
+
+from app.config.config import WEBHOOK_MAX_IN_FLIGHT  # noqa: E402
+from app.db.base import engine, async_session  # noqa: E402
+from app.repositories import laundry_repo  # noqa: E402
+from app.repositories.occupancy import occupancy  # noqa: E402
+
+from seed import slot, add_machines, add_resident, add_booking  # noqa: E402
+
+
+async def main(count: int, spread: float, coalesce: bool):
+    await create_schema()
+    machines = await add_machines(6)
+    residents = [await add_resident(idcards=i, tg_id=1000 + i) for i in range(count)]
+    day = slot(days_ahead=2)
+    for i, machine_id in enumerate(machines):
+        await add_booking(residents[i], machine_id, day + timedelta(minutes=90 * i))
+    for i in range(count):
+        await laundry_repo.get_user_by_tg_id(1000 + i)  # жильцы уже в кэше
+
+    if not coalesce:
+        async def passthrough(key, fn):
+            laundry_repo.read_flight.calls += 1
+            laundry_repo.read_flight.executed += 1
+            return await fn()
+        laundry_repo.read_flight.do = passthrough
+
+    in_flight = asyncio.Semaphore(WEBHOOK_MAX_IN_FLIGHT)
+
+    async def tap(i: int):
+        await asyncio.sleep(random.random() * spread)
+        async with in_flight, async_session() as session:
+            await laundry_repo.get_user_by_tg_id(1000 + i, session=session)
+            await laundry_repo.get_month_workload(day.year, day.month, "Стиральная", session=session)
+            await laundry_repo.get_available_slots(day, machine_type="Стиральная", session=session)
+
+    queries = 0
+
+    def count_booking_queries(conn, cursor, statement, parameters, context, executemany):
+        nonlocal queries
+        queries += "FROM booking" in statement
+
+    laundry_repo.invalidate_month_workload(day)  # отмена брони сбросила кэш месяца
+    occupancy.invalidate_all()
+    laundry_repo.read_flight.__init__()
+    event.listen(engine.sync_engine, "before_cursor_execute", count_booking_queries)
+    started = time.monotonic()
+    await asyncio.gather(*(tap(i) for i in range(count)))
+    elapsed = time.monotonic() - started
+    stats = laundry_repo.read_flight.stats()
+    print(
+        f"{count} taps in {elapsed:.2f}s, coalescing {'on' if coalesce else 'off'}: "
+        f"calls {stats['calls']}, executed {stats['executed']}, shared {stats['shared']}, booking queries {queries}"
+    )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    numbers = [a for a in sys.argv[1:] if not a.startswith("--")]
+    asyncio.run(main(
+        int(numbers[0]) if numbers else 300,
+        float(numbers[1]) if len(numbers) > 1 else 0.3,
+        "--off" not in sys.argv,
+    ))
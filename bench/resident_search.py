@@ -0,0 +1,107 @@
+"""
+Поиск жильца по ФИО: ключ resident_name_key (миграция 0011) против старого ilike по
+трем колонкам. 20 000 жильцов, 300 поисков в исходном написании и 300 — латиницей
+в обратном порядке слов (старый поиск их не находит).
+
+    TEST_DBNAME=stirka_test python bench/resident_search.py
+"""
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tests"))
+
+from dbschema import use_test_database, create_schema  # noqa: E402
+
+if not use_test_database():
+    sys.exit("Задайте TEST_DBNAME — схема этой базы будет пересоздана")
+
+from sqlalchemy import and_, or_, select, text  # noqa: E402
+
+from app.db.base import engine  # noqa: E402
+from app.db.models.residents import Resident  # noqa: E402
+from app.repositories.laundry_repo import find_resident_by_fio  # noqa: E402
+
+RESIDENTS = 20_000
+LOOKUPS = 300
+LAST_NAME_HEADS = ["Ба", "Ва", "Ко", "Лу", "Ми", "Но", "Пе", "Ро", "Са", "Ту", "Фе", "Ха", "Це", "Шу", "Юр", "Ял"]
+LAST_NAME_MIDDLES = ["ра", "ли", "ше", "жу", "цо", "хи", "вё", "ня", "дю", "зы"]
+LAST_NAME_TAILS = ["ов", "ин", "ев", "ёв", "ский", "цкий"]
+FIRST_NAMES = ["Иван", "Алексей", "Юрий", "Евгений", "Фёдор", "Илья", "Кирилл", "Виктор", "Дмитрий", "Сергей"]
+PATRONYMICS = ["Иванович", "Петрович", "Николаевич", "Сергеевич", "Юрьевич", "Алексеевич", ""]
+# Транслитерация "как в загранпаспорте" — не та, что в resident_name_key
+LATIN = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "yo", "ж": "zh", "з": "z",
+    "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r",
+    "с": "s", "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh",
+    "щ": "shch", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+})
+
+
+def latin(word: str) -> str:
+    return word.lower().translate(LATIN).capitalize()
+
+
+async def old_lookup(parts: list) -> bool:
+    """Поиск до миграции 0011: точные фамилия, имя и отчество без учета регистра.
+    Как и find_resident_by_fio, засчитывается только однозначный результат."""
+    last, first, patronymic = parts[0], parts[1], " ".join(parts[2:])
+    conditions = [Resident.last_name.ilike(last), Resident.first_name.ilike(first)]
+    conditions.append(Resident.patronymic.ilike(patronymic) if patronymic else Resident.patronymic == "")
+    async with engine.connect() as conn:
+        return len((await conn.execute(select(Resident.id).where(and_(*conditions)))).all()) == 1
+
+
+async def timed(name: str, lookups: list, fn):
+    started = time.perf_counter()
+    found = 0
+    for parts in lookups:
+        found += bool(await fn(parts))
+    elapsed = (time.perf_counter() - started) / len(lookups) * 1000
+    print(f"{name:<28} {elapsed:6.2f} ms/lookup, found {found}/{len(lookups)}")
+
+
+async def main():
+    random.seed(1)
+    await create_schema()
+    rows = [
+        (
+            i % 500 + 1, 100_000 + i,
+            random.choice(LAST_NAME_HEADS) + random.choice(LAST_NAME_MIDDLES) + random.choice(LAST_NAME_TAILS),
+            random.choice(FIRST_NAMES), random.choice(PATRONYMICS),
+        )
+        for i in range(RESIDENTS)
+    ]
+    async with engine.begin() as conn:
+        raw = (await conn.get_raw_connection()).driver_connection
+        await raw.executemany(
+            "INSERT INTO residents (inidroom, idcards, last_name, first_name, patronymic, language) "
+            "VALUES ($1, $2, $3, $4, $5, 'RU')",
+            rows,
+        )
+        await raw.execute("ANALYZE residents")
+
+    sample = random.sample(rows, LOOKUPS)
+    as_written = [[r[2], r[3]] + ([r[4]] if r[4] else []) for r in sample]
+    reordered = [[latin(r[3]), latin(r[2])] + ([latin(r[4])] if r[4] else []) for r in sample]
+
+    await timed("old ilike, as written", as_written, old_lookup)
+    await timed("search key, as written", as_written, find_resident_by_fio)
+    await timed("old ilike, latin reversed", reordered, old_lookup)
+    await timed("search key, latin reversed", reordered, find_resident_by_fio)
+
+    query = select(Resident.id).where(or_(
+        Resident.search_key == text("resident_name_key('Ivan Ivanov')"),
+        Resident.search_key_short == text("resident_name_key('Ivan Ivanov')"),
+    ))
+    async with engine.connect() as conn:
+        plan = await conn.execute(text("EXPLAIN " + str(query.compile(engine.sync_engine))))
+        print("\n".join(row[0] for row in plan))
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
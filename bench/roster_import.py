@@ -0,0 +1,71 @@
+"""
+Импорт списка жильцов (app.db.roster_import) на больших файлах: время и пиковая
+память процесса. Первый файл — N жильцов в пустую базу; второй — тот же список через
+семестр: 2% ушли, 2,5% переселены, 1% сменили фамилию, 1000 новых, плюс битая строка
+и дубль пропуска. Второй файл грузится с --prune.
+
+    TEST_DBNAME=stirka_test python bench/roster_import.py [N=50000]
+"""
+import asyncio
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tests"))
+
+from dbschema import use_test_database, create_schema  # noqa: E402
+
+if not use_test_database():
+    sys.exit("Задайте TEST_DBNAME — схема этой базы будет пересоздана")
+
+from app.db import roster_import  # noqa: E402
+from app.db.base import engine  # noqa: E402
+
+LAST_NAMES = ["Иванов", "Петров", "Смирнов", "Кузнецов", "Соловьёв", "Щукин", "Григорьев", "Жуков", "Ёлкин", "Цой"]
+FIRST_NAMES = ["Иван", "Алексей", "Юрий", "Евгений", "Фёдор", "Илья", "Кирилл", "Виктор"]
+
+
+def write_roster(path: Path, count: int, next_semester: bool):
+    with open(path, "w", encoding="utf-8-sig") as f:
+        f.write("Комната;Номер пропуска;Фамилия;Имя;Отчество\n")
+        for i in range(count):
+            if next_semester and i % 50 == 0:
+                continue
+            room = 100 + i // 3 + (7 if next_semester and i % 40 == 1 else 0)
+            last_name = LAST_NAMES[i * 7 % len(LAST_NAMES)] + str(i)
+            if next_semester and i % 100 == 2:
+                last_name += "-Новый"
+            f.write(f"{room};{500_000 + i};{last_name};{FIRST_NAMES[i * 3 % len(FIRST_NAMES)]};Петрович\n")
+        if next_semester:
+            for i in range(count, count + 1000):
+                f.write(f"{9000 + i};{500_000 + i};Новенький{i};Пётр;\n")
+            f.write("abc;500003;Плохая;Строка;\n")
+            f.write(f"101;{500_000 + 4};Дубль;Последний;\n")
+
+
+async def run(name: str, path: Path, prune: bool):
+    reader = roster_import.RosterReader(str(path))
+    started = time.perf_counter()
+    report = await roster_import.import_roster(reader, prune=prune)
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+    print(f"{name}: {elapsed:.2f}s, peak RSS {peak} MB")
+    print(f"  {report}")
+
+
+async def main(count: int):
+    await create_schema()
+    with tempfile.TemporaryDirectory() as tmp:
+        first, second = Path(tmp) / "roster.csv", Path(tmp) / "roster_next.csv"
+        write_roster(first, count, next_semester=False)
+        write_roster(second, count, next_semester=True)
+        await run(f"initial import, {count} rows", first, prune=False)
+        await run("next semester with --prune", second, prune=True)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000))
@@ -0,0 +1,81 @@
+"""
+Нагрузка на webhook-режим (app/bot/webhook.py): N синтетических апдейтов от 300
+пользователей, отправитель держит CONCURRENCY запросов одновременно, обработчик
+апдейта занимает 50 мс. Пропускная способность, задержка ответа вебхука и число
+апдейтов, обработанных к концу остановки (close() дожидается незавершенных).
+База и доступ к Telegram не нужны.
+
+    python bench/webhook_load.py [N=5000] [CONCURRENCY=100] [MAX_IN_FLIGHT=64]
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tests"))
+
+from dbschema import use_test_database  # noqa: E402
+
+use_test_database()  # заглушка BOT_TOKEN, если нет .env: база и Telegram здесь не нужны
+
+import aiohttp  # noqa: E402
+from aiogram import Bot, Dispatcher  # noqa: E402
+from aiogram.types import Message  # noqa: E402
+from aiohttp import web  # noqa: E402
+
+from app.bot.webhook import BoundedRequestHandler  # noqa: E402
+
+TOKEN = "123456:AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA"
+PORT = 8089
+HANDLER_DELAY = 0.05
+
+
+def update(i: int) -> dict:
+    user = {"id": i % 300, "is_bot": False, "first_name": "Иван"}
+    chat = {"id": i % 300, "type": "private"}
+    return {"update_id": i, "message": {"message_id": i, "date": 0, "chat": chat, "from": user, "text": "hi"}}
+
+
+async def main(count: int, concurrency: int, max_in_flight: int):
+    handled = 0
+    dp = Dispatcher()
+
+    @dp.message()
+    async def handle(message: Message):
+        nonlocal handled
+        await asyncio.sleep(HANDLER_DELAY)
+        handled += 1
+
+    app = web.Application()
+    handler = BoundedRequestHandler(dp, Bot(TOKEN), max_in_flight=max_in_flight, drain_timeout=30)
+    handler.register(app, path="/webhook")
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", PORT).start()
+
+    latencies = []
+    limit = asyncio.Semaphore(concurrency)
+    async with aiohttp.ClientSession() as session:
+        async def post(i: int):
+            async with limit:
+                started = time.perf_counter()
+                async with session.post(f"http://127.0.0.1:{PORT}/webhook", json=update(i)) as response:
+                    await response.read()
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(post(i) for i in range(count)))
+        await runner.cleanup()  # вызывает handler.close(): дожидается незавершенных апдейтов
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(
+        f"{count} updates, {count / elapsed:.0f} upd/s, p50 {latencies[count // 2] * 1e3:.1f} ms, "
+        f"p99 {latencies[int(count * 0.99)] * 1e3:.1f} ms, handled {handled}"
+    )
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:4]]
+    asyncio.run(main(*(args + [5000, 100, 64][len(args):])))
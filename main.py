@@ -15,30 +15,102 @@ from app.bot.handlers.auth import auth_router
 from app.bot.handlers.booking import booking_router
 from app.bot.handlers.records import records_router
 from app.bot.handlers.report import report_router
-from app.bot.scheduler import start_scheduler
+from app.bot.scheduler import start_scheduler, resume_scheduler, pause_scheduler
 from app.bot.handlers.confirmation import confirm_router
 
-from app.db.base import init_db
+from app.bot.middlewares import DbSessionMiddleware, CurrentUserMiddleware
+from app.bot.utils.fsm_storage import create_fsm_storage, DbStorage
+from app.bot.webhook import run_webhook
+from app.bot.utils.broadcaster import slot_freed_digest
+from app.bot.utils.outbox_worker import outbox_worker
+from app.db.base import init_db, async_session
+from app.db.leader import LeaderElection
+from app.db.replica import replica_router
+from app.repositories.machines import machine_registry
+from app.repositories.change_feed import change_feed
 
 TOKEN = cfg.BOT_TOKEN
 bot = Bot(token=TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-dp = Dispatcher()
+# Состояние диалогов и выбранный язык переживают перезапуск, если FSM_STORAGE != memory
+dp = Dispatcher(storage=create_fsm_storage())
 
 async def main():
     await init_db()
+    # Каталог машин загружается сразу и дальше обновляется по NOTIFY machines_changed
+    await machine_registry.refresh()
+    machines_listener = asyncio.create_task(machine_registry.listen(cfg.LEADER_DATABASE_URL)) if cfg.MACHINES_LISTEN else None
+    # Кэши жильцов, календаря и занятости сбрасываются по изменениям других экземпляров
+    cache_listener = asyncio.create_task(change_feed.listen(cfg.LEADER_DATABASE_URL)) if cfg.CACHE_LISTEN else None
+    # ...и состояния диалогов, записанные другими экземплярами
+    fsm_listener = (
+        asyncio.create_task(dp.storage.listen(cfg.LEADER_DATABASE_URL))
+        if cfg.CACHE_LISTEN and isinstance(dp.storage, DbStorage) and dp.storage.shared else None
+    )
+    # Чтения идут на реплику (если задан REPLICA_HOST), пока проверка отставания видит ее свежей
+    replica_router.start()
+    dp.update.middleware(DbSessionMiddleware(async_session))
+    dp.update.middleware(CurrentUserMiddleware())
     dp.include_router(auth_router)
     dp.include_router(booking_router)
     dp.include_router(records_router)
     dp.include_router(report_router)
     dp.include_router(cancel_record_router)
     dp.include_router(confirm_router)
+    # Накопленную сводку о свободных слотах не теряем при остановке
+    dp.shutdown.register(slot_freed_digest.flush)
 
-    start_scheduler(bot)
+    # Напоминания, авто-отмены и доставка сообщений из outbox идут только с ведущего
+    # экземпляра (лимиты Telegram общие на бота); апдейты обрабатывает каждый
+    # (горизонтально масштабируется в webhook-режиме, если включен CACHE_LISTEN)
+    async def on_elected():
+        await resume_scheduler()
+        outbox_worker.start(bot)
 
+    async def on_demoted():
+        await pause_scheduler()
+        await outbox_worker.stop()
+
+    election = None
+    if cfg.LEADER_ELECTION:
+        start_scheduler(paused=True)
+        election = LeaderElection(
+            cfg.LEADER_LOCK_KEY,
+            on_elected=on_elected,
+            on_demoted=on_demoted,
+            check_interval=cfg.LEADER_CHECK_INTERVAL,
+            url=cfg.LEADER_DATABASE_URL
+        )
+        election.start()
+    else:
+        start_scheduler()
+        outbox_worker.start(bot)
+
+    try:
+        if cfg.BOT_MODE == "webhook":
+            await run_webhook(bot, dp)
+        else:
+            await run_polling()
+    finally:
+        if election:
+            await election.stop()
+        await outbox_worker.stop()
+        await replica_router.stop()
+        for listener in (machines_listener, cache_listener, fsm_listener):
+            if listener:
+                listener.cancel()
+                try:
+                    await listener
+                except asyncio.CancelledError:
+                    pass
+
+
+async def run_polling():
     max_retries = 5
     for attempt in range(1, max_retries + 1):
         try:
             logging.info(f"[Bot] Starting polling, attempt    {attempt}")
+            # Если раньше работал webhook-режим, getUpdates без этого вернет конфликт
+            await bot.delete_webhook()
             await dp.start_polling(bot)
             break
         except (aiohttp.ClientConnectorError, TelegramNetworkError) as e:
@@ -0,0 +1,44 @@
+"""
+Тесты идут против настоящего Postgres (см. tests/dbschema.py):
+
+    TEST_DBNAME=stirka_test python -m pytest -q tests
+
+Без TEST_DBNAME тесты с базой пропускаются, остальные (вебхук, календарь, SingleFlight)
+идут и без .env и настроек подключения. pytest-asyncio не нужен: тест —
+обычная функция, асинхронную часть он запускает через asyncio.run().
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dbschema import use_test_database, create_schema, truncate_all, reset_caches  # noqa: E402
+
+TEST_DBNAME = use_test_database()
+
+
+@pytest.fixture(scope="session")
+def schema() -> dict:
+    if not TEST_DBNAME:
+        pytest.skip("TEST_DBNAME не задан")
+    return asyncio.run(create_schema())
+
+
+@pytest.fixture
+def db(schema) -> dict:
+    """Пустые таблицы и кэши перед тестом. Возвращает сведения о схеме (has_btree_gist)."""
+    asyncio.run(truncate_all())
+    reset_caches()
+    yield schema
+    reset_caches()
+
+
+@pytest.fixture
+def btree_gist(db) -> dict:
+    """Для тестов ограничения booking_no_overlap."""
+    if not db["has_btree_gist"]:
+        pytest.skip("в сборке Postgres нет расширения btree_gist")
+    return db
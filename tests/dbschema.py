@@ -0,0 +1,127 @@
+"""
+Отдельная база Postgres для тестов и замеров из bench/.
+
+База задается TEST_DBNAME, подключение (USER/PASSWORD/HOST/PORT) — то же, что у бота,
+а если оно не задано — локальный Postgres (CONNECTION_DEFAULTS).
+Схема public в ней пересоздается с нуля, поэтому рабочую базу сюда указывать нельзя.
+Модуль нужно импортировать до app: use_test_database() подменяет DBNAME в окружении.
+"""
+import os
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+
+MIGRATIONS = Path(__file__).resolve().parent.parent / "app" / "db" / "migrations"
+# 0001–0004 — история таблицы booking (текстовый статус), ее целиком описывает модель.
+# Остальные миграции идемпотентны и накатываются поверх create_all.
+FIRST_MIGRATION = "0005"
+
+# Локальный Postgres, если подключение не задано ни в окружении, ни в .env
+CONNECTION_DEFAULTS = {"HOST": "127.0.0.1", "PORT": "5432", "USER": "postgres", "PASSWORD": ""}
+
+_switched = False
+
+
+def use_test_database() -> Optional[str]:
+    """Переключает app на TEST_DBNAME. None — тестовая база не задана."""
+    global _switched
+    load_dotenv()
+    # app.config требует BOT_TOKEN; в Telegram тесты не ходят, хватает заглушки
+    os.environ.setdefault("BOT_TOKEN", "123456:AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA")
+    # app.db.base собирает URL базы при импорте: без настроек подключения не импортируются
+    # даже тесты без базы. Соединение при импорте не открывается, тесты с базой без
+    # TEST_DBNAME все равно пропускаются
+    for key, default in CONNECTION_DEFAULTS.items():
+        os.environ.setdefault(key, default)
+    name = os.getenv("TEST_DBNAME")
+    if not name or _switched:
+        return name
+    if name == os.getenv("DBNAME"):
+        raise RuntimeError("TEST_DBNAME совпадает с DBNAME: тесты пересоздают схему базы")
+    os.environ["DBNAME"] = name
+    # Каждый тест идет в своем event loop, соединения пула между ними не переживают
+    os.environ["DB_POOL_MODE"] = "null"
+    os.environ.pop("REPLICA_HOST", None)
+    _switched = True
+    return name
+
+
+async def _execute_script(conn, sql: str):
+    # Несколько команд в одной строке (миграции) умеет выполнить только сам asyncpg
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.execute(sql)
+
+
+async def create_schema() -> dict:
+    """
+    Пересоздает схему: модели через create_all, затем миграции начиная с FIRST_MIGRATION.
+    Без расширения btree_gist ограничение booking_no_overlap не создается — тесты,
+    которым оно нужно, проверяют has_btree_gist.
+    """
+    from sqlalchemy import text
+    from sqlalchemy.dialects.postgresql import ExcludeConstraint
+
+    from app.db.base import engine, Base
+    import app.db.models.booking
+    import app.db.models.booking_archive
+    import app.db.models.fsm_state
+    import app.db.models.machine
+    import app.db.models.notification
+    import app.db.models.outbox
+    import app.db.models.residents
+    import app.db.models.room
+    import app.db.models.subscription
+    import app.db.models.waitlist
+
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP SCHEMA IF EXISTS public CASCADE"))
+        await conn.execute(text("CREATE SCHEMA public"))
+        available = await conn.scalar(text("SELECT count(*) FROM pg_available_extensions WHERE name = 'btree_gist'"))
+        if available:
+            await conn.execute(text("CREATE EXTENSION btree_gist"))
+        # Функции ключа поиска нужны сгенерированным колонкам residents до create_all
+        search_key = (MIGRATIONS / "0011_resident_search_key.sql").read_text(encoding="utf-8")
+        await _execute_script(conn, search_key[:search_key.index("ALTER TABLE residents")])
+
+        booking = app.db.models.booking.Booking.__table__
+        excluded = [] if available else [c for c in booking.constraints if isinstance(c, ExcludeConstraint)]
+        for constraint in excluded:
+            booking.constraints.discard(constraint)
+        try:
+            await conn.run_sync(Base.metadata.create_all)
+        finally:
+            booking.constraints.update(excluded)
+
+    for path in sorted(MIGRATIONS.glob("*.sql")):
+        if path.name >= FIRST_MIGRATION:
+            async with engine.begin() as conn:
+                await _execute_script(conn, path.read_text(encoding="utf-8"))
+    await engine.dispose()
+    return {"has_btree_gist": bool(available)}
+
+
+async def truncate_all():
+    """Очищает все таблицы (между тестами)."""
+    from sqlalchemy import text
+
+    from app.db.base import engine, Base
+
+    tables = ", ".join(t.name for t in Base.metadata.sorted_tables)
+    async with engine.begin() as conn:
+        await conn.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+
+
+def reset_caches():
+    """Сбрасывает кэши процесса: каждый тест начинает с пустой памяти, как новый процесс."""
+    from app.repositories.laundry_repo import resident_cache, workload_cache, read_flight
+    from app.repositories.occupancy import occupancy
+    from app.repositories.machines import machine_registry
+    from app.db.replica import replica_router
+
+    resident_cache.clear()
+    workload_cache.clear()
+    read_flight.__init__()
+    occupancy.__init__()
+    machine_registry.__init__()
+    replica_router.last_write = 0.0
@@ -0,0 +1,53 @@
+"""
+Данные для тестов. Пишутся прямо в БД, в обход репозиториев — как это сделал бы
+другой экземпляр бота: кэши этого процесса о них ничего не знают.
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import insert, text
+
+from app.config.config import WORK_START, SLOT_DURATION
+from app.db.base import engine
+from app.db.models.booking import Booking, BookingStatus
+from app.db.models.machine import Machine
+from app.db.models.residents import Resident
+
+
+def slot(days_ahead: int = 1, index: int = 0) -> datetime:
+    """Начало слота index через days_ahead дней."""
+    day = datetime.now().replace(hour=WORK_START, minute=0, second=0, microsecond=0) + timedelta(days=days_ahead)
+    return day + timedelta(minutes=SLOT_DURATION * index)
+
+
+async def add_machines(count: int = 2, machine_type: str = "Стиральная") -> list[int]:
+    async with engine.begin() as conn:
+        result = await conn.execute(
+            insert(Machine).returning(Machine.id),
+            [dict(type_machine=machine_type, number_machine=i + 1, status="Работает") for i in range(count)],
+        )
+        return list(result.scalars())
+
+
+async def add_resident(idcards: int, tg_id: Optional[int] = None, last_name: str = "Иванов", first_name: str = "Иван") -> int:
+    async with engine.begin() as conn:
+        return await conn.scalar(
+            insert(Resident).returning(Resident.id),
+            dict(inidroom=1, idcards=idcards, tg_id=tg_id, last_name=last_name, first_name=first_name, patronymic=""),
+        )
+
+
+async def add_booking(resident_id: int, machine_id: int, start_time: datetime, status: BookingStatus = BookingStatus.PENDING) -> int:
+    async with engine.begin() as conn:
+        return await conn.scalar(
+            insert(Booking).returning(Booking.id),
+            dict(
+                inidresidents=resident_id, inidmachine=machine_id, start_time=start_time,
+                end_time=start_time + timedelta(minutes=SLOT_DURATION), status=status,
+            ),
+        )
+
+
+async def execute(sql: str, **params):
+    async with engine.begin() as conn:
+        return await conn.execute(text(sql), params)
@@ -0,0 +1,57 @@
+import asyncio
+
+from sqlalchemy import func, select
+
+from app.db.base import async_session
+from app.db.models.booking import Booking, BookingStatus
+from app.db.models.booking_archive import BookingArchive
+from app.repositories.laundry_repo import archive_finished_bookings, _load_month_workload
+
+from seed import slot, add_machines, add_resident, add_booking
+
+
+async def _counts():
+    async with async_session() as session:
+        return (
+            await session.scalar(select(func.count()).select_from(Booking)),
+            await session.scalar(select(func.count()).select_from(BookingArchive)),
+        )
+
+
+async def _seed() -> tuple:
+    machine_id, = await add_machines(1)
+    resident = await add_resident(idcards=1)
+    old = slot(days_ahead=-60)
+    for index in range(5):
+        status = BookingStatus.CANCELLED if index == 4 else BookingStatus.CONFIRMED
+        await add_booking(resident, machine_id, slot(days_ahead=-60, index=index), status=status)
+    await add_booking(resident, machine_id, slot(days_ahead=-10), status=BookingStatus.CONFIRMED)
+    await add_booking(resident, machine_id, slot(days_ahead=1))
+    return old
+
+
+def test_archive_moves_old_bookings_in_batches(db):
+    async def scenario():
+        old = await _seed()
+        before = await _load_month_workload(old.year, old.month, None, None)
+        moved = await archive_finished_bookings(batch_size=2)
+        after = await _load_month_workload(old.year, old.month, None, None)
+        return moved, await _counts(), before, after
+
+    moved, counts, before, after = asyncio.run(scenario())
+    assert moved == 5
+    assert counts == (2, 5)
+    # Прошлый месяц календаря видит перенесенные брони в архиве, отмененная не считается
+    assert after == before and after[min(after)] == 4
+
+
+def test_archive_with_callers_session(db):
+    async def scenario():
+        await _seed()
+        async with async_session() as session:
+            moved = await archive_finished_bookings(batch_size=2, session=session)
+            # Сессия вызывающего после переноса по-прежнему рабочая
+            left = await session.scalar(select(func.count()).select_from(Booking))
+        return moved, left, await archive_finished_bookings(batch_size=2)
+
+    assert asyncio.run(scenario()) == (5, 2, 0)
@@ -0,0 +1,84 @@
+import asyncio
+import json
+from contextlib import contextmanager
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app.db.base import engine, session_scope
+from app.repositories.laundry_repo import get_taken_slots
+from app.repositories.occupancy import occupancy
+
+from seed import slot, add_machines, add_resident, add_booking, execute
+
+
+@contextmanager
+def _captured_sql():
+    """SQL и параметры запросов, ушедших в БД внутри блока."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+
+async def _plan(statement: str, parameters) -> str:
+    async with engine.connect() as conn:
+        raw = (await conn.get_raw_connection()).driver_connection
+        # json-кодек соединению ставит SQLAlchemy: план приходит уже разобранным
+        return json.dumps(await raw.fetchval("EXPLAIN (FORMAT JSON) " + statement, *parameters))
+
+
+def test_overlap_queries_use_gist_index(db):
+    async def scenario():
+        machines = await add_machines(10)
+        resident = await add_resident(idcards=1)
+        # Два года истории: без индекса запрос на пересечение читал бы всю таблицу
+        await execute(
+            "INSERT INTO booking (inidresidents, inidmachine, start_time, end_time, status) "
+            "SELECT :resident, m, st, st + interval '90 min', 1 "
+            "FROM unnest(CAST(:machines AS int[])) m, "
+            "     generate_series(date_trunc('day', now()) - interval '730 days', date_trunc('day', now()) - interval '1 day', interval '1 day') d, "
+            "     LATERAL (SELECT d + interval '8 hours' + s * interval '90 min' AS st FROM generate_series(0, 9) s) x",
+            resident=resident, machines=machines,
+        )
+        await execute("ANALYZE booking")
+
+        start = slot(days_ahead=1, index=2)
+        end = start + timedelta(minutes=90)
+        await add_booking(resident, machines[0], start)
+        await add_booking(resident, machines[1], end)  # вплотную после слота: не пересекается
+
+        with _captured_sql() as statements:
+            taken = await get_taken_slots([(m, start, end) for m in machines[:3]])
+            async with session_scope() as session:
+                await occupancy._load_day(start.date(), session)
+        plans = [await _plan(statement, parameters) for statement, parameters in statements
+                 if "&&" in statement]
+        return taken, (machines[0], start), plans
+
+    taken, expected, plans = asyncio.run(scenario())
+    assert taken == {expected}
+    assert len(plans) == 2
+    for plan in plans:
+        assert "ix_booking_live_period" in plan
+        assert '"Seq Scan"' not in plan
+
+
+@pytest.mark.parametrize("shift, overlaps", [(-90, False), (-45, True), (0, True), (89, True), (90, False)])
+def test_overlap_bounds(db, shift, overlaps):
+    async def scenario():
+        machine_id, = await add_machines(1)
+        resident = await add_resident(idcards=1)
+        start = slot(days_ahead=1, index=4)
+        await add_booking(resident, machine_id, start)
+        probe = start + timedelta(minutes=shift)
+        return await get_taken_slots([(machine_id, probe, probe + timedelta(minutes=90))])
+
+    assert bool(asyncio.run(scenario())) is overlaps
@@ -0,0 +1,58 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from aiogram_calendar.schemas import SimpleCalendarCallback, SimpleCalAct
+
+from app.bot.calendar_utils import CustomLaundryCalendar, IGNORE_CALLBACK
+
+
+def _month(months_ahead: int) -> tuple:
+    day = datetime.now().replace(day=15) + timedelta(days=31 * months_ahead)
+    return day.year, day.month
+
+
+def _days(markup) -> dict:
+    """{день: текст кнопки} по кнопкам дней календаря; пустые клетки и "Назад" пропускаются."""
+    days = {}
+    for row in markup.inline_keyboard[2:]:
+        for button in row:
+            if not button.callback_data.startswith(SimpleCalendarCallback.__prefix__):
+                continue
+            callback = SimpleCalendarCallback.unpack(button.callback_data)
+            if callback.act == SimpleCalAct.day:
+                days[callback.day] = button.text
+    return days
+
+
+def _render(year: int, month: int, version=None, workload=None, **kwargs):
+    calendar = CustomLaundryCalendar(workload or {}, max_capacity=10, locale="ru", workload_version=version)
+    return asyncio.run(calendar.start_calendar(year=year, month=month, **kwargs))
+
+
+def test_day_marks():
+    year, month = _month(1)
+    markup = _render(year, month, workload={1: 10, 2: 3}, back_callback="back_to_machine_type")
+    days = _days(markup)
+
+    assert markup.inline_keyboard[0][0].callback_data == IGNORE_CALLBACK
+    assert markup.inline_keyboard[-1][0].callback_data == "back_to_machine_type"
+    assert (days[1], days[2], days[3]) == ("1 🔴", "2 🟡", "3 🟢")
+    first = markup.inline_keyboard[2]
+    callback = next(SimpleCalendarCallback.unpack(b.callback_data) for b in first if b.text.startswith("1 "))
+    assert (callback.act, callback.year, callback.month, callback.day) == (SimpleCalAct.day, year, month, 1)
+
+
+def test_past_month_is_grey():
+    year, month = _month(-1)
+    assert {text[-1] for text in _days(_render(year, month, workload={1: 3})).values()} == {"⚪"}
+
+
+def test_markup_is_memoized_per_workload_version():
+    year, month = _month(2)
+    first = _render(year, month, version=7, workload={5: 3})
+    # Та же версия — та же клавиатура, даже если словарь передан другой
+    assert _render(year, month, version=7, workload={5: 10}) is first
+    updated = _render(year, month, version=8, workload={5: 10})
+    assert updated is not first and _days(updated)[5] == "5 🔴"
+    # Без версии кэш не используется
+    assert _render(year, month, workload={5: 3}) is not _render(year, month, workload={5: 3})
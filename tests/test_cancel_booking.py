@@ -0,0 +1,66 @@
+import asyncio
+
+from sqlalchemy import func, select
+
+from app.bot.utils.outbox_worker import outbox_message
+from app.db.base import async_session
+from app.db.models.booking import Booking, BookingStatus
+from app.db.models.outbox import OutboxMessage
+from app.repositories.laundry_repo import cancel_booking, join_waitlist
+from app.repositories.occupancy import occupancy
+
+from seed import slot, add_machines, add_resident, add_booking
+
+
+def _grant_message(handoff) -> list:
+    # Без dedupe_key: каждый лишний запрос подтверждения виден в outbox
+    return [outbox_message(handoff.tg_id or 0, f"slot {handoff.id}")]
+
+
+async def _count(*query):
+    async with async_session() as session:
+        return await session.scalar(select(func.count()).where(*query))
+
+
+def test_concurrent_cancels_hand_off_once(db):
+    async def scenario():
+        machine_id, = await add_machines(1)
+        owner = await add_resident(idcards=1, tg_id=100)
+        waiting = await add_resident(idcards=2, tg_id=200)
+        start = slot(days_ahead=1, index=3)
+        booking_id = await add_booking(owner, machine_id, start)
+        await join_waitlist(waiting, "Стиральная", start)
+        await occupancy.available_slots(start.date())  # день загружен: отмена правит счетчики
+
+        results = await asyncio.gather(*(
+            cancel_booking(booking_id, messages=_grant_message) for _ in range(4)
+        ))
+        return (
+            results,
+            await _count(Booking.inidresidents == waiting, Booking.status != BookingStatus.CANCELLED),
+            await _count(OutboxMessage.id.is_not(None)),
+            await occupancy.reconcile(),
+        )
+
+    results, handoffs, messages, drift = asyncio.run(scenario())
+    assert sum(r is not None for r in results) == 1
+    assert (handoffs, messages, drift) == (1, 1, 0)
+
+
+def test_resident_cannot_cancel_someone_elses_booking(db):
+    async def scenario():
+        machine_id, = await add_machines(1)
+        owner = await add_resident(idcards=1, tg_id=100)
+        await add_resident(idcards=2, tg_id=200)
+        booking_id = await add_booking(owner, machine_id, slot())
+
+        forged = await cancel_booking(booking_id, user_tg_id=200)
+        status_after_forged = await _count(Booking.id == booking_id, Booking.status == BookingStatus.CANCELLED)
+        own = await cancel_booking(booking_id, user_tg_id=100)
+        again = await cancel_booking(booking_id, user_tg_id=100)
+        return forged, status_after_forged, own, again
+
+    forged, cancelled_by_forged, own, again = asyncio.run(scenario())
+    assert forged is None and cancelled_by_forged == 0
+    assert own == {"handoff": None}
+    assert again is None
@@ -0,0 +1,93 @@
+import asyncio
+from datetime import timedelta
+
+from app.config.config import SLOT_DURATION
+from app.repositories.change_feed import change_feed
+from app.repositories.laundry_repo import get_user_by_tg_id, get_month_workload, resident_cache
+from app.repositories.occupancy import occupancy
+
+from seed import slot, add_machines, add_resident, add_booking, execute
+
+
+async def _eventually(check, timeout: float = 3.0):
+    """Ждет, пока check() станет истинным: уведомление приходит асинхронно."""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not await check():
+        assert asyncio.get_running_loop().time() < deadline, "изменение другого экземпляра не дошло"
+        await asyncio.sleep(0.05)
+
+
+async def _with_feed(scenario):
+    async def connected():
+        return change_feed.connected
+
+    listener = asyncio.create_task(change_feed.listen(check_interval=1))
+    try:
+        await _eventually(connected)
+        await scenario()
+    finally:
+        listener.cancel()
+        await asyncio.gather(listener, return_exceptions=True)
+
+
+def test_registration_elsewhere_drops_cached_unknown_user(db):
+    async def scenario():
+        resident_id = await add_resident(idcards=1)
+        assert await get_user_by_tg_id(555) is None
+        assert resident_cache.get(555) is None  # закэширован "не зарегистрирован"
+
+        # Жилец прошел регистрацию через другой экземпляр
+        await execute("UPDATE residents SET tg_id = 555 WHERE id = :id", id=resident_id)
+
+        async def registered():
+            user = await get_user_by_tg_id(555)
+            return user is not None and user.id == resident_id
+        await _eventually(registered)
+
+    asyncio.run(_with_feed(scenario))
+
+
+def test_booking_elsewhere_updates_occupancy_and_calendar(db):
+    async def scenario():
+        machine_id, = await add_machines(1)
+        resident_id = await add_resident(idcards=1)
+        start = slot(days_ahead=1, index=2)
+        end = start + timedelta(minutes=SLOT_DURATION)
+        assert [m.id for m in await occupancy.available_machines(start, end, "Стиральная")] == [machine_id]
+        workload = await get_month_workload(start.year, start.month)
+        assert workload.get(start.day, 0) == 0
+
+        # Бронь создал другой экземпляр: mark() в этом процессе не вызывался
+        booking_id = await add_booking(resident_id, machine_id, start)
+
+        async def taken():
+            return await occupancy.available_machines(start, end, "Стиральная") == []
+        await _eventually(taken)
+        assert (await get_month_workload(start.year, start.month)).get(start.day) == 1
+
+        # ...и отменил ее
+        await execute("UPDATE booking SET status = 2 WHERE id = :id", id=booking_id)
+
+        async def freed():
+            return len(await occupancy.available_machines(start, end, "Стиральная")) == 1
+        await _eventually(freed)
+        assert (await get_month_workload(start.year, start.month)).get(start.day, 0) == 0
+
+    asyncio.run(_with_feed(scenario))
+
+
+def test_unrelated_updates_do_not_notify(db):
+    async def scenario():
+        machine_id, = await add_machines(1)
+        resident_id = await add_resident(idcards=1)
+        booking_id = await add_booking(resident_id, machine_id, slot())
+        await asyncio.sleep(0.2)
+        received = change_feed.received
+
+        # Подтверждение и отметка о напоминании не меняют занятость, жилец без изменений
+        await execute("UPDATE booking SET status = 1, reminded_at = now() WHERE id = :id", id=booking_id)
+        await execute("UPDATE residents SET language = language WHERE id = :id", id=resident_id)
+        await asyncio.sleep(0.3)
+        assert change_feed.received == received
+
+    asyncio.run(_with_feed(scenario))
@@ -0,0 +1,26 @@
+import asyncio
+from datetime import timedelta
+
+from app.repositories.laundry_repo import create_booking, cancel_booking
+
+from seed import slot, add_machines, add_resident
+
+
+def test_concurrent_bookings_of_one_slot(btree_gist):
+    async def scenario():
+        machine_id, = await add_machines(1)
+        residents = [await add_resident(idcards=i) for i in range(1, 7)]
+        start = slot(days_ahead=2, index=1)
+        # Пять жильцов на один слот и шестой — со сдвигом на полслота
+        attempts = [create_booking(r, machine_id, start) for r in residents[:5]]
+        attempts.append(create_booking(residents[5], machine_id, start + timedelta(minutes=45)))
+        results = await asyncio.gather(*attempts, return_exceptions=True)
+
+        booked = [r["booking"] for r in results if isinstance(r, dict)]
+        rejected = [r for r in results if isinstance(r, ValueError)]
+        # Отмененная бронь слот не держит
+        await cancel_booking(booked[0].id)
+        rebooked = await create_booking(residents[5], machine_id, start)
+        return len(booked), len(rejected), rebooked["booking"].start_time == start
+
+    assert asyncio.run(scenario()) == (1, 5, True)
@@ -0,0 +1,80 @@
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.bot.utils.fsm_storage import DbStorage
+from app.db.base import engine
+from app.db.models.fsm_state import FsmState
+
+KEY = StorageKey(bot_id=1, chat_id=42, user_id=42)
+
+
+async def _row(storage: DbStorage):
+    async with storage.engine.connect() as conn:
+        return (await conn.execute(select(FsmState.state, FsmState.data, FsmState.version))).one()
+
+
+async def _concurrent_writes(first: DbStorage, second: DbStorage):
+    # Оба экземпляра прочитали ключ до того, как его кто-то записал
+    assert await first.get_state(KEY) is None
+    assert await second.get_state(KEY) is None
+
+    await first.set_data(KEY, {"lang": "EN"})
+    await first.flush()
+    # Второй пишет поверх устаревшего чтения: раньше он затирал data первого
+    await second.set_state(KEY, "Booking:date")
+    assert await second.flush() == 0
+    assert second.conflicts == 1
+
+    # Ключ перечитан: второй видит запись первого и может повторить свою поверх нее
+    assert await second.get_data(KEY) == {"lang": "EN"}
+    await second.set_state(KEY, "Booking:date")
+    assert await second.flush() == 1
+    return await _row(first)
+
+
+def test_two_instances_do_not_lose_updates(db):
+    async def scenario():
+        first, second = DbStorage(engine), DbStorage(engine)
+        return await _concurrent_writes(first, second)
+
+    assert tuple(asyncio.run(scenario())) == ("Booking:date", {"lang": "EN"}, 2)
+
+
+def test_two_instances_on_sqlite(tmp_path):
+    async def scenario():
+        url = f"sqlite+aiosqlite:///{tmp_path / 'fsm.sqlite'}"
+        first = DbStorage(create_async_engine(url), create_table=True, dispose_engine=True)
+        second = DbStorage(create_async_engine(url), create_table=True, dispose_engine=True)
+        try:
+            return await _concurrent_writes(first, second)
+        finally:
+            await first.close()
+            await second.close()
+
+    assert tuple(asyncio.run(scenario())) == ("Booking:date", {"lang": "EN"}, 2)
+
+
+def test_listener_drops_keys_written_elsewhere(db):
+    async def scenario():
+        first, second = DbStorage(engine, flush_interval=0), DbStorage(engine, flush_interval=0)
+        listener = asyncio.create_task(first.listen(check_interval=1))
+        try:
+            await asyncio.sleep(0.3)
+            await first.set_state(KEY, "Auth:fio")
+            assert await second.get_state(KEY) == "Auth:fio"
+
+            await second.set_state(KEY, "Auth:card")
+            for _ in range(60):
+                if await first.get_state(KEY) == "Auth:card":
+                    break
+                await asyncio.sleep(0.05)
+            # Своя запись из кэша не выкидывается, чужая — да
+            return await first.get_state(KEY), first.invalidations, second.invalidations
+        finally:
+            listener.cancel()
+            await asyncio.gather(listener, return_exceptions=True)
+
+    assert asyncio.run(scenario()) == ("Auth:card", 1, 0)
@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.db import replica
+from app.db.base import engine, async_session
+from app.repositories.laundry_repo import create_booking, get_user_bookings
+from app.repositories.outbox_repo import enqueue_messages
+
+from seed import slot, add_machines, add_resident
+
+
+@pytest.fixture
+def router(db, monkeypatch):
+    """
+    Роутер, у которого "реплика" — та же тестовая база через отдельный движок: она не
+    standby, поэтому проверка считает ее догнавшей. Куда ушло чтение, видно по метке сессии.
+    """
+    def make(url=engine.url, **options) -> replica.ReplicaRouter:
+        router = replica.ReplicaRouter(
+            create_async_engine(url, poolclass=NullPool, connect_args={"timeout": 1}), **options
+        )
+        monkeypatch.setattr(replica, "replica_router", router)
+        return router
+    return make
+
+
+async def _target(session=None) -> str:
+    async with replica.read_scope(session) as s:
+        await s.execute(text("SELECT 1"))
+        return "replica" if s.info.get(replica.REPLICA_SESSION) else "primary"
+
+
+def test_reads_follow_writes_to_primary(router):
+    async def scenario():
+        r = router()
+        route = [await _target()]
+        await r.check()
+        route.append(await _target())
+
+        machine_id, = await add_machines(1)
+        resident = await add_resident(idcards=1)
+        start = slot(days_ahead=3)
+        await create_booking(resident, machine_id, start)
+        # Сразу после записи чтение идет в основную БД: своя бронь видна
+        route.append(await _target())
+        seen = [b.start_time for b in await get_user_bookings(resident)]
+
+        await r.check()
+        route.append(await _target())
+        await r.engine.dispose()
+        return route, seen == [start], r.counters
+
+    route, sees_booking, counters = asyncio.run(scenario())
+    assert route == ["primary", "replica", "primary", "replica"]
+    assert sees_booking
+    assert counters["fallbacks"] == 0
+
+
+def test_session_in_transaction_reads_from_primary(router):
+    async def scenario():
+        r = router()
+        await r.check()
+        async with async_session() as session:
+            before = await _target(session)
+            await session.execute(text("SELECT 1"))  # транзакция сессии открыта
+            inside = await _target(session)
+        await r.engine.dispose()
+        return before, inside
+
+    assert asyncio.run(scenario()) == ("replica", "primary")
+
+
+def test_outbox_commits_do_not_fence_reads(router):
+    async def scenario():
+        r = router()
+        await r.check()
+        await enqueue_messages([{"chat_id": 1, "text": "x", "parse_mode": None, "reply_markup": None, "dedupe_key": None}])
+        target = await _target()
+        await r.engine.dispose()
+        return target
+
+    assert asyncio.run(scenario()) == "replica"
+
+
+def test_stale_replica_is_skipped(router):
+    async def scenario():
+        r = router(max_lag=0.1)
+        await r.check()
+        fresh = await _target()
+        await asyncio.sleep(0.2)  # проверки не было дольше max_lag
+        stale = await _target()
+        await r.engine.dispose()
+        return fresh, stale
+
+    assert asyncio.run(scenario()) == ("replica", "primary")
+
+
+def test_unreachable_replica_falls_back_to_primary(router):
+    async def scenario():
+        r = router(url=engine.url.set(port=1))
+        # Реплика упала после успешной проверки: чтение уходит в основную БД, реплика выключается
+        r.available, r.fresh_at = True, time.monotonic()
+        started = time.monotonic()
+        first = await _target()
+        elapsed = time.monotonic() - started
+        second = await _target()
+        await r.check()
+        return first, second, elapsed, r.available, dict(r.counters)
+
+    first, second, elapsed, available, counters = asyncio.run(scenario())
+    assert (first, second, available) == ("primary", "primary", False)
+    assert elapsed < 2
+    assert counters["fallbacks"] == 1
@@ -0,0 +1,60 @@
+import asyncio
+
+from sqlalchemy import insert, select, text
+
+from app.db.base import engine, async_session
+from app.db.models.residents import Resident
+from app.repositories.laundry_repo import find_resident_by_fio
+
+RESIDENTS = [
+    dict(inidroom=1, idcards=101, last_name="Фёдоров", first_name="Юрий", patronymic="Алексеевич"),
+    dict(inidroom=1, idcards=102, last_name="Иванов", first_name="Иван", patronymic="Петрович"),
+    dict(inidroom=2, idcards=103, last_name="Иванов", first_name="Иван", patronymic="Сергеевич"),
+]
+
+
+async def _seed():
+    async with async_session() as session:
+        await session.execute(insert(Resident), RESIDENTS)
+        await session.commit()
+
+
+async def _find(*parts):
+    user = await find_resident_by_fio(list(parts))
+    return user.idcards if user is not None else None
+
+
+def test_spelling_variants_find_one_resident(db):
+    async def scenario():
+        await _seed()
+        return [
+            await _find("Фёдоров", "Юрий", "Алексеевич"),
+            await _find("Юрий", "Федоров"),
+            await _find("Fyodorov", "Yuri", "Alekseevich"),
+            await _find("iurii", "FEDOROV"),
+            await _find("Иванов", "Иван", "Петрович"),
+            # Без отчества двух Иванов Иванов не различить
+            await _find("Иванов", "Иван"),
+        ]
+
+    assert asyncio.run(scenario()) == [101, 101, 101, 101, 102, None]
+
+
+def test_search_key_survives_empty_search_path(db):
+    """pg_restore пересчитывает сгенерированные колонки с пустым search_path."""
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.execute(text("SET LOCAL search_path = ''"))
+            await conn.execute(
+                text(
+                    "INSERT INTO public.residents (inidroom, idcards, last_name, first_name, patronymic, language) "
+                    "VALUES (1, 101, 'Фёдоров', 'Юрий', 'Алексеевич', 'RU')"
+                )
+            )
+            key = await conn.scalar(text("SELECT public.resident_name_key('Fyodorov Yuri Alexeevich')"))
+        async with async_session() as session:
+            stored = await session.scalar(select(Resident.search_key))
+        return key, stored
+
+    key, stored = asyncio.run(scenario())
+    assert key == stored == "aleksevich fedorov iuri"
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from app.db.base import async_session
+from app.db.models.residents import Resident
+from app.db.roster_import import RosterReader, RosterFormatError, import_roster
+
+from seed import add_resident
+
+HEADER = "Комната;Номер пропуска;Фамилия;Имя;Отчество\n"
+
+
+def _write(tmp_path, *lines: str) -> str:
+    path = tmp_path / "roster.csv"
+    path.write_text(HEADER + "".join(line + "\n" for line in lines), encoding="utf-8-sig")
+    return str(path)
+
+
+async def _cards() -> list:
+    async with async_session() as session:
+        return sorted((await session.execute(select(Resident.idcards))).scalars())
+
+
+def test_import_adds_updates_and_prunes(db, tmp_path):
+    async def scenario():
+        await add_resident(idcards=1001, last_name="Петров")
+        await add_resident(idcards=1002, last_name="Ушедший")
+        path = _write(tmp_path, "101;1001;Петров;Иван;", "102;1003;Новый;Жилец;Петрович")
+        report = await import_roster(RosterReader(path), prune=True)
+        return report, await _cards()
+
+    report, cards = asyncio.run(scenario())
+    assert cards == [1001, 1003]
+    assert (report["added"], report["updated"], report["deleted"], report["rejected"]) == (1, 1, 1, 0)
+
+
+def test_prune_keeps_residents_from_rejected_rows(db, tmp_path):
+    async def scenario():
+        await add_resident(idcards=1001)
+        await add_resident(idcards=1002)
+        await add_resident(idcards=1003)
+        # У 1002 опечатка в комнате, у 1003 нет имени: строки отклонены, но жильцы в файле есть
+        path = _write(tmp_path, "101;1001;Иванов;Иван;", "1O2;1002;Иванов;Иван;", "103;1003;Иванов;;")
+        report = await import_roster(RosterReader(path), prune=True)
+        return report, await _cards()
+
+    report, cards = asyncio.run(scenario())
+    assert cards == [1001, 1002, 1003]
+    assert (report["rejected"], report["missing"], report["deleted"]) == (2, 0, 0)
+
+
+def test_prune_refuses_rows_without_card_number(db, tmp_path):
+    async def scenario():
+        await add_resident(idcards=1001)
+        await add_resident(idcards=1002)
+        path = _write(tmp_path, "101;1001;Иванов;Иван;", "102;l002;Иванов;Иван;")
+        with pytest.raises(RosterFormatError):
+            await import_roster(RosterReader(path), prune=True)
+        return await _cards()
+
+    assert asyncio.run(scenario()) == [1001, 1002]
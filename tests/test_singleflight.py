@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+from sqlalchemy import event
+
+from app.db.base import engine
+from app.repositories.cache import SingleFlight
+from app.repositories.laundry_repo import get_month_workload, invalidate_month_workload, read_flight
+
+from seed import slot, add_machines, add_resident, add_booking
+
+
+def test_concurrent_calls_share_one_execution():
+    async def scenario():
+        flight, runs = SingleFlight(), []
+
+        async def load():
+            runs.append(1)
+            await asyncio.sleep(0.05)
+            return {"value": len(runs)}
+
+        results = await asyncio.gather(*(flight.do(("workload", 1), load) for _ in range(20)))
+        other = await flight.do(("workload", 2), load)
+        return results, other, flight.stats()
+
+    results, other, stats = asyncio.run(scenario())
+    assert all(r is results[0] for r in results) and results[0] == {"value": 1}
+    assert other == {"value": 2}
+    assert (stats["calls"], stats["executed"], stats["shared"]) == (21, 2, 19)
+
+
+def test_error_reaches_every_waiter():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.05)
+            raise RuntimeError("db down")
+
+        return await asyncio.gather(*(flight.do("key", fail) for _ in range(5)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert [type(r) for r in results] == [RuntimeError] * 5
+
+
+def test_waiter_takes_over_when_leader_is_cancelled():
+    async def scenario():
+        flight, runs = SingleFlight(), []
+
+        async def load():
+            runs.append(1)
+            await asyncio.sleep(0.1)
+            return len(runs)
+
+        leader = asyncio.create_task(flight.do("key", load))
+        await asyncio.sleep(0.01)
+        waiters = [asyncio.create_task(flight.do("key", load)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*waiters), len(runs)
+
+    results, runs = asyncio.run(scenario())
+    # Запрос повторил один из ждущих, остальные получили его результат
+    assert results == [2, 2, 2] and runs == 2
+
+
+def test_forget_detaches_new_callers():
+    async def scenario():
+        flight, started = SingleFlight(), []
+
+        async def load():
+            started.append(1)
+            run = len(started)
+            await asyncio.sleep(0.05)
+            return run
+
+        before = asyncio.create_task(flight.do(("workload", 1), load))
+        await asyncio.sleep(0.01)
+        # Запись после начала чтения: новый вызов не должен получить старый результат
+        flight.forget(lambda key: key[0] == "workload")
+        after = await flight.do(("workload", 1), load)
+        return await before, after
+
+    assert asyncio.run(scenario()) == (1, 2)
+
+
+def test_month_workload_stampede_runs_one_query(db):
+    async def scenario():
+        machine_id, = await add_machines(1)
+        resident = await add_resident(idcards=1)
+        day = slot(days_ahead=1)
+        await add_booking(resident, machine_id, day)
+
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine.sync_engine, "before_cursor_execute", capture)
+        try:
+            invalidate_month_workload(day)  # отмена брони сбросила кэш месяца
+            results = await asyncio.gather(*(get_month_workload(day.year, day.month) for _ in range(50)))
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", capture)
+        return results, day, sum("FROM booking" in s for s in statements)
+
+    results, day, queries = asyncio.run(scenario())
+    assert all(r == {day.day: 1} for r in results)
+    assert queries == 1
+    assert read_flight.stats()["shared"] == 49
@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from app.bot.webhook import BoundedRequestHandler
+
+TOKEN = "123456:AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA"
+
+
+def _update(i: int) -> dict:
+    user = {"id": i, "is_bot": False, "first_name": "Иван"}
+    return {"update_id": i, "message": {"message_id": i, "date": 0, "chat": {"id": i, "type": "private"}, "from": user, "text": "/start"}}
+
+
+async def _serve(handler_delay: float, updates: int, **options) -> dict:
+    """Шлет updates апдейтов на вебхук и закрывает обработчик; счетчики — что успело обработаться."""
+    counters = {"running": 0, "max_running": 0, "handled": 0, "cancelled": 0}
+    dp = Dispatcher()
+
+    @dp.message()
+    async def handle(message: Message):
+        counters["running"] += 1
+        counters["max_running"] = max(counters["max_running"], counters["running"])
+        try:
+            await asyncio.sleep(handler_delay)
+            counters["handled"] += 1
+        except asyncio.CancelledError:
+            counters["cancelled"] += 1
+            raise
+        finally:
+            counters["running"] -= 1
+
+    app = web.Application()
+    handler = BoundedRequestHandler(dp, Bot(TOKEN), **options)
+    handler.register(app, path="/webhook")
+    async with TestClient(TestServer(app)) as client:
+        responses = await asyncio.gather(*(client.post("/webhook", json=_update(i)) for i in range(updates)))
+        assert {r.status for r in responses} == {200}
+        started = time.monotonic()
+        await handler.close()
+        counters["close_seconds"] = time.monotonic() - started
+    return counters
+
+
+def test_in_flight_updates_are_bounded_and_drained():
+    counters = asyncio.run(_serve(0.05, 40, max_in_flight=4, drain_timeout=10))
+    assert counters["max_running"] == 4
+    # close() дождался всех принятых апдейтов
+    assert (counters["handled"], counters["cancelled"]) == (40, 0)
+
+
+def test_close_cancels_updates_after_drain_timeout():
+    counters = asyncio.run(_serve(30, 3, max_in_flight=8, drain_timeout=0.2))
+    assert (counters["handled"], counters["cancelled"]) == (0, 3)
+    assert counters["close_seconds"] < 5